@@ -1,5 +1,7 @@
 from rest_framework import serializers
 
+from rest_framework_datatables.serializers import DatatablesSerializerMixin
+
 from .models import Album, Artist
 
 
@@ -16,7 +18,7 @@ class ArtistSerializer(serializers.ModelSerializer):
         datatables_always_serialize = ('id',)
 
 
-class AlbumSerializer(serializers.ModelSerializer):
+class AlbumSerializer(DatatablesSerializerMixin, serializers.ModelSerializer):
     artist_name = serializers.ReadOnlyField(source='artist.name')
     # DRF-Datatables can deal with nested serializers as well.
     artist = ArtistSerializer()
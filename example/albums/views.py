@@ -117,8 +117,12 @@ class AlbumFilter(DatatablesFilterSet):
 
 
 class AlbumFilterListView(generics.ListAPIView):
-    # select_related() and prefetch_related provide more efficient DB queries
-    queryset = Album.objects.all().select_related("artist").prefetch_related("genres").order_by('rank')
+    queryset = Album.objects.all().order_by('rank')
+    # follow the relations of the requested columns only, with
+    # select_related() and prefetch_related()
+    datatables_plan_relations = True
+    # the genres are read by a SerializerMethodField
+    datatables_column_relations = {'genres': ('genres',)}
     serializer_class = AlbumSerializer
     filter_backends = (DatatablesFilterBackend,)
     filterset_class = AlbumFilter
@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+
+
+class DatatablesConfig(AppConfig):
+    name = 'rest_framework_datatables'
+    verbose_name = 'Django REST framework Datatables'
+
+    def ready(self):
+        from django.test.signals import setting_changed
+
+        from . import documents
+        from .counts import _setting_changed, connect_invalidation
+        connect_invalidation()
+        setting_changed.connect(_setting_changed)
+        documents.connect_receivers()
@@ -0,0 +1,229 @@
+import threading
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import fields as drf_fields, serializers
+from rest_framework.relations import PKOnlyObject
+
+#: serializer fields whose ``to_representation`` returns the values of the
+#: given model fields unchanged
+IDENTITY_FIELDS = (
+    (serializers.CharField, (models.CharField, models.TextField)),
+    (serializers.IntegerField, (models.IntegerField, models.AutoField)),
+    (serializers.BooleanField, (models.BooleanField,)),
+)
+
+#: number of generated factories kept, the least recently used ones are
+#: dropped (each set of requested columns has its own factory)
+MAX_FACTORIES = 256
+
+_factories = OrderedDict()
+_factories_lock = threading.Lock()
+
+
+def get_model_field_path(model, source_attrs):
+    """return the model field read by the source, or None if the source
+    isn't a model field of the model or of a model reached through non
+    nullable foreign keys (which can't be missing nor None)"""
+    if model is None or not source_attrs:
+        return None
+    for i, attr in enumerate(source_attrs):
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete or field.many_to_many:
+            return None
+        if i == len(source_attrs) - 1:
+            return field
+        if not field.many_to_one or field.null:
+            return None
+        model = field.related_model
+    return None  # pragma: no cover
+
+
+def is_identity(field, model_field):
+    """return True if the serializer field renders the values of the model
+    field unchanged"""
+    if type(field) is serializers.ReadOnlyField:
+        return True
+    for field_class, model_field_classes in IDENTITY_FIELDS:
+        if type(field) is field_class:
+            return isinstance(model_field, model_field_classes)
+    return False
+
+
+def get_model(serializer):
+    meta = getattr(serializer, 'Meta', None)
+    return getattr(meta, 'model', None)
+
+
+def can_compile(serializer):
+    """return True if the serializer serializes its fields like
+    ``Serializer.to_representation``"""
+    return (
+        isinstance(serializer, serializers.Serializer)
+        and type(serializer).to_representation
+        is serializers.Serializer.to_representation
+    )
+
+
+def get_signature(serializer):
+    """return what the generated function depends on: the names, classes
+    and sources of the readable fields of the serializer"""
+    ret = [type(serializer), get_model(serializer)]
+    for field in serializer._readable_fields:
+        item = (field.field_name, type(field), field.source)
+        if isinstance(field, serializers.Serializer) and can_compile(field):
+            item += (get_signature(field),)
+        ret.append(item)
+    return tuple(ret)
+
+
+def get_field_kind(serializer, field):
+    """return how the field is serialized by the generated function:
+    ``'method'`` for a ``SerializerMethodField``, ``'nested'`` or ``'value'``
+    for a nested serializer or a field reading a model field (along with
+    the model field), ``'identity'`` if the value is rendered unchanged,
+    and ``'field'`` for the other fields, serialized by the field itself"""
+    if type(field) is serializers.SerializerMethodField:
+        return 'method', None
+    if type(field).get_attribute is not drf_fields.Field.get_attribute:
+        return 'field', None
+    model_field = get_model_field_path(get_model(serializer),
+                                       field.source_attrs)
+    if model_field is None:
+        return 'field', None
+    if isinstance(field, serializers.Serializer):
+        if model_field.many_to_one and can_compile(field):
+            return 'nested', model_field
+        return 'field', None
+    if model_field.is_relation:
+        return 'field', None
+    if is_identity(field, model_field):
+        return 'identity', model_field
+    return 'value', model_field
+
+
+def generate_source(serializer):
+    """return the source of the factory of the row function of the
+    serializer, and the serializers of its nested fields"""
+    lines = ['def factory(serializer, nested):',
+             '    fields = serializer.fields']
+    body = ['    def row(obj):', '        ret = {}']
+    nested = []
+    for i, field in enumerate(serializer._readable_fields):
+        kind, model_field = get_field_kind(serializer, field)
+        name = repr(field.field_name)
+        if kind == 'method':
+            lines.append('    f%d = getattr(serializer, %r)' % (
+                i, field.method_name))
+            body.append('        ret[%s] = f%d(obj)' % (name, i))
+            continue
+        if kind == 'field':
+            lines.append('    f%d = fields[%s]' % (i, name))
+            body.extend([
+                '        try:',
+                '            v = f%d.get_attribute(obj)' % i,
+                '        except SkipField:',
+                '            pass',
+                '        else:',
+                '            if (v.pk if isinstance(v, PKOnlyObject)'
+                ' else v) is None:',
+                '                ret[%s] = None' % name,
+                '            else:',
+                '                ret[%s] = f%d.to_representation(v)' % (
+                    name, i),
+            ])
+            continue
+        body.append('        v = obj.%s' % '.'.join(field.source_attrs))
+        if kind == 'identity':
+            body.append('        ret[%s] = v' % name)
+            continue
+        if kind == 'nested':
+            lines.append('    f%d = nested[%d](fields[%s])' % (
+                i, len(nested), name))
+            nested.append(field)
+        else:
+            lines.append('    f%d = fields[%s].to_representation' % (
+                i, name))
+        body.append('        ret[%s] = None if v is None else f%d(v)' % (
+            name, i))
+    body.append('        return ret')
+    return '\n'.join(lines + body + ['    return row']), nested
+
+
+def get_factory(serializer):
+    """return the factory of the row function of the serializer, generated
+    once per signature (see :func:`get_signature`) and kept among the
+    ``MAX_FACTORIES`` most recently used ones"""
+    signature = get_signature(serializer)
+    with _factories_lock:
+        ret = _factories.get(signature)
+        if ret is not None:
+            _factories.move_to_end(signature)
+            return ret
+    source, nested = generate_source(serializer)
+    namespace = {'SkipField': drf_fields.SkipField,
+                 'PKOnlyObject': PKOnlyObject}
+    exec(compile(source, '<datatables %s>' % type(serializer).__name__,
+                 'exec'), namespace)
+    factory = namespace['factory']
+    nested_factories = [get_factory(field) for field in nested]
+
+    def ret(serializer):
+        return factory(serializer, nested_factories)
+
+    with _factories_lock:
+        _factories[signature] = ret
+        while len(_factories) > MAX_FACTORIES:
+            _factories.popitem(last=False)
+    return ret
+
+
+def compile_serializer(serializer):
+    """return a function serializing an instance like
+    ``serializer.to_representation()``, or None if the serializer can't be
+    compiled (a serializer overriding ``to_representation()`` for
+    instance)
+
+    The source of the function is generated once per serializer class and
+    set of fields (with the fields of the requested columns, see
+    :class:`~rest_framework_datatables.serializers.DatatablesSerializerMixin`),
+    and reads the model fields directly instead of resolving the source of
+    each field of each row.
+
+    The fields reading a model field (through non nullable foreign keys)
+    and the ``SerializerMethodField`` are serialized by generated code,
+    the other fields by themselves.
+
+    """
+    if not can_compile(serializer):
+        return None
+    return get_factory(serializer)(serializer)
+
+
+class DatatablesCompiledListSerializer(serializers.ListSerializer):
+    """List serializer serializing the rows of the datatables requests with
+    a compiled function (see :func:`compile_serializer`)
+
+    >>> class AlbumSerializer(DatatablesSerializerMixin,
+    ...                       serializers.ModelSerializer):
+    ...     class Meta:
+    ...         list_serializer_class = DatatablesCompiledListSerializer
+
+    """
+
+    def to_representation(self, data):
+        request = self.context.get('request')
+        if request is None or getattr(
+                getattr(request, 'accepted_renderer', None), 'format', None
+        ) != 'datatables':
+            return super().to_representation(data)
+        row = compile_serializer(self.child)
+        if row is None:
+            return super().to_representation(data)
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+        return [row(item) for item in data]
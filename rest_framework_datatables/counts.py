@@ -0,0 +1,325 @@
+import hashlib
+import logging
+import uuid
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet, ImproperlyConfigured
+from django.db import DatabaseError, connections
+from django.db.models import Count
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+
+logger = logging.getLogger('rest_framework_datatables')
+
+CACHE_KEY_PREFIX = 'drf-datatables'
+
+
+@lru_cache(maxsize=None)
+def _models_by_table():
+    return dict(
+        (model._meta.db_table, model)
+        for model in apps.get_models(include_auto_created=True)
+    )
+
+
+def get_queryset_models(queryset):
+    """return the models whose tables are used by the queryset
+
+    The queryset must have been compiled before (e.g. with
+    ``str(queryset.query)``) for the joined tables to be known.
+
+    """
+    by_table = _models_by_table()
+    ret = set([queryset.model])
+    for join in queryset.query.alias_map.values():
+        model = by_table.get(join.table_name)
+        if model is not None:
+            ret.add(model)
+    return ret
+
+
+def _version_key(model):
+    return '%s:version:%s' % (CACHE_KEY_PREFIX, model._meta.label_lower)
+
+
+def invalidate_model(model, alias='default'):
+    """invalidate all the cached counts depending on the model"""
+    caches[alias].set(_version_key(model), uuid.uuid4().hex, None)
+
+
+def get_version_cache_aliases():
+    """return the cache aliases holding the versions of the models, the
+    ``DATATABLES_VERSION_CACHE_ALIASES`` setting (empty by default: the
+    models are not versioned)"""
+    return getattr(settings, 'DATATABLES_VERSION_CACHE_ALIASES', ())
+
+
+def _invalidate(sender, **kwargs):
+    if kwargs.get('action', 'post').startswith('pre'):
+        # m2m_changed is sent before and after the change
+        return
+    for alias in get_version_cache_aliases():
+        invalidate_model(sender, alias)
+
+
+def connect_invalidation():
+    """connect the receivers changing the version of a model when one of
+    its instances is saved or deleted, or when a many to many relation
+    changes (the sender is then the through model), if the
+    ``DATATABLES_VERSION_CACHE_ALIASES`` setting lists caches, disconnect
+    them otherwise
+
+    This is done when the application is ready, so that writes done by
+    any process (other workers, tasks, management commands...) invalidate
+    the cached counts.
+
+    """
+    uid = '%s:invalidate' % CACHE_KEY_PREFIX
+    signals = (post_save, post_delete, m2m_changed)
+    if not get_version_cache_aliases():
+        for signal in signals:
+            signal.disconnect(dispatch_uid=uid)
+        return
+    for signal in signals:
+        signal.connect(_invalidate, weak=False, dispatch_uid=uid)
+
+
+def _setting_changed(setting, **kwargs):
+    if setting == 'DATATABLES_VERSION_CACHE_ALIASES':
+        connect_invalidation()
+
+
+def get_queryset_versions(queryset, alias='default'):
+    """return the versions of the models the queryset touches, which
+    change when one of their instances is saved or deleted (or when a many
+    to many relation changes)
+
+    The queryset must have been compiled before (see
+    :func:`get_queryset_models`).
+
+    """
+    if alias not in get_version_cache_aliases():
+        raise ImproperlyConfigured(
+            "The cache '%s' must be listed in the "
+            "DATATABLES_VERSION_CACHE_ALIASES setting to hold the versions "
+            "of the models." % alias
+        )
+    cache = caches[alias]
+    models = sorted(get_queryset_models(queryset),
+                    key=lambda m: m._meta.label_lower)
+    version_keys = [_version_key(model) for model in models]
+    versions = cache.get_many(version_keys)
+    for version_key in version_keys:
+        if version_key not in versions:
+            versions[version_key] = uuid.uuid4().hex
+            cache.set(version_key, versions[version_key], None)
+    return [versions[k] for k in version_keys]
+
+
+def cached_count(queryset, count_func, key, timeout, alias='default'):
+    """return ``count_func(queryset)``, cached for ``timeout`` seconds
+
+    The cache key is built from ``key`` and the SQL of the queryset, and
+    includes a version for each model the queryset touches. Saving or
+    deleting an instance of any of these models (or changing a many to
+    many relation) changes the version, so the cached count is not used
+    anymore.
+
+    """
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return count_func(queryset)
+    cache = caches[alias]
+    signature = repr((
+        key, sql, params, get_queryset_versions(queryset, alias)
+    ))
+    count_key = '%s:count:%s' % (
+        CACHE_KEY_PREFIX,
+        hashlib.md5(signature.encode('utf-8')).hexdigest()
+    )
+    count = cache.get(count_key)
+    if count is None:
+        count = count_func(queryset)
+        cache.set(count_key, count, timeout)
+    return count
+
+
+ESTIMATE_QUERIES = {
+    # the first number of each stat row is the number of rows of the table
+    # as of the last ANALYZE
+    'sqlite': 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s',
+    'postgresql': 'SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)',
+    'mysql': (
+        'SELECT table_rows FROM information_schema.tables '
+        'WHERE table_schema = DATABASE() AND table_name = %s'
+    ),
+    'oracle': 'SELECT num_rows FROM user_tables WHERE table_name = UPPER(%s)',
+}
+
+
+def is_unfiltered(queryset):
+    """return True if the queryset selects all the rows of its table"""
+    query = queryset.query
+    return (
+        not query.where
+        and not query.distinct
+        and not query.low_mark
+        and query.high_mark is None
+        and query.group_by is None
+        and not query.combinator
+    )
+
+
+def estimate_count(queryset):
+    """return the number of rows of the queryset estimated from the
+    database statistics, or None if no estimation is available
+
+    Only unfiltered querysets can be estimated.
+
+    """
+    if not is_unfiltered(queryset):
+        return None
+    connection = connections[queryset.db]
+    sql = ESTIMATE_QUERIES.get(connection.vendor)
+    if sql is None:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [queryset.model._meta.db_table])
+            rows = cursor.fetchall()
+    except DatabaseError:
+        # e.g. no sqlite_stat1 table when ANALYZE was never run
+        return None
+    estimates = []
+    for row in rows:
+        if row[0] is None:
+            continue
+        try:
+            estimates.append(int(float(str(row[0]).split()[0])))
+        except (IndexError, ValueError):
+            continue
+    if not estimates or max(estimates) <= 0:
+        # never analyzed
+        return None
+    return max(estimates)
+
+
+def get_count_queryset(queryset):
+    """return a queryset with the same number of rows as ``queryset``, but
+    cheaper to count
+
+    Ordering, ``select_related()`` and ``prefetch_related()`` are removed,
+    and only the primary key is selected, which drops the annotations that
+    are not used by the filters and makes a ``DISTINCT`` queryset counted
+    over a subquery of primary keys instead of full rows.
+
+    Querysets whose rows depend on their selected columns (sliced,
+    grouped, combined or aggregated querysets, ``DISTINCT`` querysets
+    with annotations or explicit values...) are only stripped of their
+    ordering.
+
+    """
+    query = queryset.query
+    if (
+        query.is_sliced
+        or query.combinator
+        or query.distinct_fields
+        or query.group_by is not None
+        or any(getattr(annotation, 'contains_aggregate', False)
+               for annotation in query.annotations.values())
+    ):
+        return queryset
+    queryset = queryset.order_by()
+    if query.distinct and (query.annotations or query.extra
+                           or query.values_select):
+        return queryset
+    queryset = queryset.select_related(None).prefetch_related(None)
+    queryset = queryset.values('pk')
+    if settings.DEBUG and logger.isEnabledFor(logging.DEBUG):
+        try:
+            logger.debug('count queryset: %s', queryset.query)
+        except EmptyResultSet:
+            pass
+    return queryset
+
+
+def exact_count(queryset):
+    return get_count_queryset(queryset).count()
+
+
+def aggregate_counts(queryset, q, distinct=True):
+    """return the count of the queryset and of the queryset filtered by
+    ``q`` in a single query, using conditional aggregation
+
+    ``distinct`` must be True if ``q`` spans a multi-valued relation, as
+    the joins of the query would otherwise count rows more than once.
+
+    """
+    counts = queryset.order_by().aggregate(
+        datatables_count=Count('pk', distinct=distinct),
+        datatables_filtered_count=Count('pk', filter=q, distinct=distinct),
+    )
+    return counts['datatables_count'], counts['datatables_filtered_count']
+
+
+def capped_count(queryset, cap):
+    """count the rows of the queryset, but stop counting after ``cap``
+
+    return value is a tuple ``(count, capped)``, where ``capped`` is True
+    if the queryset has more than ``cap`` rows (``count`` is then
+    ``cap``).
+
+    """
+    # counting a sliced queryset is done with a LIMITed subquery
+    count = get_count_queryset(queryset)[:cap + 1].count()
+    if count > cap:
+        return cap, True
+    return count, False
+
+
+class ExactCount(object):
+    """Always count the rows of the queryset"""
+
+    def count(self, queryset, count_func=exact_count):
+        """return a ``(count, approximate)`` tuple
+
+        ``count_func`` is used for exact counts, it defaults to
+        ``queryset.count()``.
+
+        """
+        return count_func(queryset), False
+
+
+class EstimatedCount(ExactCount):
+    """Estimate the count from the database statistics
+
+    Querysets that can't be estimated (filtered querysets, database
+    without statistics...) are counted exactly.
+
+    """
+
+    def count(self, queryset, count_func=exact_count):
+        estimate = estimate_count(queryset)
+        if estimate is None:
+            return count_func(queryset), False
+        return estimate, True
+
+
+class HybridCount(EstimatedCount):
+    """Estimate the count, but count exactly the tables estimated to have
+    fewer rows than ``threshold``"""
+
+    def __init__(self, threshold=100000):
+        self.threshold = threshold
+
+    def count(self, queryset, count_func=exact_count):
+        count, approximate = super(HybridCount, self).count(
+            queryset, count_func
+        )
+        if approximate and count < self.threshold:
+            return count_func(queryset), False
+        return count, approximate
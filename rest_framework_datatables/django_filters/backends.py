@@ -1,8 +1,11 @@
+from django.core.exceptions import EmptyResultSet
 from django.db.models import Q
 from django_filters.rest_framework.backends import DjangoFilterBackend
 from django_filters import utils
 
 from rest_framework_datatables import filters
+from rest_framework_datatables.counts import aggregate_counts
+from rest_framework_datatables.documents import search_document_q
 
 from .filterset import DatatablesFilterSet
 
@@ -22,34 +25,72 @@ class DatatablesFilterBackend(filters.DatatablesBaseFilterBackend,
         if not self.check_renderer_format(request):
             return queryset
 
-        count = self.get_queryset_count_before(view.get_queryset())
-        self.set_count_before(view, count)
-
         # parsed datatables_query will be an attribute of the filterset
         filterset = self.get_filterset(request, queryset, view)
         if filterset is None:
-            count = self.get_queryset_count_after(queryset)
-            self.set_count_after(view, count)
-            return queryset
+            total_count, approximate = self.get_total_count(view)
+            self.set_count_before(view, total_count, approximate)
+            count, capped = self.get_filtered_count(view, queryset)
+            self.set_count_after(view, count, capped=capped)
+            return self.plan_queryset(request, view, queryset)
 
         if not filterset.is_valid() and self.raise_exception:
             raise utils.translate_validation(filterset.errors)
         queryset = filterset.qs
         global_q = self.get_global_q(filterset)
+        document = getattr(view, 'datatables_search_document', None)
+        if (
+                global_q and document
+                and not filterset.datatables_query['search_regex']):
+            # the search document holds the text of the searched columns
+            global_q = search_document_q(
+                document, filterset.datatables_query['search_value']
+            )
+        global_q = self.get_exists_q(view, queryset.model, global_q)
         if global_q:
-            queryset = queryset.filter(global_q).distinct()
-
-        count = self.get_queryset_count_after(queryset)
-        self.set_count_after(view, count)
+            queryset = self.filter_q(queryset, global_q)
+
+        multiple_backends = len(getattr(view, 'filter_backends', [])) > 1
+        filtered = global_q or self.is_filtered(filterset)
+        if (
+                filtered
+                and not multiple_backends
+                and self.use_aggregate_counts(view)
+                and self.has_default_total_count(view)):
+            # the filterset doesn't give us a Q object, so the filtered
+            # rows are counted through a subquery
+            total_count, count = aggregate_counts(
+                filterset.queryset,
+                Q(pk__in=queryset.order_by().values('pk')),
+                distinct=False
+            )
+            self.set_count_before(view, total_count)
+            self.set_count_after(view, count)
+        else:
+            total_count, approximate = self.get_total_count(view)
+            self.set_count_before(view, total_count, approximate)
+            if filtered or multiple_backends:
+                count, capped = self.get_filtered_count(view, queryset)
+                self.set_count_after(view, count, capped=capped)
+            else:
+                # nothing was filtered, no need to count again
+                self.set_count_after(view, total_count, approximate)
 
         # TODO Can we use OrderingFilter, maybe in DatatablesFilterSet, by
         # default? See
         # https://django-filter.readthedocs.io/en/master/ref/filters.html#ordering-filter
+        ordering_fields = self.get_ordering_fields(
+            request, view, filterset.datatables_query['fields']
+        )
+        queryset = self.alias_column_expressions(
+            queryset, self.get_column_expressions(view),
+            [f for f, dir_ in ordering_fields]
+        )
         ordering = self.get_ordering(request, view, filterset)
         if ordering:
             queryset = queryset.order_by(*ordering)
 
-        return queryset
+        return self.plan_queryset(request, view, queryset)
 
     def get_filterset_kwargs(self, request, queryset, view):
         query = self.parse_datatables_query(request, view)
@@ -65,15 +106,23 @@ class DatatablesFilterBackend(filters.DatatablesBaseFilterBackend,
         form_fields = {}
         field_queries = {}
         for f in query['fields']:
-            if 'data' not in f:
+            if not f.data:
                 continue
 
-            form_fields[f['data']] = f['search_value']
-            field_queries[f['data']] = f
+            form_fields[f.data] = f.search_value
+            field_queries[f.data] = f
         query['form_fields'] = form_fields
         query['field_queries'] = field_queries
         return query
 
+    def is_filtered(self, filterset):
+        """return True if the filterset changed its queryset, in which case
+        the filtered queryset must be counted"""
+        try:
+            return str(filterset.qs.query) != str(filterset.queryset.query)
+        except EmptyResultSet:
+            return True
+
     def get_global_q(self, filterset):
         global_q = Q()
         for filter_name, f in filterset.filters.items():
@@ -85,10 +134,14 @@ class DatatablesFilterBackend(filters.DatatablesBaseFilterBackend,
 
     def get_ordering(self, request, view, filterset):
         ret = []
+        expressions = self.get_column_expressions(view)
         for field, dir_ in self.get_ordering_fields(
                 request, view, filterset.datatables_query['fields']):
-            if field['data'] in filterset.filters:
-                filter = filterset.filters[field['data']]
+            if field.data in expressions:
+                ret.append(('-' if dir_ == 'desc' else '')
+                           + self.get_column_alias(field))
+            elif field.data in filterset.filters:
+                filter = filterset.filters[field.data]
                 lookup = '__'.join(
                     f'{filter.field_name}__{filter.lookup_expr}'
                     .split('__')
@@ -97,18 +150,3 @@ class DatatablesFilterBackend(filters.DatatablesBaseFilterBackend,
                            + lookup)
         self.append_additional_ordering(ret, view)
         return ret
-
-    def get_queryset_count_before(self, queryset):
-        """
-        Provide an overrideable method to return a custom count.
-        This can be useful for very large tables, as calls to model.count()
-        can be very expensive.
-        """
-        return queryset.count()
-
-    def get_queryset_count_after(self, queryset):
-        """
-        See
-        :meth:`~rest_framework_datatables.django_filters.backends.DatatablesFilterBackend.get_queryset_count_before`.
-        """
-        return queryset.count()
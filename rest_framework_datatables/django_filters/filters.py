@@ -1,4 +1,9 @@
 from django.db.models import Q
+from django_filters.constants import EMPTY_VALUES
+
+from rest_framework_datatables.filters import (
+    RANGE_DELIMITERS, range_search_q)
+from rest_framework_datatables.regex import regex_q
 
 
 class SwitchRegexFilter(object):
@@ -9,6 +14,10 @@ class SwitchRegexFilter(object):
       'exact': 'regex',
     }
 
+    #: delimiters of the range search values of numeric and date fields
+    #: (``1990..2000``), an empty tuple disables range searches
+    range_delimiters = RANGE_DELIMITERS
+
     def __init__(self, field_name=None, lookup_expr='exact', *, label=None,
                  method=None, distinct=False, exclude=False, **kwargs):
         self._original_lookup_expr = lookup_expr
@@ -39,6 +48,34 @@ class SwitchRegexFilter(object):
 
     lookup_expr = property(**lookup_expr())
 
+    @property
+    def lookup_path(self):
+        """The lookup path of the filter, without the last lookup"""
+        return '__'.join(
+            [self.field_name]
+            + self._original_lookup_expr.split('__')[:-1]
+        )
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return super().filter(qs, value)
+        q = None
+        regex_lookup = self.lookup_expr.split('__')[-1]
+        if self.search_regex:
+            # simple regexes are rewritten with lookups that can use
+            # indexes
+            if regex_lookup in ('regex', 'iregex'):
+                q = regex_q(self.lookup_path, value,
+                            case_sensitive=regex_lookup == 'regex')
+        elif self.range_delimiters and isinstance(value, str):
+            q = range_search_q(qs.model, self.lookup_path, value,
+                               self.range_delimiters)
+        if q is None:
+            return super().filter(qs, value)
+        if self.distinct:
+            qs = qs.distinct()
+        return self.get_method(qs)(q)
+
     @property
     def search_regex(self):
         # datatables_query is only present, if there's a query for
@@ -84,7 +121,10 @@ class GlobalFilter(SwitchRegexFilter):
         """Return a Q-Object for the global search for this column"""
         ret = Q()
         if self.global_search_value:
-            ret = Q(**{self.global_lookup: self.global_search_value})
+            if self.global_search_regex:
+                ret = regex_q(self.lookup_path, self.global_search_value)
+            else:
+                ret = Q(**{self.global_lookup: self.global_search_value})
         return ret
 
     @property
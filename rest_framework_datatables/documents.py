@@ -0,0 +1,414 @@
+import re
+import unicodedata
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
+from django.db import models
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save)
+
+
+# model -> list of SearchDocumentField
+registry = {}
+
+# values of the sources are separated by a character that can't be typed in
+# the search box, so that a search doesn't match across two values
+SEPARATOR = '\n'
+
+WHITESPACE_RE = re.compile(r'[^\S\n]+')
+
+
+def normalize(text):
+    """return the text lower cased, without accents and with its white
+    space collapsed, as stored in search documents"""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return WHITESPACE_RE.sub(' ', text).strip().lower()
+
+
+def search_document_q(field_name, search_value):
+    """return a Q-object searching the value in the search document field,
+    with a single ``contains`` lookup (documents are lower cased)"""
+    return Q(**{'%s__contains' % field_name: normalize(search_value)})
+
+
+class SearchDocumentField(models.TextField):
+    """Stores the normalized text of the ``sources`` of a model, a list of
+    lookup paths such as ``['name', 'artist__name', 'genres__name']``
+
+    The document is rebuilt when an instance of a model using
+    :class:`SearchDocumentMixin` is saved, when a related object used by
+    the sources is saved or deleted, and when a many to many relation used
+    by the sources changes. The ``rebuild_datatables_search_documents``
+    management command rebuilds all the documents.
+
+    """
+
+    def __init__(self, *args, sources=(), **kwargs):
+        self.sources = list(sources)
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('blank', True)
+        kwargs.setdefault('default', '')
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['sources'] = self.sources
+        for key, value in (('editable', False), ('blank', True),
+                           ('default', '')):
+            if kwargs.get(key, value) == value:
+                kwargs.pop(key, None)
+        return name, path, args, kwargs
+
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super().contribute_to_class(cls, name, *args, **kwargs)
+        if not cls._meta.abstract:
+            register(cls, [self])
+
+    def get_source_values(self, instance, path):
+        """return the values of the source path for the instance
+
+        Forward relations are followed on the instance, so that unsaved
+        changes are taken into account, multi valued relations are read
+        from the database.
+
+        """
+        obj = instance
+        parts = path.split(LOOKUP_SEP)
+        for i, part in enumerate(parts):
+            field = obj._meta.get_field(part)
+            if field.many_to_many or field.one_to_many:
+                if obj.pk is None:
+                    return []
+                related_path = LOOKUP_SEP.join(parts[i:])
+                return [
+                    value for value in type(obj)._base_manager.using(
+                        obj._state.db
+                    ).filter(pk=obj.pk).order_by(related_path).values_list(
+                        related_path, flat=True
+                    ) if value is not None
+                ]
+            if field.is_relation:
+                try:
+                    obj = getattr(
+                        obj, field.name if field.concrete
+                        else field.get_accessor_name()
+                    )
+                except ObjectDoesNotExist:
+                    return []
+                if obj is None:
+                    return []
+                continue
+            value = getattr(obj, field.attname)
+            return [] if value is None else [value]
+        # path ending on a relation
+        return [obj.pk]
+
+    def build(self, instance, source_values=None):
+        """return the search document of the instance
+
+        ``source_values`` maps source paths to their values, when they
+        were already fetched.
+
+        """
+        values = []
+        for path in self.sources:
+            if source_values is not None and path in source_values:
+                path_values = source_values[path]
+            else:
+                path_values = self.get_source_values(instance, path)
+            for value in path_values:
+                value = normalize(value)
+                if value and value not in values:
+                    values.append(value)
+        return SEPARATOR.join(values)
+
+
+class SearchDocumentMixin(models.Model):
+    """Model mixin rebuilding the :class:`SearchDocumentField` of the model
+    when an instance is saved"""
+
+    class Meta:
+        abstract = True
+
+    def update_search_documents(self):
+        """rebuild the search documents of the instance, without saving
+        it, and return the names of the fields that changed"""
+        ret = []
+        for field in registry.get(type(self), []):
+            document = field.build(self)
+            if getattr(self, field.attname) != document:
+                setattr(self, field.attname, document)
+                ret.append(field.attname)
+        return ret
+
+    def save(self, *args, **kwargs):
+        changed = self.update_search_documents()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and changed:
+            kwargs['update_fields'] = set(update_fields) | set(changed)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def rebuild_search_documents(cls, queryset=None, using=None):
+        """rebuild the search documents of the queryset (all the rows by
+        default) and return the number of rows that changed"""
+        if queryset is None:
+            queryset = cls._base_manager.using(using)
+        return rebuild(queryset)
+
+
+def rebuild(queryset, batch_size=1000):
+    """rebuild and save the search documents of the rows of the queryset,
+    return the number of rows that changed
+
+    The values of the related sources are fetched with one query per
+    source and batch of rows.
+
+    """
+    model = queryset.model
+    fields = registry.get(model, [])
+    if not fields:
+        return 0
+    manager = model._base_manager.using(queryset.db)
+    paths = set(
+        path for field in fields for path in field.sources
+        if model._meta.get_field(path.split(LOOKUP_SEP, 1)[0]).is_relation
+    )
+    pks = list(queryset.order_by().values_list('pk', flat=True))
+    count = 0
+    for i in range(0, len(pks), batch_size):
+        batch = manager.filter(pk__in=pks[i:i + batch_size])
+        related = {}
+        for path in paths:
+            values = related[path] = {}
+            # sorted like the values read by get_source_values()
+            for pk, value in batch.order_by(path).values_list('pk', path):
+                if value is not None:
+                    values.setdefault(pk, []).append(value)
+        for instance in batch:
+            changed = {}
+            for field in fields:
+                document = field.build(instance, {
+                    path: values.get(instance.pk, [])
+                    for path, values in related.items()
+                })
+                if getattr(instance, field.attname) != document:
+                    changed[field.attname] = document
+            if changed:
+                manager.filter(pk=instance.pk).update(**changed)
+                count += 1
+    return count
+
+
+def register(model, fields):
+    """maintain the search document ``fields`` of the model, done by
+    :class:`SearchDocumentField` for the models declaring it"""
+    registry.setdefault(model, []).extend(fields)
+    _dependencies.clear()
+    connect_receivers()
+
+
+def unregister(model):
+    """stop maintaining the search documents of the model, and return its
+    search document fields"""
+    ret = registry.pop(model, [])
+    _dependencies.clear()
+    connect_receivers()
+    return ret
+
+
+# model -> list of (document model, lookup from the document model to it)
+_dependencies = {}
+# many to many through models used by the sources
+_through_models = set()
+
+
+def get_dependencies(model):
+    """return the ``(document model, lookup)`` tuples of the search
+    documents using instances of the model"""
+    if not _dependencies:
+        _through_models.clear()
+        for document_model, fields in registry.items():
+            _dependencies.setdefault(document_model, []).append(
+                (document_model, 'pk')
+            )
+            for field in fields:
+                for path in field.sources:
+                    _add_dependencies(document_model, path)
+        _dependencies[None] = []
+    return _dependencies.get(model, [])
+
+
+def _add_dependencies(document_model, path):
+    opts = document_model._meta
+    parts = path.split(LOOKUP_SEP)
+    for i, part in enumerate(parts):
+        try:
+            field = opts.get_field(part)
+        except FieldDoesNotExist:
+            return
+        if not field.is_relation or field.related_model is None:
+            return
+        if field.many_to_many:
+            through = getattr(field, 'through', None) or \
+                field.remote_field.through
+            _through_models.add(through)
+        entry = (document_model, LOOKUP_SEP.join(parts[:i + 1]))
+        entries = _dependencies.setdefault(field.related_model, [])
+        if entry not in entries:
+            entries.append(entry)
+        opts = field.related_model._meta
+
+
+def get_affected_pks(model, pks, using, include_self=False):
+    """return a dict mapping the document models to the primary keys of
+    the rows whose documents use the rows ``pks`` of the model
+
+    The rows themselves are included only with ``include_self``, they are
+    rebuilt by :class:`SearchDocumentMixin` when they are saved.
+
+    """
+    ret = {}
+    for document_model, lookup in get_dependencies(model):
+        if lookup == 'pk':
+            if include_self:
+                ret.setdefault(document_model, set()).update(pks)
+            continue
+        ret.setdefault(document_model, set()).update(
+            document_model._base_manager.using(using).filter(**{
+                '%s__in' % lookup: pks
+            }).values_list('pk', flat=True)
+        )
+    return ret
+
+
+def _rebuild_affected(affected, using):
+    for document_model, pks in affected.items():
+        if pks:
+            rebuild(document_model._base_manager.using(using).filter(
+                pk__in=pks
+            ))
+
+
+def _merge(affected, other):
+    for document_model, pks in other.items():
+        affected.setdefault(document_model, set()).update(pks)
+    return affected
+
+
+def _pre_change(sender, instance, raw=False, using=None, **kwargs):
+    if raw or not apps.ready or not get_dependencies(sender) or \
+            instance.pk is None:
+        return
+    # the rows that used the instance before the change
+    instance._datatables_documents = get_affected_pks(sender, [instance.pk],
+                                                      using)
+
+
+def _post_save(sender, instance, raw=False, using=None, **kwargs):
+    if raw or not apps.ready or not get_dependencies(sender):
+        return
+    affected = getattr(instance, '_datatables_documents', {})
+    instance._datatables_documents = {}
+    _rebuild_affected(
+        _merge(affected, get_affected_pks(sender, [instance.pk], using)),
+        using
+    )
+
+
+def _post_delete(sender, instance, using=None, **kwargs):
+    if not apps.ready or not get_dependencies(sender):
+        return
+    affected = getattr(instance, '_datatables_documents', {})
+    instance._datatables_documents = {}
+    _rebuild_affected(affected, using)
+
+
+def _get_m2m_affected(instance, model, pks, using):
+    """return the rows whose documents use a changed many to many relation
+    between the instance and the ``pks`` of the model"""
+    ret = {}
+    document_models = set(
+        document_model for document_model, lookup in
+        get_dependencies(type(instance)) + get_dependencies(model)
+    )
+    for document_model in document_models:
+        if isinstance(instance, document_model):
+            ret[document_model] = {instance.pk}
+        elif model is document_model and pks is not None:
+            ret[document_model] = set(pks)
+        else:
+            # the relation is further from the document model, the rows
+            # that were linked through removed relations are found from
+            # the other side
+            affected = get_affected_pks(type(instance), [instance.pk], using)
+            if pks:
+                _merge(affected, get_affected_pks(model, pks, using))
+            ret[document_model] = affected.get(document_model, set())
+    return ret
+
+
+def _m2m_changed(sender, instance, action, model, pk_set, using, **kwargs):
+    if not apps.ready:
+        return
+    get_dependencies(None)
+    if sender not in _through_models:
+        return
+    if action == 'pre_clear':
+        # pk_set is None when a relation is cleared, the rows that will be
+        # unlinked are the ones linked to the instance
+        instance._datatables_documents = _get_m2m_affected(
+            instance, model, None, using
+        )
+        return
+    if not action.startswith('post_'):
+        return
+    affected = getattr(instance, '_datatables_documents', {})
+    instance._datatables_documents = {}
+    pks = list(pk_set) if pk_set else None
+    _rebuild_affected(
+        _merge(affected, _get_m2m_affected(instance, model, pks, using)),
+        using
+    )
+
+
+UID = 'drf-datatables:documents'
+
+# models the receivers are connected to
+_senders = set()
+_through_senders = set()
+
+
+def connect_receivers():
+    """connect the receivers rebuilding the search documents to the models
+    with a document, the models their sources go through and the through
+    models of their many to many relations only, and disconnect them from
+    the models that don't need them anymore
+
+    Called when the application is ready (once the related models are
+    known) and when the registry changes afterwards.
+
+    """
+    if not apps.models_ready:
+        return
+    get_dependencies(None)
+    senders = set(model for model in _dependencies if model is not None)
+    for model in _senders - senders:
+        for signal in (pre_save, post_save, pre_delete, post_delete):
+            signal.disconnect(sender=model, dispatch_uid=UID)
+    for model in senders - _senders:
+        pre_save.connect(_pre_change, sender=model, dispatch_uid=UID)
+        post_save.connect(_post_save, sender=model, dispatch_uid=UID)
+        pre_delete.connect(_pre_change, sender=model, dispatch_uid=UID)
+        post_delete.connect(_post_delete, sender=model, dispatch_uid=UID)
+    for model in _through_senders - _through_models:
+        m2m_changed.disconnect(sender=model, dispatch_uid=UID)
+    for model in _through_models - _through_senders:
+        m2m_changed.connect(_m2m_changed, sender=model, dispatch_uid=UID)
+    _senders.clear()
+    _senders.update(senders)
+    _through_senders.clear()
+    _through_senders.update(_through_models)
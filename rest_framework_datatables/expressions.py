@@ -0,0 +1,20 @@
+from django.db.models import Aggregate, TextField
+
+
+class GroupConcat(Aggregate):
+    """Concatenate the values of a multi valued relation, separated by
+    commas, with the ``GROUP_CONCAT`` aggregate of SQLite and MySQL
+
+    On PostgreSQL, use ``django.contrib.postgres.aggregates.StringAgg``.
+
+    >>> Album.objects.alias(genre_names=GroupConcat('genres__name'))
+
+    """
+
+    function = 'GROUP_CONCAT'
+    template = '%(function)s(%(distinct)s%(expressions)s)'
+    allow_distinct = True
+
+    def __init__(self, expression, distinct=False, **extra):
+        extra.setdefault('output_field', TextField())
+        super().__init__(expression, distinct=distinct, **extra)
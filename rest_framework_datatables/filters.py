@@ -1,13 +1,38 @@
+import copy
+import datetime
 import operator
 import re
-from functools import reduce
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache, reduce
 
+from django.conf import settings
+from django.db import connections, models, router
 from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework.filters import BaseFilterBackend
 
-from .utils import get_param
-
-
+from .counts import (
+    ExactCount, aggregate_counts, cached_count, capped_count,
+    get_count_queryset
+)
+from .documents import search_document_q
+from .planner import (
+    get_requested_serializer, get_source_paths, load_only, plan_relations
+)
+from .query import get_datatables_query
+from .refinement import (
+    SearchRefinement, get_refinement_cache_key, get_refinement_context
+)
+from .regex import regex_q
+from .search import FTSSearchProvider
+from .serializers import get_kept_fields
+from .utils import (
+    exists_q, get_lookup_field, q_spans_multivalued, query_spans_multivalued
+)
+
+
+@lru_cache(maxsize=1024)
 def is_valid_regex(regex):
     """helper function that checks regex for validity"""
     try:
@@ -17,20 +42,238 @@ def is_valid_regex(regex):
         return False
 
 
-def f_search_q(f, search_value, search_regex=False):
+def f_search_q(f, search_value, search_regex=False, lookup='icontains'):
     """helper function that returns a Q-object for a search value"""
     qs = []
     if search_value and search_value != 'false':
         if search_regex:
             if is_valid_regex(search_value):
                 for x in f['name']:
-                    qs.append(Q(**{'%s__iregex' % x: search_value}))
+                    qs.append(regex_q(x, search_value))
         else:
             for x in f['name']:
-                qs.append(Q(**{'%s__icontains' % x: search_value}))
+                qs.append(Q(**{'%s__%s' % (x, lookup): search_value}))
     return reduce(operator.or_, qs, Q())
 
 
+@lru_cache(maxsize=1024)
+def get_search_type(model, path):
+    """return how the field at the end of the lookup path is searched by
+    the typed global search: 'text', 'integer', 'number', 'date',
+    'datetime', 'boolean' or 'other'"""
+    field = get_lookup_field(model, path)
+    if isinstance(field, models.BooleanField):
+        return 'boolean'
+    if isinstance(field, models.DateTimeField):
+        return 'datetime'
+    if isinstance(field, models.DateField):
+        return 'date'
+    if isinstance(field, (models.IntegerField, models.AutoField)):
+        return 'integer'
+    if isinstance(field, (models.FloatField, models.DecimalField)):
+        return 'number'
+    if isinstance(field, (models.CharField, models.TextField)):
+        return 'text'
+    return 'other'
+
+
+def parse_integer(model, path, value):
+    """return the value as an integer, raise ValueError if it isn't one or
+    if it's out of the range of the integer field of the lookup path (the
+    database driver would fail to convert it)"""
+    ret = int(value)
+    field = get_lookup_field(model, path)
+    ops = connections[router.db_for_read(model)].ops
+    try:
+        min_value, max_value = ops.integer_field_range(
+            field.get_internal_type()
+        )
+    except KeyError:
+        # custom integer field
+        return ret
+    if (
+            (min_value is not None and ret < min_value)
+            or (max_value is not None and ret > max_value)):
+        raise ValueError('%d is out of range' % ret)
+    return ret
+
+
+YEAR_RE = re.compile(r'^(\d{4})$')
+MONTH_RE = re.compile(r'^(\d{4})-(\d{1,2})$')
+
+
+def parse_date_range(value):
+    """return the ``(first day, last day)`` of a date, month (YYYY-MM) or
+    year (YYYY), or None"""
+    try:
+        match = YEAR_RE.match(value)
+        if match:
+            year = int(match.group(1))
+            return datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+        match = MONTH_RE.match(value)
+        if match:
+            year, month = int(match.group(1)), int(match.group(2))
+            start = datetime.date(year, month, 1)
+            if month == 12:
+                end = datetime.date(year + 1, 1, 1)
+            else:
+                end = datetime.date(year, month + 1, 1)
+            return start, end - datetime.timedelta(days=1)
+        date = parse_date(value)
+    except ValueError:
+        return None
+    if date is None:
+        return None
+    return date, date
+
+
+def typed_search_q(model, path, search_value, lookup='icontains'):
+    """return a Q-object searching the value in the field of the lookup
+    path according to its type, or None if the value can't be found in
+    such a field
+
+    Numbers are searched with ``exact`` in numeric fields, dates, months
+    and years with a range in date fields, and text fields are searched
+    with ``lookup``. Boolean fields are not searched.
+
+    """
+    search_type = get_search_type(model, path)
+    value = search_value.strip()
+    if search_type == 'integer':
+        try:
+            return Q(**{path: parse_integer(model, path, value)})
+        except ValueError:
+            return None
+    if search_type == 'number':
+        try:
+            return Q(**{path: Decimal(value)})
+        except InvalidOperation:
+            return None
+    if search_type in ('date', 'datetime'):
+        dates = parse_date_range(value)
+        if dates is None:
+            return None
+        start, end = dates
+        if search_type == 'date':
+            return Q(**{'%s__range' % path: (start, end)})
+        start = datetime.datetime.combine(start, datetime.time.min)
+        end = datetime.datetime.combine(
+            end + datetime.timedelta(days=1), datetime.time.min
+        )
+        if settings.USE_TZ:
+            start = timezone.make_aware(start)
+            end = timezone.make_aware(end)
+        return Q(**{'%s__gte' % path: start, '%s__lt' % path: end})
+    if search_type == 'boolean':
+        return None
+    return Q(**{'%s__%s' % (path, lookup): search_value})
+
+
+def f_typed_search_q(model, f, search_value, lookup='icontains'):
+    """helper function that returns a Q-object for a search value, taking
+    the type of the fields into account (see :func:`typed_search_q`)
+
+    If none of the fields can contain the value, the Q-object matches no
+    rows.
+
+    """
+    if not search_value or search_value == 'false':
+        return Q()
+    qs = []
+    for x in f['name']:
+        q = typed_search_q(model, x, search_value, lookup)
+        if q is not None:
+            qs.append(q)
+    if not qs:
+        return Q(pk__in=[])
+    return reduce(operator.or_, qs)
+
+
+RANGE_DELIMITERS = ('-yadcf_delim-', '..')
+
+
+def split_range(search_value, delimiters=RANGE_DELIMITERS):
+    """return the ``(min, max)`` of a range search value such as
+    ``1990..2000`` or ``1990-yadcf_delim-2000`` (either may be empty), or
+    None if the value is not a range"""
+    for delimiter in delimiters:
+        if delimiter in search_value:
+            low, high = search_value.split(delimiter, 1)
+            return low.strip(), high.strip()
+    return None
+
+
+def range_search_q(model, path, search_value, delimiters=RANGE_DELIMITERS):
+    """return a Q-object selecting the values of the numeric or date field
+    of the lookup path within the range, or None if the value is not a
+    range or the field is not numeric or a date
+
+    A bound that can't be converted to the type of the field matches no
+    rows. The bounds of date ranges may be dates, months or years, which
+    are included: ``2020-01..2020-03`` matches all the days of March.
+
+    """
+    search_type = get_search_type(model, path)
+    if search_type not in ('integer', 'number', 'date', 'datetime'):
+        return None
+    bounds = split_range(search_value, delimiters)
+    if bounds is None:
+        return None
+    q = Q()
+    for bound, upper in zip(bounds, (False, True)):
+        if not bound:
+            continue
+        lookup = 'lte' if upper else 'gte'
+        try:
+            if search_type == 'integer':
+                value = parse_integer(model, path, bound)
+            elif search_type == 'number':
+                value = Decimal(bound)
+            else:
+                dates = parse_date_range(bound)
+                if dates is None:
+                    return Q(pk__in=[])
+                value = dates[1] if upper else dates[0]
+                if search_type == 'datetime':
+                    if upper:
+                        value += datetime.timedelta(days=1)
+                        lookup = 'lt'
+                    value = datetime.datetime.combine(value,
+                                                      datetime.time.min)
+                    if settings.USE_TZ:
+                        value = timezone.make_aware(value)
+        except (ValueError, InvalidOperation):
+            return Q(pk__in=[])
+        q &= Q(**{'%s__%s' % (path, lookup): value})
+    return q
+
+
+def f_range_search_q(model, f, search_value, delimiters=RANGE_DELIMITERS,
+                     lookup='icontains'):
+    """helper function that returns a Q-object for a range search value
+    (see :func:`range_search_q`), or None if none of the fields can be
+    searched with a range
+
+    The fields that are neither numeric nor dates are searched with
+    ``lookup``.
+
+    """
+    if not search_value or split_range(search_value, delimiters) is None:
+        return None
+    qs = [range_search_q(model, x, search_value, delimiters)
+          for x in f['name']]
+    if all(q is None for q in qs):
+        return None
+    return reduce(operator.or_, [
+        Q(**{'%s__%s' % (x, lookup): search_value}) if q is None else q
+        for x, q in zip(f['name'], qs)
+    ])
+
+
+# prefix of the aliases of the column expressions
+COLUMN_EXPRESSION_PREFIX = 'datatables_column_'
+
+
 class DatatablesBaseFilterBackend(BaseFilterBackend):
     """Base class for definining your own DatatablesFilterBackend classes"""
 
@@ -40,55 +283,16 @@ class DatatablesBaseFilterBackend(BaseFilterBackend):
     def parse_datatables_query(self, request, view):
         """parse request.query_params into a list of fields and orderings and
         global search parameters (value and regex)"""
+        query = get_datatables_query(request)
         ret = {}
         ret['fields'] = self.get_fields(request)
-        ret['search_value'] = get_param(request, 'search[value]')
-        ret['search_regex'] = get_param(request, 'search[regex]') == 'true'
+        ret['search_value'] = query.search_value
+        ret['search_regex'] = query.search_regex
         return ret
 
     def get_fields(self, request):
         """called by parse_query_params to get the list of fields"""
-        fields = []
-        i = 0
-        while True:
-            col = 'columns[%d][%s]'
-            data = get_param(request, col % (i, 'data'))
-            if data == "":  # null or empty string on datatables (JS) side
-                fields.append({'searchable': False, 'orderable': False})
-                i += 1
-                continue
-            # break out only when there are no more fields to get.
-            if data is None:
-                break
-            name = get_param(request, col % (i, 'name'))
-            if not name:
-                name = data
-            search_col = col % (i, 'search')
-            # to be able to search across multiple fields (e.g. to search
-            # through concatenated names), we create a list of the name field,
-            # replacing dot notation with double-underscores and splitting
-            # along the commas.
-            field = {
-                'name': [
-                    n.lstrip() for n in name.replace('.', '__').split(',')
-                ],
-                'data': data,
-                'searchable': get_param(
-                    request, col % (i, 'searchable')
-                ) == 'true',
-                'orderable': get_param(
-                    request, col % (i, 'orderable')
-                ) == 'true',
-                'search_value': get_param(
-                    request, '%s[%s]' % (search_col, 'value')
-                ),
-                'search_regex': get_param(
-                    request, '%s[%s]' % (search_col, 'regex')
-                ) == 'true',
-            }
-            fields.append(field)
-            i += 1
-        return fields
+        return get_datatables_query(request).columns
 
     def get_ordering_fields(self, request, view, fields):
         """called by parse_query_params to get the ordering
@@ -101,38 +305,249 @@ class DatatablesBaseFilterBackend(BaseFilterBackend):
 
         """
         ret = []
-        i = 0
-        while True:
-            col = 'order[%d][%s]'
-            idx = get_param(request, col % (i, 'column'))
-            if idx is None:
-                break
+        for order in get_datatables_query(request).order:
             try:
-                field = fields[int(idx)]
+                field = fields[order.column.index]
             except IndexError:
-                i += 1
                 continue
             if not field['orderable']:
-                i += 1
                 continue
-            dir_ = get_param(request, col % (i, 'dir'), 'asc')
-            ret.append((field, dir_))
-            i += 1
+            ret.append((field, order.dir))
         return ret
 
-    def set_count_before(self, view, total_count):
-        # set the queryset count as an attribute of the view for later
-        # TODO: find a better way than this hack
-        setattr(view, '_datatables_total_count', total_count)
+    def get_total_count(self, view):
+        """return the count of the unfiltered queryset of the view
+
+        return value is a tuple ``(count, approximate)``.
+
+        The count is computed by the ``datatables_count_strategy`` of the
+        view (see :mod:`rest_framework_datatables.counts`), exact counts
+        use :meth:`get_queryset_count_before`.
+
+        If the view has a ``datatables_count_cache_timeout`` attribute,
+        the count is stored in the cache (``datatables_count_cache_alias``,
+        ``'default'`` if not set) for that many seconds, and invalidated
+        when an instance of one of the models used by the queryset is
+        saved or deleted.
+
+        """
+        queryset = view.get_queryset()
+        strategy = getattr(view, 'datatables_count_strategy', None)
+        if strategy is None:
+            strategy = ExactCount()
+
+        def count(queryset):
+            return strategy.count(queryset, self.get_queryset_count_before)
+
+        timeout = getattr(view, 'datatables_count_cache_timeout', None)
+        if timeout is None:
+            return count(queryset)
+        return cached_count(
+            queryset,
+            count,
+            key='%s.%s' % (view.__module__, view.__class__.__qualname__),
+            timeout=timeout,
+            alias=getattr(view, 'datatables_count_cache_alias', 'default'),
+        )
+
+    def has_default_total_count(self, view):
+        """return True if the total count of the view is a plain count of
+        its queryset (no count strategy nor count cache)"""
+        return (
+            getattr(view, 'datatables_count_strategy', None) is None
+            and getattr(view, 'datatables_count_cache_timeout', None) is None
+        )
+
+    def use_aggregate_counts(self, view):
+        """return True if the view wants its counts to be computed in a
+        single aggregate query (``datatables_aggregate_counts``)
+
+        This is not compatible with ``datatables_count_cap``.
+
+        """
+        return (
+            getattr(view, 'datatables_aggregate_counts', False)
+            and getattr(view, 'datatables_count_cap', None) is None
+        )
+
+    def get_queryset_count_before(self, queryset):
+        """
+        Provide an overrideable method to return a custom count.
+        This can be useful for very large tables, as calls to model.count()
+        can be very expensive.
+
+        The default implementation counts the queryset returned by
+        :func:`~rest_framework_datatables.counts.get_count_queryset`.
+        """
+        return get_count_queryset(queryset).count()
+
+    def get_queryset_count_after(self, queryset):
+        """
+        See
+        :meth:`~rest_framework_datatables.filters.DatatablesBaseFilterBackend.get_queryset_count_before`.
+        """
+        return get_count_queryset(queryset).count()
+
+    def get_filtered_count(self, view, queryset):
+        """return the count of the filtered queryset
+
+        return value is a tuple ``(count, capped)``.
+
+        If the view has a ``datatables_count_cap`` attribute, at most that
+        many rows are counted, which bounds the cost of the count for
+        searches matching a large part of the table. Otherwise
+        :meth:`get_queryset_count_after` is used.
+
+        The count is None if the paginator of the view counts the rows
+        itself along with the page (see
+        :attr:`~rest_framework_datatables.pagination.DatatablesMixin.count_with_window`).
+
+        """
+        paginator = getattr(view, 'paginator', None)
+        if getattr(paginator, 'count_with_window', False):
+            return None, False
+        cap = getattr(view, 'datatables_count_cap', None)
+        if cap is None:
+            return self.get_queryset_count_after(queryset), False
+        return capped_count(queryset, cap)
+
+    def get_exists_q(self, view, model, q):
+        """return the Q object to filter the queryset with
+
+        If the view has ``datatables_search_exists = True``, the lookups
+        spanning many to many or reverse foreign key relations are
+        rewritten as ``EXISTS`` subqueries (see
+        :func:`~rest_framework_datatables.utils.exists_q`).
+
+        """
+        if not getattr(view, 'datatables_search_exists', False):
+            return q
+        return exists_q(model, q)
+
+    def get_column_expressions(self, view):
+        """return the ``datatables_column_expressions`` of the view, a dict
+        mapping the ``data`` of columns to the expression they are searched
+        and ordered by"""
+        return getattr(view, 'datatables_column_expressions', None) or {}
+
+    def get_column_alias(self, column):
+        """return the name of the alias of the expression of the column"""
+        return COLUMN_EXPRESSION_PREFIX + re.sub(r'\W', '_', column.data)
+
+    def alias_column_expressions(self, queryset, expressions, columns):
+        """alias the expressions of the columns on the queryset
+
+        The expressions are only aliased when a column needs them, so that
+        an aggregate (which adds a ``GROUP BY`` to the query) or a costly
+        expression is not computed for columns that are neither searched
+        nor ordered.
 
-    def set_count_after(self, view, filtered_count):
-        """called by filter_queryset to store the ordering after the filter
+        """
+        aliases = {}
+        for column in columns:
+            name = self.get_column_alias(column)
+            if (
+                    column.data in expressions
+                    and name not in queryset.query.annotations):
+                aliases[name] = expressions[column.data]
+        if not aliases:
+            return queryset
+        return queryset.alias(**aliases)
+
+    def filter_q(self, queryset, q):
+        """filter the queryset with the Q object
+
+        ``DISTINCT`` is only added if one of the lookups, or a join of the
+        queryset, goes through a many to many or reverse foreign key
+        relation, as it prevents the database from using an index to
+        return the first rows in order.
+
+        """
+        queryset = queryset.filter(q)
+        if (
+                q_spans_multivalued(queryset.model, q)
+                or query_spans_multivalued(queryset.query)):
+            queryset = queryset.distinct()
+        return queryset
+
+    def plan_queryset(self, request, view, queryset):
+        """prepare the queryset for the serialization of the requested
+        columns, with :meth:`select_requested_relations` and
+        :meth:`load_requested_fields`"""
+        plan = getattr(view, 'datatables_plan_relations', False)
+        only = getattr(view, 'datatables_load_only', False)
+        if not plan and not only:
+            return queryset
+        serializer = get_requested_serializer(view)
+        if serializer is None:
+            return queryset
+        if plan:
+            queryset = self.select_requested_relations(request, view,
+                                                       queryset, serializer)
+        if only:
+            queryset = self.load_requested_fields(request, view, queryset,
+                                                  serializer)
+        return queryset
+
+    def select_requested_relations(self, request, view, queryset,
+                                   serializer):
+        """follow the relations read by the requested columns, if the view
+        has ``datatables_plan_relations = True``
+
+        The foreign keys are followed with ``select_related()`` and the to
+        many relations are prefetched with a queryset only loading the
+        fields they need (see
+        :func:`~rest_framework_datatables.planner.plan_relations`). The
+        ``datatables_column_relations`` of the view maps the ``data`` of
+        columns to the relations they need but that the serializer doesn't
+        tell (for instance in a ``SerializerMethodField``).
+
+        """
+        column_relations = getattr(view, 'datatables_column_relations', {})
+        requested = set(
+            c.data for c in get_datatables_query(request).columns
+        ) | set(get_kept_fields(request))
+        lookups = []
+        for data, relations in column_relations.items():
+            if data in requested:
+                lookups.extend(relations)
+        return plan_relations(queryset, serializer, lookups)
+
+    def load_requested_fields(self, request, view, queryset, serializer):
+        """restrict the queryset to the model fields read by the requested
+        columns, if the view has ``datatables_load_only = True``
+
+        The fields are found from the ``source`` of the serializer fields of
+        the columns, of the ``DT_Row*`` fields and of the other fields that
+        are always serialized (see
+        :func:`~rest_framework_datatables.planner.get_source_paths`), the
+        fields of the ``datatables_always_load`` of the view are added to
+        them.
+
+        """
+        paths = get_source_paths(serializer, queryset.model)
+        paths.update(getattr(view, 'datatables_always_load', ()))
+        return load_only(queryset, paths)
+
+    def set_count_before(self, view, total_count, approximate=False):
+        """called by filter_queryset to store the count before the filter
+        operations
+
+        """
+        query = get_datatables_query(view.request)
+        query.total_count = total_count
+        query.total_count_approximate = approximate
+
+    def set_count_after(self, view, filtered_count, approximate=False,
+                        capped=False):
+        """called by filter_queryset to store the count after the filter
         operations
 
         """
-        # set the queryset count as an attribute of the view for later
-        # TODO: maybe find a better way than this hack ?
-        setattr(view, '_datatables_filtered_count', filtered_count)
+        query = get_datatables_query(view.request)
+        query.filtered_count = filtered_count
+        query.filtered_count_approximate = approximate
+        query.filtered_count_capped = capped
 
     def append_additional_ordering(self, ordering, view):
         if len(ordering):
@@ -170,44 +585,293 @@ class DatatablesFilterBackend(DatatablesBaseFilterBackend):
         if not self.check_renderer_format(request):
             return queryset
 
-        total_count = view.get_queryset().count()
-        self.set_count_before(view, total_count)
-
-        if len(getattr(view, 'filter_backends', [])) > 1:
-            # case of a view with more than 1 filter backend
-            filtered_count_before = queryset.count()
-        else:
-            filtered_count_before = total_count
-
         datatables_query = self.parse_datatables_query(request, view)
-
-        q = self.get_q(datatables_query)
-        if q:
-            queryset = queryset.filter(q).distinct()
-            filtered_count = queryset.count()
+        expressions = datatables_query.get('column_expressions', {})
+        queryset = self.alias_column_expressions(
+            queryset, expressions, self.get_searched_fields(datatables_query)
+        )
+        datatables_query['queryset'] = queryset
+        search_q = self.get_q(datatables_query)
+        q = self.get_exists_q(view, queryset.model, search_q)
+        refinement = self.get_search_refinement(request, view, queryset,
+                                                datatables_query, search_q)
+        if refinement is not None:
+            q = refinement.restrict(q)
+        multiple_backends = len(getattr(view, 'filter_backends', [])) > 1
+
+        capped = False
+        if (
+                q and self.use_aggregate_counts(view)
+                # an aggregate expression can't be used in the counts
+                and queryset.query.group_by is None):
+            # count before and after the search in one query, which also
+            # gives the total count unless another backend filtered the
+            # queryset or the view computes its total count differently
+            count_before, filtered_count = aggregate_counts(
+                queryset, q, distinct=(
+                    q_spans_multivalued(queryset.model, q)
+                    or query_spans_multivalued(queryset.query)
+                )
+            )
+            if multiple_backends or not self.has_default_total_count(view):
+                total_count, approximate = self.get_total_count(view)
+            else:
+                total_count, approximate = count_before, False
+            self.set_count_before(view, total_count, approximate)
+            self.set_count_after(view, filtered_count)
+            queryset = self.filter_q(queryset, q)
         else:
-            filtered_count = filtered_count_before
-        self.set_count_after(view, filtered_count)
-
+            total_count, approximate = self.get_total_count(view)
+            self.set_count_before(view, total_count, approximate)
+
+            if multiple_backends:
+                # case of a view with more than 1 filter backend
+                filtered_count_before, capped = self.get_filtered_count(
+                    view, queryset
+                )
+                approximate = False
+            else:
+                filtered_count_before = total_count
+
+            if q:
+                queryset = self.filter_q(queryset, q)
+                filtered_count, capped = self.get_filtered_count(
+                    view, queryset
+                )
+                approximate = False
+            else:
+                filtered_count = filtered_count_before
+            self.set_count_after(view, filtered_count, approximate, capped)
+
+        if refinement is not None:
+            refinement.save(queryset, None if capped else filtered_count)
+
+        ordering_fields = self.get_ordering_fields(
+            request, view, datatables_query['fields']
+        )
+        queryset = self.alias_column_expressions(
+            queryset, expressions, [f for f, dir_ in ordering_fields]
+        )
         ordering = self.get_ordering(request, view, datatables_query['fields'])
         if ordering:
             queryset = queryset.order_by(*ordering)
 
-        return queryset
+        return self.plan_queryset(request, view, queryset)
+
+    def get_search_refinement(self, request, view, queryset,
+                              datatables_query, q=None):
+        """return the :class:`SearchRefinement` of the global search, if the
+        view has a ``datatables_refine_cache_timeout`` and the request a
+        session
+
+        Only substring searches (``icontains`` or a search document) can
+        be refined, not regex or typed searches. ``q`` is the Q object of
+        the search: the models it joins are versioned along with the
+        queryset.
+
+        """
+        timeout = getattr(view, 'datatables_refine_cache_timeout', None)
+        search_value = datatables_query['search_value']
+        if (
+                timeout is None
+                or not search_value or search_value == 'false'
+                or datatables_query['search_regex']
+                or datatables_query.get('typed_search')):
+            return None
+        columns = [f for f in datatables_query['fields'] if f.searchable]
+        if not datatables_query.get('search_document') and any(
+                self.get_search_lookup(datatables_query, f) != 'icontains'
+                for f in columns):
+            return None
+        session = getattr(request, 'session', None)
+        session_key = getattr(session, 'session_key', None)
+        if not session_key:
+            return None
+        alias = getattr(view, 'datatables_refine_cache_alias', 'default')
+        context = get_refinement_context(
+            queryset,
+            [(f.name, f.search_value, f.search_regex)
+             for f in datatables_query['fields']],
+            datatables_query.get('search_document'),
+            alias=alias,
+            searched_queryset=None if q is None else queryset.filter(q)
+        )
+        if context is None:
+            return None
+        return SearchRefinement(
+            get_refinement_cache_key(session_key, view),
+            datatables_query.get('search_tokens') or [search_value],
+            context, timeout, alias=alias,
+            max_pks=getattr(view, 'datatables_refine_max_pks', 1000)
+        )
+
+    def get_searched_fields(self, datatables_query):
+        """return the columns that are searched, by the global search or
+        by their own search value"""
+        search_value = datatables_query['search_value']
+        global_search = bool(search_value) and search_value != 'false'
+        return [
+            f for f in datatables_query['fields']
+            if f.searchable and (
+                global_search
+                or (f.search_value and f.search_value != 'false')
+            )
+        ]
 
     def get_q(self, datatables_query):
+        return (
+            self.get_search_q(datatables_query)
+            & self.get_columns_q(datatables_query)
+        )
+
+    def get_search_provider(self, view):
+        """return the search provider answering the global search, the
+        ``datatables_search_provider`` of the view (see
+        :mod:`rest_framework_datatables.search`)"""
+        return getattr(view, 'datatables_search_provider', None)
+
+    def parse_datatables_query(self, request, view):
+        ret = super(DatatablesFilterBackend, self).parse_datatables_query(
+            request, view
+        )
+        ret['search_lookups'] = getattr(view, 'datatables_search_lookups',
+                                        {})
+        ret['search_tokens'] = self.get_search_tokens(
+            view, ret['search_value'], ret['search_regex']
+        )
+        ret['typed_search'] = getattr(view, 'datatables_typed_search', False)
+        ret['range_delimiters'] = getattr(view, 'datatables_range_delimiters',
+                                          RANGE_DELIMITERS)
+        ret['search_document'] = getattr(view, 'datatables_search_document',
+                                         None)
+        ret['search_provider'] = self.get_search_provider(view)
+        # the queryset being filtered, set by filter_queryset(): the typed,
+        # range and provider searches need it
+        ret['queryset'] = None
+        ret['column_expressions'] = self.get_column_expressions(view)
+        if ret['column_expressions']:
+            # the columns with an expression are searched and ordered by
+            # its alias
+            fields = []
+            for f in ret['fields']:
+                if f.data in ret['column_expressions']:
+                    f = copy.copy(f)
+                    f.name = [self.get_column_alias(f)]
+                fields.append(f)
+            ret['fields'] = fields
+        return ret
+
+    def get_search_tokens(self, view, search_value, search_regex):
+        """return the words of the global search if the view has
+        ``datatables_tokenize_search = True``, None otherwise
+
+        Only the first ``datatables_search_max_tokens`` (8 by default)
+        distinct words are kept, as each of them is searched in all the
+        searchable columns.
+
+        """
+        if (
+                not getattr(view, 'datatables_tokenize_search', False)
+                or not search_value or search_value == 'false'
+                or search_regex):
+            return None
+        max_tokens = getattr(view, 'datatables_search_max_tokens', 8)
+        tokens = []
+        for token in search_value.split():
+            if token not in tokens:
+                tokens.append(token)
+        return tokens[:max_tokens]
+
+    def get_search_lookup(self, datatables_query, field):
+        """return the lookup used to search the column, from the
+        ``datatables_search_lookups`` of the view (``icontains`` by
+        default)"""
+        return datatables_query.get('search_lookups', {}).get(
+            field.data, 'icontains'
+        )
+
+    def get_search_q(self, datatables_query):
+        """return the Q object of the global search
+
+        With tokens, each of them must be found in at least one column.
+
+        """
+        tokens = datatables_query.get('search_tokens')
+        if not tokens:
+            return self.get_term_q(datatables_query,
+                                   datatables_query['search_value'])
         q = Q()
-        initial_q = Q()
+        for token in tokens:
+            q &= self.get_term_q(datatables_query, token)
+        return q
+
+    def get_term_q(self, datatables_query, search_value):
+        """return the Q object searching ``search_value`` in all the
+        searchable columns
+
+        With a ``datatables_search_document``, the value is searched in
+        that field only (see :mod:`rest_framework_datatables.documents`).
+
+        """
+        if (
+                datatables_query.get('search_document')
+                and search_value and search_value != 'false'
+                and not datatables_query['search_regex']):
+            return search_document_q(datatables_query['search_document'],
+                                     search_value)
+        columns = [f for f in datatables_query['fields'] if f.searchable]
+        provider = datatables_query.get('search_provider')
+        queryset = datatables_query.get('queryset')
+        q = None
+        if (
+                provider is not None and queryset is not None
+                and search_value and search_value != 'false'
+                and not datatables_query['search_regex']):
+            # providers search substrings, like icontains
+            supported = [
+                f for f in columns
+                if self.get_search_lookup(datatables_query, f) == 'icontains'
+                and provider.supports(queryset, f)
+            ]
+            if supported:
+                q = provider.search(queryset, search_value, supported)
+            if q is not None:
+                if not isinstance(q, Q):
+                    q = Q(pk__in=list(q))
+                columns = [f for f in columns if f not in supported]
+        if q is None:
+            q = Q()
+        typed = (
+            datatables_query.get('typed_search')
+            and not datatables_query['search_regex']
+            and queryset is not None
+        )
+        for f in columns:
+            lookup = self.get_search_lookup(datatables_query, f)
+            if typed:
+                q |= f_typed_search_q(queryset.model, f, search_value,
+                                      lookup)
+            else:
+                q |= f_search_q(f, search_value,
+                                datatables_query['search_regex'], lookup)
+        return q
+
+    def get_columns_q(self, datatables_query):
+        """return the Q object of the column searches"""
+        q = Q()
+        delimiters = datatables_query.get('range_delimiters')
+        queryset = datatables_query.get('queryset')
         for f in datatables_query['fields']:
-            if not f['searchable']:
+            if not f.searchable:
                 continue
-            q |= f_search_q(f,
-                            datatables_query['search_value'],
-                            datatables_query['search_regex'])
-            initial_q &= f_search_q(f,
-                                    f.get('search_value'),
-                                    f.get('search_regex', False))
-        q &= initial_q
+            lookup = self.get_search_lookup(datatables_query, f)
+            if delimiters and not f.search_regex and queryset is not None:
+                range_q = f_range_search_q(queryset.model, f, f.search_value,
+                                           delimiters, lookup)
+                if range_q is not None:
+                    q &= range_q
+                    continue
+            q &= f_search_q(f, f.search_value, f.search_regex, lookup)
         return q
 
     def get_ordering(self, request, view, fields):
@@ -221,7 +885,26 @@ class DatatablesFilterBackend(DatatablesBaseFilterBackend):
         for field, dir_ in self.get_ordering_fields(request, view, fields):
             ordering.append('%s%s' % (
                 '-' if dir_ == 'desc' else '',
-                field['name'][0]
+                field.name[0]
             ))
         self.append_additional_ordering(ordering, view)
         return ordering
+
+
+class DatatablesFTSFilterBackend(DatatablesFilterBackend):
+    """
+    Filter that answers the global search with the SQLite FTS5 index
+    registered for the model (see :mod:`rest_framework_datatables.fts`).
+
+    The columns that are not in the index, regex searches, searches
+    shorter than 3 characters and databases without the index are
+    searched like with :class:`DatatablesFilterBackend`.
+    """
+
+    def get_search_provider(self, view):
+        provider = super(DatatablesFTSFilterBackend, self).get_search_provider(
+            view
+        )
+        if provider is None:
+            provider = FTSSearchProvider()
+        return provider
@@ -0,0 +1,189 @@
+import time
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+
+
+# model -> FTSIndex
+registry = {}
+
+
+class FTSIndex(object):
+    """A SQLite FTS5 table shadowing some text columns of a model
+
+    The rowid of the FTS table is the primary key of the model, which must
+    be an integer. The ``trigram`` tokenizer (SQLite >= 3.34) makes a
+    ``MATCH`` of a quoted term behave like a case insensitive substring
+    search of at least 3 characters.
+
+    """
+
+    # seconds a missing FTS table is remembered
+    missing_timeout = 5
+
+    def __init__(self, model, fields, table=None, tokenize='trigram'):
+        self.model = model
+        self.fields = list(fields)
+        self.columns = [model._meta.get_field(f).column for f in self.fields]
+        self.table = table or '%s_fts' % model._meta.db_table
+        self.tokenize = tokenize
+        # database aliases where the FTS table exists
+        self._available = set()
+        # database alias -> time until which the FTS table is known missing
+        self._missing = {}
+
+    def is_available(self, using='default'):
+        """return True if the index can be used on the database
+
+        A positive answer is remembered until the table is dropped. A
+        negative one only for ``missing_timeout`` seconds: the table may be
+        created by another process (``rebuild_datatables_fts``) at any time,
+        and the instances saved before it is noticed are only indexed by
+        the next rebuild.
+
+        """
+        if using in self._available:
+            return True
+        connection = connections[using]
+        if connection.vendor != 'sqlite':
+            return False
+        if self._missing.get(using, 0) > time.monotonic():
+            return False
+        if self.table in connection.introspection.table_names():
+            self._missing.pop(using, None)
+            self._available.add(using)
+            return True
+        self._missing[using] = time.monotonic() + self.missing_timeout
+        return False
+
+    def create(self, using='default'):
+        """create the FTS table, without filling it"""
+        connection = connections[using]
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(%s, "
+                "tokenize='%s')" % (
+                    quote(self.table),
+                    ', '.join(quote(c) for c in self.columns),
+                    self.tokenize,
+                )
+            )
+        self._available.discard(using)
+        self._missing.pop(using, None)
+
+    def drop(self, using='default'):
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS %s'
+                           % connection.ops.quote_name(self.table))
+        self._available.discard(using)
+        self._missing.pop(using, None)
+
+    def rebuild(self, using='default'):
+        """create the FTS table if needed and fill it from the model
+        table"""
+        self.create(using)
+        connection = connections[using]
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(c) for c in self.columns)
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s' % quote(self.table))
+            cursor.execute(
+                'INSERT INTO %s(rowid, %s) SELECT %s, %s FROM %s' % (
+                    quote(self.table), columns,
+                    quote(self.model._meta.pk.column), columns,
+                    quote(self.model._meta.db_table),
+                )
+            )
+
+    def update(self, instance, using='default'):
+        """index (again) a model instance"""
+        if not self.is_available(using):
+            return
+        self.delete(instance.pk, using)
+        connection = connections[using]
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO %s(rowid, %s) VALUES (%s)' % (
+                    quote(self.table),
+                    ', '.join(quote(c) for c in self.columns),
+                    ', '.join(['%s'] * (len(self.columns) + 1)),
+                ),
+                [instance.pk] + [getattr(instance, f) for f in self.fields]
+            )
+
+    def delete(self, pk, using='default'):
+        if not self.is_available(using):
+            return
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM %s WHERE rowid = %%s'
+                % connection.ops.quote_name(self.table),
+                [pk]
+            )
+
+    def get_match(self, search_value, fields):
+        """return the FTS5 query matching ``search_value`` in ``fields``,
+        or None if the index can't answer it"""
+        if len(search_value) < 3 and self.tokenize == 'trigram':
+            return None
+        columns = [self.columns[self.fields.index(f)] for f in fields]
+        return '{%s}: "%s"' % (
+            ' '.join(columns), search_value.replace('"', '""')
+        )
+
+    def get_q(self, search_value, fields, using='default'):
+        """return a Q object selecting the rows whose ``fields`` contain
+        ``search_value``, or None if the index can't be used"""
+        if not fields or not self.is_available(using):
+            return None
+        match = self.get_match(search_value, fields)
+        if match is None:
+            return None
+        table = connections[using].ops.quote_name(self.table)
+        return Q(pk__in=RawSQL(
+            'SELECT rowid FROM %s WHERE %s MATCH %%s' % (table, table),
+            [match]
+        ))
+
+
+def _update(sender, instance, using, **kwargs):
+    registry[sender].update(instance, using)
+
+
+def _delete(sender, instance, using, **kwargs):
+    registry[sender].delete(instance.pk, using)
+
+
+def register(model, fields, **kwargs):
+    """register an FTS index for the text ``fields`` of the model
+
+    The index is kept up to date when instances are saved or deleted,
+    the table is created and filled by the ``rebuild_datatables_fts``
+    management command.
+
+    """
+    index = FTSIndex(model, fields, **kwargs)
+    registry[model] = index
+    uid = 'drf-datatables:fts:%s' % model._meta.label_lower
+    post_save.connect(_update, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(_delete, sender=model, weak=False, dispatch_uid=uid)
+    return index
+
+
+def unregister(model):
+    """remove the FTS index of the model from the registry, and stop
+    updating it"""
+    registry.pop(model, None)
+    uid = 'drf-datatables:fts:%s' % model._meta.label_lower
+    post_save.disconnect(sender=model, dispatch_uid=uid)
+    post_delete.disconnect(sender=model, dispatch_uid=uid)
+
+
+def get_index(model):
+    return registry.get(model)
@@ -0,0 +1,41 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from rest_framework_datatables import fts
+
+
+class Command(BaseCommand):
+    help = 'Create and fill the SQLite FTS5 search indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*', metavar='app_label.ModelName',
+            help='Rebuild the indexes of these models only.'
+        )
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Nominates a database to rebuild the indexes in. Defaults '
+                 'to the "default" database.'
+        )
+
+    def handle(self, *args, **options):
+        if options['models']:
+            indexes = []
+            for label in options['models']:
+                try:
+                    model = apps.get_model(label)
+                except (LookupError, ValueError) as exc:
+                    raise CommandError(str(exc))
+                if fts.get_index(model) is None:
+                    raise CommandError('No FTS index registered for %s.'
+                                       % label)
+                indexes.append(fts.get_index(model))
+        else:
+            indexes = list(fts.registry.values())
+        for index in indexes:
+            index.rebuild(using=options['database'])
+            if options['verbosity'] > 0:
+                self.stdout.write('Rebuilt %s (%s)' % (
+                    index.table, index.model._meta.label
+                ))
@@ -0,0 +1,42 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from rest_framework_datatables import documents
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search documents of the models'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*', metavar='app_label.ModelName',
+            help='Rebuild the search documents of these models only.'
+        )
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Nominates a database to rebuild the search documents in. '
+                 'Defaults to the "default" database.'
+        )
+
+    def handle(self, *args, **options):
+        if options['models']:
+            models = []
+            for label in options['models']:
+                try:
+                    model = apps.get_model(label)
+                except (LookupError, ValueError) as exc:
+                    raise CommandError(str(exc))
+                if model not in documents.registry:
+                    raise CommandError('No search document for %s.' % label)
+                models.append(model)
+        else:
+            models = list(documents.registry)
+        for model in models:
+            count = documents.rebuild(
+                model._base_manager.using(options['database'])
+            )
+            if options['verbosity'] > 0:
+                self.stdout.write('Updated %d search documents of %s' % (
+                    count, model._meta.label
+                ))
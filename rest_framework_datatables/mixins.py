@@ -0,0 +1,129 @@
+from collections import OrderedDict
+
+from django.db.models.constants import LOOKUP_SEP
+from rest_framework.response import Response
+
+from .query import get_datatables_query
+from .serializers import get_kept_fields
+from .utils import get_lookup_field, lookup_spans_multivalued
+
+
+class DatatablesValuesMixin(object):
+    """List view mixin answering the datatables requests with
+    ``queryset.values()`` rows instead of model instances and serializers
+
+    Each requested column is fetched from the lookup path given by the
+    ``datatables_values_paths`` of the view, or by its ``name`` (if it
+    names a single field) or its ``data`` (``artist.name`` is fetched from
+    ``artist__name``, and rendered as ``{"artist": {"name": ...}}``). The
+    requests with a column that can't be fetched like this (serializer
+    fields that are not model fields, foreign keys, many to many and
+    reverse relations)
+    and the requests that are not datatables requests are answered by the
+    serializer of the view.
+
+    >>> class AlbumViewSet(DatatablesValuesMixin, viewsets.ModelViewSet):
+    ...     queryset = Album.objects.all().order_by('rank')
+    ...     serializer_class = AlbumSerializer
+    ...     datatables_values_formatters = {'year': str}
+    ...
+    ...     def get_row_items(self, row):
+    ...         return {'DT_RowId': 'row_%d' % row['pk']}
+
+    """
+
+    #: maps the ``data`` of columns to the lookup paths they are fetched
+    #: from, when their ``name`` or ``data`` isn't one
+    datatables_values_paths = {}
+    #: maps the ``data`` of columns to callables formatting their values
+    datatables_values_formatters = {}
+    #: lookup paths fetched for :meth:`get_row_items`, in addition to the
+    #: columns
+    datatables_values_row_fields = ('pk',)
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'datatables':
+            return super(DatatablesValuesMixin, self).list(
+                request, *args, **kwargs
+            )
+        paths = self.get_values_paths(request, self.get_queryset())
+        if paths is None:
+            return super(DatatablesValuesMixin, self).list(
+                request, *args, **kwargs
+            )
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = set(paths.values()) | set(self.datatables_values_row_fields)
+        # the relations are read by the values() query itself
+        queryset = queryset.prefetch_related(None).values(*sorted(fields))
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else queryset
+        data = [self.format_values_row(row, paths) for row in rows]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def get_values_paths(self, request, queryset):
+        """return an ordered dict mapping the ``data`` of the requested
+        columns (and of the ``keep`` parameter) to the lookup paths they
+        are fetched from, or None if one of them can't be fetched with
+        ``values()``"""
+        columns = [c for c in get_datatables_query(request).columns
+                   if c.data]
+        if not columns:
+            return None
+        requested = [
+            (c.data, c.name[0] if len(c.name) == 1 else c.data)
+            for c in columns
+        ] + [(k, k) for k in get_kept_fields(request)]
+        ret = OrderedDict()
+        for data, path in requested:
+            path = self.datatables_values_paths.get(
+                data, path.replace('.', '__')
+            )
+            if not self.can_fetch_value(queryset, path):
+                return None
+            ret[data] = path
+        return ret
+
+    def can_fetch_value(self, queryset, path):
+        """return True if the lookup path gives a single value per row of
+        the queryset, read from a field that isn't a relation (the
+        serializer renders the related object, not its primary key)"""
+        if path in queryset.query.annotation_select:
+            return True
+        field = get_lookup_field(queryset.model, path)
+        return (
+            field is not None
+            # a path ending on a relation ends on the field it points to
+            and path.split(LOOKUP_SEP)[-1] in ('pk', field.name)
+            and not lookup_spans_multivalued(queryset.model, path)
+        )
+
+    def format_values_row(self, row, paths):
+        """return the datatables row of a ``values()`` row, with the values
+        of the columns formatted by :meth:`format_value` and nested along
+        the dots of their ``data``, and the items of :meth:`get_row_items`
+        """
+        ret = {}
+        for data, path in paths.items():
+            node = ret
+            keys = data.split('.')
+            for key in keys[:-1]:
+                node = node.setdefault(key, {})
+            node[keys[-1]] = self.format_value(data, row[path])
+        ret.update(self.get_row_items(row))
+        return ret
+
+    def format_value(self, data, value):
+        """format the value of the column, with the
+        ``datatables_values_formatters`` of the view"""
+        formatter = self.datatables_values_formatters.get(data)
+        if formatter is None:
+            return value
+        return formatter(value)
+
+    def get_row_items(self, row):
+        """return the ``DT_Row*`` items of the row (``DT_RowId``,
+        ``DT_RowAttr``...), from the values fetched by
+        ``datatables_values_row_fields``"""
+        return {}
@@ -1,6 +1,13 @@
+import hashlib
 from collections import OrderedDict
 
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
 from django.core.paginator import InvalidPage
+from django.db import connections
+from django.db.models import Count, F, Q, Window
+from django.db.models.query import ModelIterable
+from django.db.models.constants import LOOKUP_SEP
 
 from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
@@ -14,10 +21,31 @@ try:
 except ImportError:
     text_type = str
 
+from .counts import CACHE_KEY_PREFIX, get_count_queryset
+from .query import get_datatables_query
 from .utils import get_param
 
 
+WINDOW_COUNT_ANNOTATION = 'datatables_window_count'
+KEYSET_ANNOTATION = 'datatables_keyset_'
+
+
+def pop_annotation(row, name):
+    """remove an annotation from a row (model instance or dict) and return
+    its value"""
+    if isinstance(row, dict):
+        return row.pop(name)
+    return row.__dict__.pop(name)
+
+
 class DatatablesMixin(object):
+    #: fetch the filtered count along with the page with a
+    #: ``COUNT(*) OVER ()`` window expression instead of a separate query
+    count_with_window = False
+    #: fetch the primary keys of the page first, then the rows with a
+    #: ``pk__in`` query (deferred join)
+    fetch_pks_first = False
+
     def get_paginated_response(self, data):
         if not self.is_datatable_request:
             return super(DatatablesMixin, self).get_paginated_response(data)
@@ -26,21 +54,95 @@ class DatatablesMixin(object):
             ('recordsTotal', self.total_count),
             ('recordsFiltered', self.count),
             ('data', data)
-        ]))
+        ] + get_datatables_query(self.request).get_count_markers()))
 
     def get_count_and_total_count(self, queryset, view):
-        if hasattr(view, '_datatables_filtered_count'):
-            count = view._datatables_filtered_count
-            del view._datatables_filtered_count
-        else:  # pragma: no cover
-            count = queryset.count()
-        if hasattr(view, '_datatables_total_count'):
-            total_count = view._datatables_total_count
-            del view._datatables_total_count
-        else:  # pragma: no cover
+        query = get_datatables_query(self.request)
+        count = query.filtered_count
+        if count is None and not self.count_with_window:  # pragma: no cover
+            count = get_count_queryset(queryset).count()
+        total_count = query.total_count
+        if total_count is None:  # pragma: no cover
             total_count = count
         return count, total_count
 
+    def can_count_with_window(self, queryset):
+        """return True if the count of the queryset can be fetched with a
+        window expression in the page query"""
+        return (
+            connections[queryset.db].features.supports_over_clause
+            # DISTINCT is applied after the window expression
+            and not queryset.query.distinct
+            and not queryset.query.is_sliced
+        )
+
+    def get_rows_and_count(self, queryset, offset, limit):
+        """return the rows of the page and the count of the queryset
+
+        The count is fetched along with the rows when possible, and with a
+        separate query only if the page is empty or the queryset doesn't
+        support window expressions.
+
+        """
+        if not self.can_count_with_window(queryset):
+            count = get_count_queryset(queryset).count()
+            return list(queryset[offset:offset + limit]), count
+        rows = list(queryset.annotate(**{
+            WINDOW_COUNT_ANNOTATION: Window(expression=Count('*'))
+        })[offset:offset + limit])
+        if not rows:
+            if not offset:
+                return rows, 0
+            return rows, get_count_queryset(queryset).count()
+        for row in rows:
+            count = pop_annotation(row, WINDOW_COUNT_ANNOTATION)
+        return rows, count
+
+    def can_fetch_pks_first(self, queryset):
+        """return True if the rows of the queryset can be fetched by primary
+        key without changing them"""
+        query = queryset.query
+        return (
+            queryset._iterable_class is ModelIterable
+            and not query.annotations
+            and not query.extra
+            and not query.combinator
+            and not query.is_sliced
+        )
+
+    def get_page_rows(self, queryset, offset, limit):
+        """return the rows of the page starting at ``offset``
+
+        With :attr:`fetch_pks_first`, the database only sorts and joins
+        what the filters and the ordering need to find the primary keys
+        of the page, then the full rows of these primary keys are fetched
+        (with the ``select_related()``, ``prefetch_related()`` and deferred
+        fields of the queryset) and put back in order.
+
+        """
+        if not self.fetch_pks_first or \
+                not self.can_fetch_pks_first(queryset):
+            return list(queryset[offset:offset + limit])
+        pks = list(queryset.values_list('pk', flat=True)[
+            offset:offset + limit
+        ])
+        if not pks:
+            return []
+        rows = queryset.model._base_manager.db_manager(queryset.db).filter(
+            pk__in=pks
+        )
+        rows.query.select_related = queryset.query.select_related
+        rows.query.deferred_loading = queryset.query.deferred_loading
+        rows = rows.prefetch_related(*queryset._prefetch_related_lookups)
+        by_pk = dict((row.pk, row) for row in rows)
+        return [by_pk[pk] for pk in pks if pk in by_pk]
+
+    def set_window_count(self, count):
+        query = get_datatables_query(self.request)
+        query.filtered_count = self.count = count
+        if self.total_count is None:
+            self.total_count = count
+
 
 class DatatablesPageNumberPagination(DatatablesMixin, PageNumberPagination):
     def get_page_size(self, request):
@@ -72,9 +174,9 @@ class DatatablesPageNumberPagination(DatatablesMixin, PageNumberPagination):
 
         self.page_query_param = 'start'
         self.page_size_query_param = 'length'
-        length = get_param(request, self.page_size_query_param)
+        self.request = request
 
-        if length == '-1':
+        if get_datatables_query(request).length == '-1':
             return None
         self.count, self.total_count = self.get_count_and_total_count(
             queryset, view
@@ -97,15 +199,45 @@ class DatatablesPageNumberPagination(DatatablesMixin, PageNumberPagination):
         page_number = self.get_page(request, page_size)
 
         try:
-            self.page = paginator.page(page_number)
+            if self.count is None:
+                self.page = self.get_window_page(paginator, page_number)
+            else:
+                self.page = self.get_page_from_rows(paginator, page_number)
         except InvalidPage as exc:
             msg = self.invalid_page_message.format(
                 page_number=page_number, message=text_type(exc)
             )
             raise NotFound(msg)
-        self.request = request
         return list(self.page)
 
+    def get_page_from_rows(self, paginator, number):
+        """same as ``paginator.page(number)``, with the rows fetched by
+        :meth:`get_page_rows`"""
+        number = paginator.validate_number(number)
+        bottom = (number - 1) * paginator.per_page
+        top = bottom + paginator.per_page
+        if top + paginator.orphans >= paginator.count:
+            top = paginator.count
+        rows = self.get_page_rows(paginator.object_list, bottom, top - bottom)
+        return paginator._get_page(rows, number, paginator)
+
+    def get_window_page(self, paginator, number):
+        """return the page, with the count fetched along with its rows"""
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            paginator.validate_number(number)  # raises PageNotAnInteger
+        if number < 1:
+            paginator.validate_number(number)  # raises EmptyPage
+        rows, count = self.get_rows_and_count(
+            paginator.object_list, (number - 1) * paginator.per_page,
+            paginator.per_page
+        )
+        paginator.value = count
+        self.set_window_count(count)
+        number = paginator.validate_number(number)
+        return paginator._get_page(rows, number, paginator)
+
 
 class DatatablesLimitOffsetPagination(DatatablesMixin, LimitOffsetPagination):
     def get_limit(self, request):
@@ -135,17 +267,180 @@ class DatatablesLimitOffsetPagination(DatatablesMixin, LimitOffsetPagination):
             self.is_datatable_request = True
             self.limit_query_param = 'length'
             self.offset_query_param = 'start'
-            if get_param(request, self.limit_query_param) == '-1':
+            self.request = request
+            if get_datatables_query(request).length == '-1':
                 return None
             self.count, self.total_count = self.get_count_and_total_count(
                 queryset, view
             )
+            if self.count is None:
+                self.limit = self.get_limit(request)
+                if self.limit is None:  # pragma: no cover
+                    return None
+                self.offset = self.get_offset(request)
+                rows, count = self.get_rows_and_count(
+                    queryset, self.offset, self.limit
+                )
+                self.set_window_count(count)
+                return rows
+            self.limit = self.get_limit(request)
+            if self.limit is None:  # pragma: no cover
+                return None
+            self.offset = self.get_offset(request)
+            if self.count == 0 or self.offset > self.count:
+                return []
+            return self.get_page_rows(queryset, self.offset, self.limit)
         else:
             self.is_datatable_request = False
         return super(
             DatatablesLimitOffsetPagination, self
         ).paginate_queryset(queryset, request, view)
 
+    def get_count(self, queryset):
+        if self.is_datatable_request:
+            # already known from the filter backend, don't count twice
+            return self.count
+        return super(DatatablesLimitOffsetPagination, self).get_count(
+            queryset
+        )
+
+
+class DatatablesKeysetPagination(DatatablesLimitOffsetPagination):
+    """Limit/offset pagination that fetches the pages following a page
+    already served with a seek predicate (``WHERE (year, id) > (...)``)
+    instead of an OFFSET
+
+    The last row of each page is stored in the cache, so that the next
+    page can start right after it. Pages reached otherwise (first draw,
+    random jumps, expired cache...) and querysets whose ordering can't be
+    used as a key are fetched with an OFFSET.
+
+    """
+    #: pages starting before this offset are always fetched with an OFFSET,
+    #: which is cheap enough (the boundary of the page reaching it is still
+    #: cached)
+    keyset_min_offset = 1000
+    keyset_cache_alias = 'default'
+    keyset_cache_timeout = 300
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.view = view
+        return super(DatatablesKeysetPagination, self).paginate_queryset(
+            queryset, request, view
+        )
+
+    def get_keyset_ordering(self, queryset):
+        """return the ordering of the queryset as a list of
+        ``(field path, descending)`` tuples ending with the primary key, or
+        None if it can't be used as a key
+
+        Each ordering must be a non nullable field of the model or of a
+        model reached through non nullable foreign keys.
+
+        """
+        query = queryset.query
+        ordering = list(query.order_by)
+        if not ordering and query.default_ordering:
+            ordering = list(queryset.model._meta.ordering)
+        ret = []
+        pk_name = queryset.model._meta.pk.name
+        for order in ordering:
+            if not isinstance(order, str) or order == '?':
+                return None
+            descending = order.startswith('-')
+            path = order.lstrip('-')
+            if path == 'pk':
+                path = pk_name
+            if not self.is_keyset_field(queryset.model, path):
+                return None
+            ret.append((path, descending))
+            if path == pk_name:
+                return ret
+        ret.append((pk_name, False))
+        return ret
+
+    def is_keyset_field(self, model, path):
+        parts = path.split(LOOKUP_SEP)
+        for i, part in enumerate(parts):
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                return False
+            if getattr(field, 'null', True):
+                return False
+            if i == len(parts) - 1:
+                return field.concrete and not field.is_relation
+            if not (field.many_to_one or field.one_to_one) or \
+                    not field.concrete:
+                return False
+            model = field.related_model
+        return False  # pragma: no cover
+
+    def get_keyset_cache_key(self, queryset, offset):
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return None
+        signature = repr((
+            '%s.%s' % (self.view.__module__, self.view.__class__.__qualname__),
+            sql, params, offset
+        ))
+        return '%s:keyset:%s' % (
+            CACHE_KEY_PREFIX,
+            hashlib.md5(signature.encode('utf-8')).hexdigest()
+        )
+
+    def get_seek_q(self, ordering, boundary):
+        """return the Q object selecting the rows after the boundary row
+
+        ``(a, b) > (x, y)`` is written ``a > x OR (a = x AND b > y)``.
+
+        """
+        q = Q()
+        equal = Q()
+        for (path, descending), value in zip(ordering, boundary):
+            lookup = '%s__%s' % (path, 'lt' if descending else 'gt')
+            q |= equal & Q(**{lookup: value})
+            equal &= Q(**{path: value})
+        return q
+
+    def get_page_rows(self, queryset, offset, limit):
+        if offset + limit < self.keyset_min_offset:
+            return super(DatatablesKeysetPagination, self).get_page_rows(
+                queryset, offset, limit
+            )
+        ordering = self.get_keyset_ordering(queryset)
+        if ordering is None:
+            return super(DatatablesKeysetPagination, self).get_page_rows(
+                queryset, offset, limit
+            )
+        queryset = queryset.order_by(*[
+            '%s%s' % ('-' if descending else '', path)
+            for path, descending in ordering
+        ])
+        cache = caches[self.keyset_cache_alias]
+        key = self.get_keyset_cache_key(queryset, offset)
+        boundary = cache.get(key) if key is not None else None
+        annotated = queryset.annotate(**dict(
+            ('%s%d' % (KEYSET_ANNOTATION, i), F(path))
+            for i, (path, descending) in enumerate(ordering)
+        ))
+        if boundary is None:
+            rows = list(annotated[offset:offset + limit])
+        else:
+            rows = list(annotated.filter(
+                self.get_seek_q(ordering, boundary)
+            )[:limit])
+        for row in rows:
+            last = [
+                pop_annotation(row, '%s%d' % (KEYSET_ANNOTATION, i))
+                for i in range(len(ordering))
+            ]
+        if len(rows) == limit and key is not None:
+            next_key = self.get_keyset_cache_key(queryset, offset + limit)
+            cache.set(next_key, last, self.keyset_cache_timeout)
+        return rows
+
 
 class DatatablesOnlyPageNumberPagination(DatatablesPageNumberPagination):
     def paginate_queryset(self, queryset, request, view=None):
@@ -0,0 +1,278 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.query import ModelIterable
+from rest_framework import serializers
+
+
+def get_requested_serializer(view):
+    """return the serializer of the view, or None if it has none
+
+    The fields of a serializer using
+    :class:`~rest_framework_datatables.serializers.DatatablesSerializerMixin`
+    are the ones of the requested columns, other serializers have all
+    their fields, as they serialize all of them anyway.
+
+    """
+    get_serializer = getattr(view, 'get_serializer', None)
+    if get_serializer is None:
+        return None
+    return get_serializer()
+
+
+def get_related_field_path(field, path):
+    """return the lookup path read by a related field whose source is the
+    relation at ``path``"""
+    slug_field = getattr(field, 'slug_field', None)
+    if slug_field:
+        return path + LOOKUP_SEP + slug_field
+    return path
+
+
+def get_source_paths(serializer, model, prefix=''):
+    """return the set of lookup paths of the concrete model fields read by
+    the fields of the serializer
+
+    The sources going through a foreign key give the path of the field of
+    the related model (``artist.name`` gives ``artist__name``) and nested
+    serializers give the paths of their own fields. Many to many and
+    reverse relations are fetched by other queries, sources that are not
+    model fields (properties, methods, ``SerializerMethodField``...) are
+    ignored.
+
+    """
+    paths = set()
+    for field in serializer.fields.values():
+        if field.source == '*':
+            if isinstance(field, serializers.Serializer):
+                paths |= get_source_paths(field, model, prefix)
+            continue
+        current = model
+        path = prefix
+        for i, attr in enumerate(field.source_attrs):
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                break
+            if not model_field.concrete or model_field.many_to_many:
+                break
+            path += attr
+            paths.add(path)
+            if not model_field.is_relation:
+                break
+            if i < len(field.source_attrs) - 1:
+                current = model_field.related_model
+                path += LOOKUP_SEP
+            elif isinstance(field, serializers.Serializer):
+                paths |= get_source_paths(field, model_field.related_model,
+                                          path + LOOKUP_SEP)
+            elif isinstance(field, serializers.RelatedField):
+                paths.add(get_related_field_path(field, path))
+    return paths
+
+
+def reads_model_fields(serializer, model):
+    """return True if all the fields of the serializer read model fields, so
+    that :func:`get_source_paths` knows everything they need"""
+    for field in serializer.fields.values():
+        if field.source == '*':
+            if not isinstance(field, serializers.Serializer) or \
+                    not reads_model_fields(field, model):
+                return False
+            continue
+        current = model
+        for attr in field.source_attrs:
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                return False
+            if not model_field.is_relation:
+                break
+            current = model_field.related_model
+        else:
+            if isinstance(field, serializers.Serializer) and \
+                    not reads_model_fields(field, current):
+                return False
+    return True
+
+
+def get_select_related_paths(select_related, prefix=''):
+    """return the lookup paths of the ``select_related`` dict of a query"""
+    paths = []
+    for name, nested in select_related.items():
+        paths.append(prefix + name)
+        paths.extend(get_select_related_paths(nested,
+                                              prefix + name + LOOKUP_SEP))
+    return paths
+
+
+def can_load_only(queryset):
+    """return True if the model instances of the queryset can be restricted
+    to some of their fields with ``only()``"""
+    query = queryset.query
+    return (
+        queryset._iterable_class is ModelIterable
+        # the view already chose what to load
+        and query.deferred_loading == (frozenset(), True)
+        # select_related() without fields follows every foreign key
+        and query.select_related is not True
+        and not query.combinator
+    )
+
+
+def load_only(queryset, paths):
+    """restrict the queryset to the fields at ``paths``, keeping the foreign
+    keys followed by ``select_related()``"""
+    if not can_load_only(queryset):
+        return queryset
+    paths = set(paths)
+    if queryset.query.select_related:
+        paths.update(get_select_related_paths(queryset.query.select_related))
+    return queryset.only(*sorted(paths))
+
+
+def get_relation_lookups(serializer, model, prefix=''):
+    """return the relations followed by the fields of the serializer, as a
+    tuple ``(select_related, prefetches)``
+
+    ``select_related`` is the set of the paths of the foreign keys whose
+    related instances are read (``artist.name`` gives ``artist``, but a
+    ``PrimaryKeyRelatedField`` only reads the foreign key).
+    ``prefetches`` maps the paths of the many to many and reverse relations
+    to a tuple ``(relation, field)``, ``field`` being the serializer field
+    reading them, or None if several fields do.
+
+    """
+    select_related = set()
+    prefetches = {}
+    for field in serializer.fields.values():
+        if field.source == '*':
+            if isinstance(field, serializers.Serializer):
+                nested = get_relation_lookups(field, model, prefix)
+                select_related |= nested[0]
+                prefetches.update(nested[1])
+            continue
+        current = model
+        path = prefix
+        attrs = field.source_attrs
+        for i, attr in enumerate(attrs):
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                break
+            if not model_field.is_relation:
+                break
+            path += attr
+            last = i == len(attrs) - 1
+            if model_field.many_to_many or model_field.one_to_many:
+                if path in prefetches or not last:
+                    # several fields or a nested source, prefetch the
+                    # whole related instances
+                    prefetches[path] = (model_field, None)
+                else:
+                    prefetches[path] = (model_field, field)
+                break
+            if last:
+                if isinstance(field, serializers.Serializer):
+                    select_related.add(path)
+                    nested = get_relation_lookups(
+                        field, model_field.related_model, path + LOOKUP_SEP
+                    )
+                    select_related |= nested[0]
+                    prefetches.update(nested[1])
+                elif not isinstance(field, serializers.PrimaryKeyRelatedField):
+                    select_related.add(path)
+                break
+            select_related.add(path)
+            current = model_field.related_model
+            path += LOOKUP_SEP
+    return select_related, prefetches
+
+
+def get_prefetch_queryset(relation, field):
+    """return the queryset prefetching the instances of the to-many
+    ``relation`` read by the serializer ``field``
+
+    The queryset only loads the fields read by the field, and follows the
+    relations of a nested serializer itself.
+
+    """
+    related_model = relation.related_model
+    queryset = related_model._default_manager.all()
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    elif isinstance(field, serializers.ManyRelatedField):
+        field = field.child_relation
+    if isinstance(field, serializers.Serializer):
+        queryset = plan_relations(queryset, field)
+        if not reads_model_fields(field, related_model):
+            return queryset
+        paths = get_source_paths(field, related_model)
+    elif isinstance(field, (serializers.PrimaryKeyRelatedField,
+                            serializers.SlugRelatedField)):
+        paths = set()
+        if getattr(field, 'slug_field', None):
+            paths.add(field.slug_field)
+    else:
+        return queryset
+    if relation.one_to_many:
+        # the foreign key joining the prefetched instances to their owner
+        paths.add(relation.field.name)
+    return load_only(queryset, paths)
+
+
+def get_prefetch_paths(queryset):
+    """return the paths already prefetched by the queryset"""
+    return set(
+        getattr(lookup, 'prefetch_to', lookup)
+        for lookup in queryset._prefetch_related_lookups
+    )
+
+
+def plan_relations(queryset, serializer, lookups=()):
+    """follow the relations read by the fields of the serializer with
+    ``select_related()`` and ``Prefetch`` objects (see
+    :func:`get_relation_lookups`)
+
+    ``lookups`` are other paths of relations to follow, ``select_related()``
+    is used if they only go through foreign keys. The relations the
+    queryset already prefetches are left untouched.
+
+    """
+    if queryset._iterable_class is not ModelIterable:
+        return queryset
+    select_related, prefetches = get_relation_lookups(serializer,
+                                                      queryset.model)
+    plain_prefetches = set()
+    for lookup in lookups:
+        if is_to_one_path(queryset.model, lookup):
+            select_related.add(lookup)
+        else:
+            plain_prefetches.add(lookup)
+    if select_related and queryset.query.select_related is not True:
+        queryset = queryset.select_related(*sorted(select_related))
+    prefetched = get_prefetch_paths(queryset)
+    prefetch = []
+    for path in sorted(plain_prefetches | set(prefetches)):
+        if path in prefetched:
+            continue
+        if path in prefetches and path not in plain_prefetches:
+            prefetch.append(Prefetch(
+                path, queryset=get_prefetch_queryset(*prefetches[path])
+            ))
+        else:
+            prefetch.append(path)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def is_to_one_path(model, path):
+    """return True if the lookup path only goes through foreign keys and one
+    to one relations"""
+    for attr in path.split(LOOKUP_SEP):
+        field = model._meta.get_field(attr)
+        if not (field.many_to_one or field.one_to_one):
+            return False
+        model = field.related_model
+    return True
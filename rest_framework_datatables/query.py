@@ -0,0 +1,201 @@
+import re
+
+from .utils import get_params
+
+
+PARAM_RE = re.compile(r'^(columns|order)\[(\d+)\]\[(\w+)\](?:\[(\w+)\])?$')
+
+
+class DatatablesColumn(object):
+    """A column of the datatables request (``columns[i][...]``)
+
+    Item access (``column['name']``, ``column.get('search_value')``) is
+    supported for compatibility with code written against the former
+    dict-based representation of the fields.
+
+    """
+
+    __slots__ = (
+        'index', 'data', 'name', 'searchable', 'orderable',
+        'search_value', 'search_regex',
+    )
+
+    def __init__(self, index, data, name=None, searchable=False,
+                 orderable=False, search_value=None, search_regex=False):
+        self.index = index
+        self.data = data
+        if not data:
+            # null or empty string on datatables (JS) side
+            self.name = []
+            self.searchable = False
+            self.orderable = False
+            self.search_value = None
+            self.search_regex = False
+            return
+        # to be able to search across multiple fields (e.g. to search
+        # through concatenated names), we create a list of the name field,
+        # replacing dot notation with double-underscores and splitting
+        # along the commas.
+        self.name = [
+            n.lstrip() for n in (name or data).replace('.', '__').split(',')
+        ]
+        self.searchable = searchable
+        self.orderable = orderable
+        self.search_value = search_value
+        self.search_regex = search_regex
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def keys(self):
+        return list(self.__slots__)
+
+    def get(self, key, default=None):
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key)
+
+    def __repr__(self):
+        return '<DatatablesColumn %d: %r>' % (self.index, self.data)
+
+
+class DatatablesOrder(object):
+    """An ordering of the datatables request (``order[i][...]``)"""
+
+    __slots__ = ('column', 'dir')
+
+    def __init__(self, column, dir_='asc'):
+        self.column = column
+        self.dir = dir_
+
+    @property
+    def descending(self):
+        return self.dir == 'desc'
+
+    def __repr__(self):
+        return '<DatatablesOrder %r %s>' % (self.column, self.dir)
+
+
+class DatatablesQuery(object):
+    """The parsed datatables request
+
+    It is built once per request by :func:`get_datatables_query` and
+    shared by the filter backends, the paginators and the renderer,
+    which also use it to pass the record counts around.
+
+    """
+
+    __slots__ = (
+        'columns', 'order', 'search_value', 'search_regex', 'draw',
+        'start', 'length', 'total_count', 'filtered_count',
+        'total_count_approximate', 'filtered_count_approximate',
+        'filtered_count_capped',
+    )
+
+    def __init__(self, columns=(), order=(), search_value=None,
+                 search_regex=False, draw=None, start=None, length=None):
+        self.columns = list(columns)
+        self.order = list(order)
+        self.search_value = search_value
+        self.search_regex = search_regex
+        self.draw = draw
+        self.start = start
+        self.length = length
+        self.total_count = None
+        self.filtered_count = None
+        self.total_count_approximate = False
+        self.filtered_count_approximate = False
+        self.filtered_count_capped = False
+
+    @classmethod
+    def from_params(cls, params):
+        """build the query from a single pass over the request params"""
+        columns = {}
+        order = {}
+        scalars = {}
+        for key, value in params.items():
+            match = PARAM_RE.match(key)
+            if match is None:
+                scalars[key] = value
+                continue
+            group, index, attr, sub = match.groups()
+            target = columns if group == 'columns' else order
+            item = target.setdefault(int(index), {})
+            item['%s_%s' % (attr, sub) if sub else attr] = value
+
+        ret = cls(
+            search_value=scalars.get('search[value]'),
+            search_regex=scalars.get('search[regex]') == 'true',
+            draw=scalars.get('draw'),
+            start=scalars.get('start'),
+            length=scalars.get('length'),
+        )
+        # columns and orderings are only read up to the first gap, as
+        # datatables always sends contiguous indexes.
+        i = 0
+        while 'data' in columns.get(i, ()):
+            col = columns[i]
+            ret.columns.append(DatatablesColumn(
+                i,
+                col['data'],
+                name=col.get('name'),
+                searchable=col.get('searchable') == 'true',
+                orderable=col.get('orderable') == 'true',
+                search_value=col.get('search_value'),
+                search_regex=col.get('search_regex') == 'true',
+            ))
+            i += 1
+        i = 0
+        while 'column' in order.get(i, ()):
+            item = order[i]
+            i += 1
+            try:
+                index = int(item['column'])
+            except ValueError:
+                continue
+            if not 0 <= index < len(ret.columns):
+                continue
+            ret.order.append(
+                DatatablesOrder(ret.columns[index], item.get('dir', 'asc'))
+            )
+        return ret
+
+    def get_count_markers(self):
+        """return the extra response items flagging inexact counts"""
+        ret = []
+        if self.total_count_approximate:
+            ret.append(('recordsTotalApproximate', True))
+        if self.filtered_count_approximate:
+            ret.append(('recordsFilteredApproximate', True))
+        if self.filtered_count_capped:
+            ret.append(('recordsFilteredCapped', True))
+        return ret
+
+    def __repr__(self):
+        return '<DatatablesQuery columns=%r order=%r search=%r>' % (
+            self.columns, self.order, self.search_value
+        )
+
+
+def get_datatables_query(request):
+    """return the parsed datatables query of the request
+
+    The query is parsed on first access and cached on the request, so
+    every component handling the same request shares a single instance.
+
+    """
+    try:
+        return request._datatables_query
+    except AttributeError:
+        pass
+    query = DatatablesQuery.from_params(get_params(request))
+    request._datatables_query = query
+    return query
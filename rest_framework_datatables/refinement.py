@@ -0,0 +1,133 @@
+import hashlib
+
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db.models import Q
+
+from .counts import CACHE_KEY_PREFIX, get_queryset_versions
+
+
+def extends(terms, previous_terms):
+    """return True if every row matching all the ``terms`` (each of them in
+    at least one column, with a substring search) also matches all the
+    ``previous_terms``
+
+    This is the case when each of the previous terms is contained in one
+    of the terms: ``pink f`` extends ``pin``.
+
+    """
+    return all(any(p in t for t in terms) for p in previous_terms)
+
+
+class SearchRefinement(object):
+    """Remembers the rows matched by the last global search of a session,
+    and the searches that matched no row, to answer the next searches
+    while the user types
+
+    A search extending the last one is only looked for among the rows it
+    matched (if there were at most ``max_pks`` of them), and a search
+    extending a search without results doesn't match any row. The state is
+    only used with the same ``context``: the SQL of the queryset, the
+    columns and their searches, and the versions of the models the
+    queryset touches.
+
+    """
+
+    #: number of searches without results that are remembered
+    max_empty_terms = 20
+
+    def __init__(self, key, terms, context, timeout, alias='default',
+                 max_pks=1000):
+        self.key = key
+        self.terms = [t.lower() for t in terms]
+        self.context = context
+        self.timeout = timeout
+        self.cache = caches[alias]
+        self.max_pks = max_pks
+        self.state = self.cache.get(key)
+        if self.state is None or self.state['context'] != context:
+            self.state = {'context': context, 'terms': None, 'pks': None,
+                          'empty': []}
+
+    def is_empty(self):
+        """return True if the search is known to match no rows"""
+        return any(extends(self.terms, empty)
+                   for empty in self.state['empty'])
+
+    def get_pks(self):
+        """return the primary keys of the rows the search can match, or
+        None if they are not known"""
+        if self.state['terms'] is None or \
+                not extends(self.terms, self.state['terms']):
+            return None
+        return self.state['pks']
+
+    def restrict(self, q):
+        """return the Q object of the search, restricted to the rows it
+        can match"""
+        if self.is_empty():
+            return Q(pk__in=[])
+        pks = self.get_pks()
+        if pks is not None:
+            return Q(pk__in=pks) & q
+        return q
+
+    def save(self, queryset, count=None):
+        """remember the rows of the filtered queryset, ``count`` is their
+        number if it is known"""
+        if count == 0:
+            if not self.is_empty():
+                self.state['empty'] = (
+                    self.state['empty'] + [self.terms]
+                )[-self.max_empty_terms:]
+            self.state['terms'] = self.state['pks'] = None
+        elif count is not None and count > self.max_pks:
+            self.state['terms'] = self.state['pks'] = None
+        else:
+            pks = list(queryset.order_by().values_list('pk', flat=True)[
+                :self.max_pks + 1
+            ])
+            if not pks:
+                return self.save(queryset, 0)
+            if len(pks) > self.max_pks:
+                self.state['terms'] = self.state['pks'] = None
+            else:
+                self.state['terms'], self.state['pks'] = self.terms, pks
+        self.cache.set(self.key, self.state, self.timeout)
+
+
+def get_refinement_context(queryset, *args, alias='default',
+                           searched_queryset=None):
+    """return the context of a search refinement: a hash of the SQL of the
+    queryset, of the ``args`` and of the versions of the models the
+    queryset touches, or None if the queryset can't match any row
+
+    ``searched_queryset`` is the queryset filtered by the search, whose
+    joins (e.g. to the genres of ``genres__name``) are versioned as well.
+
+    """
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return None
+    versioned = queryset
+    if searched_queryset is not None:
+        try:
+            searched_queryset.query.sql_with_params()
+        except EmptyResultSet:
+            pass
+        else:
+            versioned = searched_queryset
+    signature = repr((sql, params, args,
+                      get_queryset_versions(versioned, alias)))
+    return hashlib.md5(signature.encode('utf-8')).hexdigest()
+
+
+def get_refinement_cache_key(session_key, view):
+    signature = repr((
+        session_key,
+        '%s.%s' % (view.__module__, view.__class__.__qualname__),
+    ))
+    return '%s:refine:%s' % (
+        CACHE_KEY_PREFIX, hashlib.md5(signature.encode('utf-8')).hexdigest()
+    )
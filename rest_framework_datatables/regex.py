@@ -0,0 +1,122 @@
+import operator
+from functools import lru_cache, reduce
+
+from django.db.models import Q
+
+
+# characters with a special meaning in a regex, outside of a character set
+METACHARACTERS = set('.^$*+?{}[]\\|()')
+
+
+def _is_escaped(pattern, index):
+    """return True if the character at ``index`` is escaped by an odd
+    number of backslashes"""
+    count = 0
+    while index > 0 and pattern[index - 1] == '\\':
+        count += 1
+        index -= 1
+    return count % 2 == 1
+
+
+def _split_alternatives(pattern):
+    ret = []
+    current = 0
+    for i, char in enumerate(pattern):
+        if char == '|' and not _is_escaped(pattern, i):
+            ret.append(pattern[current:i])
+            current = i + 1
+    ret.append(pattern[current:])
+    return ret
+
+
+def _parse_literal(pattern):
+    """return the string matched by a regex made of literal characters
+    only, or None"""
+    ret = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            if char.isalnum() or char == '_':
+                # \d, \w, \b, \1...
+                return None
+            ret.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char in METACHARACTERS:
+            return None
+        else:
+            ret.append(char)
+    if escaped:
+        return None
+    return ''.join(ret)
+
+
+@lru_cache(maxsize=1024)
+def analyze_regex(pattern):
+    """return a ``(kind, literals)`` tuple if the regex only matches one of
+    a few literal strings, None otherwise
+
+    ``kind`` tells where the literals must be found: ``'exact'`` for
+    ``^(Rock|Jazz)$``, ``'startswith'`` for ``^Pink``, ``'endswith'`` for
+    ``Floyd$`` and ``'contains'`` for ``Pink Floyd``.
+
+    """
+    body = pattern
+    start = body.startswith('^')
+    if start:
+        body = body[1:]
+    end = body.endswith('$') and not _is_escaped(body, len(body) - 1)
+    if end:
+        body = body[:-1]
+    if (
+            body.startswith('(') and body.endswith(')')
+            and not _is_escaped(body, len(body) - 1)):
+        body = body[1:-1]
+        if body.startswith('?:'):
+            body = body[2:]
+        alternatives = _split_alternatives(body)
+    else:
+        alternatives = [body]
+    literals = []
+    for alternative in alternatives:
+        literal = _parse_literal(alternative)
+        if literal is None:
+            return None
+        if literal not in literals:
+            literals.append(literal)
+    if start and end:
+        kind = 'exact'
+    elif start:
+        kind = 'startswith'
+    elif end:
+        kind = 'endswith'
+    else:
+        kind = 'contains'
+    return kind, tuple(literals)
+
+
+def regex_q(path, pattern, case_sensitive=False):
+    """return a Q-object matching the regex on the lookup path
+
+    Regexes that only match literal strings (see :func:`analyze_regex`)
+    are rewritten with ``in``, ``exact``, ``iexact``, ``istartswith``,
+    ``iendswith`` or ``icontains`` lookups, which are cheaper and can use
+    indexes, other regexes use ``regex`` or ``iregex``. Case sensitive
+    regexes are only rewritten with ``in`` and ``exact``, as the other
+    lookups use ``LIKE``, which ignores case on SQLite.
+
+    """
+    analysis = analyze_regex(pattern)
+    if analysis is not None and case_sensitive and analysis[0] != 'exact':
+        analysis = None
+    if analysis is None:
+        lookup = 'regex' if case_sensitive else 'iregex'
+        return Q(**{'%s__%s' % (path, lookup): pattern})
+    kind, literals = analysis
+    if case_sensitive and len(literals) > 1:
+        return Q(**{'%s__in' % path: literals})
+    lookup = kind if case_sensitive else 'i%s' % kind
+    return reduce(operator.or_, [
+        Q(**{'%s__%s' % (path, lookup): literal}) for literal in literals
+    ])
@@ -1,6 +1,6 @@
 from rest_framework.renderers import JSONRenderer
 
-from .utils import get_param
+from .query import get_datatables_query
 
 
 class DatatablesRenderer(JSONRenderer):
@@ -15,6 +15,7 @@ class DatatablesRenderer(JSONRenderer):
             return bytes()
 
         request = renderer_context['request']
+        query = get_datatables_query(request)
         new_data = {}
 
         view = renderer_context.get('view')
@@ -28,18 +29,19 @@ class DatatablesRenderer(JSONRenderer):
                 results = data
                 count = len(results)
             new_data['data'] = results
-            if view and hasattr(view, '_datatables_filtered_count'):
-                count = view._datatables_filtered_count
-            if view and hasattr(view, '_datatables_total_count'):
-                total_count = view._datatables_total_count
+            if query.filtered_count is not None:
+                count = query.filtered_count
+            if query.total_count is not None:
+                total_count = query.total_count
             else:
                 total_count = count
             new_data['recordsFiltered'] = count
             new_data['recordsTotal'] = total_count
+            new_data.update(query.get_count_markers())
         else:
             new_data = data
         # add datatables "draw" parameter
-        new_data['draw'] = int(get_param(request, 'draw', '1'))
+        new_data['draw'] = int(query.draw or '1')
 
         serializer_class = None
         if hasattr(view, 'get_serializer_class'):
@@ -73,14 +75,10 @@ class DatatablesRenderer(JSONRenderer):
         # list of params to keep, triggered by ?keep= and can be comma
         # separated.
         keep = request.query_params.get('keep', [])
-        cols = []
-        i = 0
-        while True:
-            col = get_param(request, 'columns[%d][data]' % i)
-            if col is None:
-                break
-            cols.append(col.split('.').pop(0))
-            i += 1
+        cols = set(
+            col.data.split('.', 1)[0]
+            for col in get_datatables_query(request).columns
+        )
         if len(cols):
             data = result['data']
             for i, item in enumerate(data):
@@ -0,0 +1,225 @@
+import threading
+
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from . import fts
+
+
+class SearchProvider(object):
+    """Answers the global search of
+    :class:`~rest_framework_datatables.filters.DatatablesFilterBackend`
+    for some of the searchable columns
+
+    The columns that the provider doesn't support are searched by the
+    filter backend as usual, and the results are combined.
+
+    """
+
+    def supports(self, queryset, column):
+        """return True if the provider can search the column"""
+        return True
+
+    def search(self, queryset, search_value, columns):
+        """search ``search_value`` in the (supported) columns
+
+        return value is a Q object, an iterable of primary keys, or None
+        to let the filter backend search these columns itself.
+
+        """
+        raise NotImplementedError(
+            '.search() must be overridden.'
+        )  # pragma: no cover
+
+
+class FTSSearchProvider(SearchProvider):
+    """Search the columns of the SQLite FTS5 index registered for the model
+    (see :mod:`rest_framework_datatables.fts`)"""
+
+    def supports(self, queryset, column):
+        index = fts.get_index(queryset.model)
+        return (
+            index is not None
+            and bool(column.name)
+            and all(n in index.fields for n in column.name)
+            and index.is_available(queryset.db)
+        )
+
+    def search(self, queryset, search_value, columns):
+        index = fts.get_index(queryset.model)
+        return index.get_q(search_value, [n for c in columns for n in c.name],
+                           using=queryset.db)
+
+
+class NgramIndex(object):
+    """In memory n-gram inverted index of the text of some fields of a
+    model, for one database"""
+
+    def __init__(self, n):
+        self.n = n
+        # field -> pk -> lower cased text
+        self.texts = {}
+        # field -> n-gram -> set of pks
+        self.postings = {}
+
+    def ngrams(self, text):
+        return set(text[i:i + self.n] for i in range(len(text) - self.n + 1))
+
+    def add(self, field, pk, text):
+        self.texts.setdefault(field, {})[pk] = text
+        postings = self.postings.setdefault(field, {})
+        for gram in self.ngrams(text):
+            postings.setdefault(gram, set()).add(pk)
+
+    def remove(self, pk):
+        for field, texts in self.texts.items():
+            text = texts.pop(pk, None)
+            if text is None:
+                continue
+            postings = self.postings[field]
+            for gram in self.ngrams(text):
+                pks = postings.get(gram)
+                if pks is not None:
+                    pks.discard(pk)
+                    if not pks:
+                        del postings[gram]
+
+    def search(self, field, term):
+        texts = self.texts.get(field, {})
+        if len(term) < self.n:
+            candidates = texts
+        else:
+            postings = self.postings.get(field, {})
+            candidates = None
+            for gram in self.ngrams(term):
+                pks = postings.get(gram)
+                if not pks:
+                    return set()
+                candidates = pks if candidates is None else candidates & pks
+        # the n-grams of the term may be found in another order
+        return set(pk for pk in candidates if term in texts[pk])
+
+
+class NgramSearchProvider(SearchProvider):
+    """Search a few columns of a mid-size table in an in-memory n-gram
+    index
+
+    The index is built from the database on the first search, and rows
+    saved or deleted afterwards (or whose many to many relations changed)
+    are reloaded before the next search. Tables with more than
+    ``max_rows`` rows are not indexed, and searches matching more than
+    ``max_results`` rows are left to the database, as they would make a
+    huge ``IN`` clause.
+
+    The index is held by each process and is not aware of changes made
+    through other processes, bulk operations or to related models.
+
+    """
+
+    def __init__(self, fields, n=3, max_rows=50000, max_results=1000):
+        self.fields = list(fields)
+        self.n = n
+        self.max_rows = max_rows
+        self.max_results = max_results
+        self.model = None
+        self._lock = threading.RLock()
+        # database alias -> NgramIndex, None if the table is too large
+        self._indexes = {}
+        # database alias -> set of pks to reload
+        self._dirty = {}
+
+    def supports(self, queryset, column):
+        return bool(column.name) and all(
+            n in self.fields for n in column.name
+        )
+
+    def search(self, queryset, search_value, columns):
+        # the index is updated in place by the searches of other threads
+        with self._lock:
+            index = self.get_index(queryset.model, queryset.db)
+            if index is None:
+                return None
+            term = search_value.lower()
+            pks = set()
+            for name in set(n for c in columns for n in c.name):
+                pks |= index.search(name, term)
+                if len(pks) > self.max_results:
+                    return None
+            return pks
+
+    def get_index(self, model, using):
+        with self._lock:
+            if self.model is None:
+                self.model = model
+                self.connect_signals()
+            if using not in self._indexes:
+                self._indexes[using] = self.build(using)
+                self._dirty[using] = set()
+            index = self._indexes[using]
+            if index is not None and self._dirty[using]:
+                pks = self._dirty[using]
+                self._dirty[using] = set()
+                for pk in pks:
+                    index.remove(pk)
+                self.load(index, using, pks)
+            return index
+
+    def build(self, using):
+        if self.model._base_manager.using(using)[:self.max_rows + 1] \
+                .count() > self.max_rows:
+            return None
+        index = NgramIndex(self.n)
+        self.load(index, using)
+        return index
+
+    def load(self, index, using, pks=None):
+        queryset = self.model._base_manager.using(using).order_by()
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+        for field in self.fields:
+            texts = {}
+            for pk, value in queryset.values_list('pk', field):
+                if value is not None:
+                    texts.setdefault(pk, []).append(str(value).lower())
+            for pk, values in texts.items():
+                # separate the values of multi valued relations
+                index.add(field, pk, '\x00'.join(values))
+
+    def invalidate(self, using, pks=None):
+        """reload the given rows before the next search, or the whole
+        index if ``pks`` is None"""
+        with self._lock:
+            if pks is None:
+                self._indexes.pop(using, None)
+            elif using in self._dirty:
+                self._dirty[using].update(pks)
+
+    def connect_signals(self):
+        uid = 'drf-datatables:ngram:%d' % id(self)
+        post_save.connect(self._changed, sender=self.model, weak=False,
+                          dispatch_uid=uid)
+        post_delete.connect(self._changed, sender=self.model, weak=False,
+                            dispatch_uid=uid)
+        for field in self.fields:
+            relation = self.model._meta.get_field(
+                field.split(LOOKUP_SEP, 1)[0]
+            )
+            if relation.many_to_many:
+                through = getattr(relation, 'through', None) or \
+                    relation.remote_field.through
+                m2m_changed.connect(self._m2m_changed, sender=through,
+                                    weak=False, dispatch_uid=uid)
+
+    def _changed(self, sender, instance, using, **kwargs):
+        self.invalidate(using, [instance.pk])
+
+    def _m2m_changed(self, sender, instance, action, pk_set, using,
+                     **kwargs):
+        if not action.startswith('post_'):
+            return
+        if isinstance(instance, self.model):
+            self.invalidate(using, [instance.pk])
+        else:
+            # changed from the other side of the relation, pk_set is None
+            # when it was cleared
+            self.invalidate(using, pk_set)
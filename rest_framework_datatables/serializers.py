@@ -0,0 +1,108 @@
+from rest_framework import serializers
+
+from .query import get_datatables_query
+
+
+def get_requested_fields(request):
+    """return the tree of the fields requested by the datatables columns of
+    the request, or None if the request doesn't have any column
+
+    The tree maps the names of the fields to the tree of their requested
+    nested fields, or to None if the whole field is requested: the columns
+    ``rank``, ``artist.name`` and ``artist.id`` give
+    ``{'rank': None, 'artist': {'name': None, 'id': None}}``.
+
+    """
+    columns = [c for c in get_datatables_query(request).columns if c.data]
+    if not columns:
+        return None
+    ret = {}
+    for column in columns:
+        node = ret
+        parts = column.data.split('.')
+        for part in parts[:-1]:
+            if part in node and node[part] is None:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = None
+    return ret
+
+
+def get_kept_fields(request):
+    """return the fields of the ``keep`` parameter of the request"""
+    keep = request.query_params.get('keep', '')
+    return [k.strip() for k in keep.split(',') if k.strip()]
+
+
+def get_always_serialized(serializer):
+    """return the fields of the ``datatables_always_serialize`` Meta option
+    of the serializer"""
+    meta = getattr(serializer, 'Meta', None)
+    return getattr(meta, 'datatables_always_serialize', ())
+
+
+def prune_fields(fields, tree, always=(), keep=()):
+    """remove the fields of a serializer that are not in the tree of
+    requested fields (see :func:`get_requested_fields`), except for the
+    ``DT_Row*`` fields and the ``always`` and ``keep`` ones
+
+    The fields of nested serializers are pruned according to their branch
+    of the tree.
+
+    """
+    for name in list(fields):
+        if (
+                name.startswith('DT_Row') or name in always
+                or name in keep):
+            continue
+        if name not in tree:
+            del fields[name]
+            continue
+        if tree[name] is None:
+            continue
+        nested = fields[name]
+        if isinstance(nested, serializers.ListSerializer):
+            nested = nested.child
+        if isinstance(nested, serializers.Serializer):
+            prune_fields(nested.fields, tree[name],
+                         get_always_serialized(nested))
+
+
+class DatatablesSerializerMixin(object):
+    """Serializer mixin building only the fields requested by the
+    datatables columns
+
+    Unlike the filtering of the unused fields by
+    :class:`~rest_framework_datatables.renderers.DatatablesRenderer`, which
+    removes them from the serialized data, the fields that are not
+    requested are not computed at all, including the fields of nested
+    serializers that are not requested (``artist.name`` only serializes the
+    ``name`` of the artist). The ``DT_Row*`` fields, the fields of the
+    ``datatables_always_serialize`` Meta option (of the serializer and of
+    the nested serializers) and the fields of the ``keep`` parameter are
+    always serialized.
+
+    >>> class AlbumSerializer(DatatablesSerializerMixin,
+    ...                       serializers.ModelSerializer):
+    ...     ...
+
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        root = self.root
+        if root is not self and getattr(root, 'child', None) is not self:
+            # nested serializers are pruned by their parent
+            return fields
+        request = self.context.get('request')
+        if request is None or getattr(
+                getattr(request, 'accepted_renderer', None), 'format', None
+        ) != 'datatables':
+            return fields
+        tree = get_requested_fields(request)
+        if tree is None:
+            return fields
+        prune_fields(fields, tree, get_always_serialized(self),
+                     get_kept_fields(request))
+        return fields
@@ -1,5 +1,171 @@
+from functools import lru_cache
 
-def get_param(request, param, default=None):
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Exists, ManyToManyField, OuterRef, Q
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.fields.related import ForeignObjectRel
+
+
+def get_params(request):
     if request.method == 'POST':
-        return request.data.get(param, default)
-    return request.query_params.get(param, default)
+        return request.data
+    return request.query_params
+
+
+def get_param(request, param, default=None):
+    return get_params(request).get(param, default)
+
+
+@lru_cache(maxsize=1024)
+def get_lookup_field(model, path):
+    """return the model field a lookup path (e.g. ``artist__name``) ends
+    on, or None if the path isn't made of model fields
+
+    A path ending on a relation ends on the field it points to (usually
+    the primary key of the related model).
+
+    """
+    opts = model._meta
+    parts = path.split(LOOKUP_SEP)
+    field = None
+    for i, part in enumerate(parts):
+        try:
+            field = opts.pk if part == 'pk' else opts.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        if not field.is_relation:
+            if i != len(parts) - 1:
+                return None
+            return field
+        if field.related_model is None:  # pragma: no cover
+            # generic foreign key
+            return None
+        opts = field.related_model._meta
+    if field.many_to_one and field.concrete:
+        return field.target_field
+    return opts.pk
+
+
+@lru_cache(maxsize=1024)
+def lookup_spans_multivalued(model, lookup):
+    """return True if the lookup (e.g. ``genres__name__icontains``) goes
+    through a many to many or reverse foreign key relation of the model,
+    in which case filtering on it can return the same row several times"""
+    opts = model._meta
+    for part in lookup.split(LOOKUP_SEP):
+        try:
+            field = opts.get_field(part)
+        except FieldDoesNotExist:
+            # transform, lookup or annotation
+            return False
+        if not field.is_relation:
+            return False
+        if field.many_to_many or field.one_to_many:
+            return True
+        if field.related_model is None:  # pragma: no cover
+            # generic foreign key
+            return False
+        opts = field.related_model._meta
+    return False
+
+
+def q_spans_multivalued(model, q):
+    """return True if one of the lookups of the Q object spans a multi
+    valued relation (see :func:`lookup_spans_multivalued`)"""
+    for child in q.children:
+        if isinstance(child, Q):
+            if q_spans_multivalued(model, child):
+                return True
+        elif isinstance(child, tuple):
+            if lookup_spans_multivalued(model, child[0]):
+                return True
+    return False
+
+
+def query_spans_multivalued(query):
+    """return True if the query already joins a many to many or reverse
+    foreign key relation (e.g. filtered on it by a filterset or by the
+    view), in which case it can return the same row several times"""
+    for join in query.alias_map.values():
+        join_field = getattr(join, 'join_field', None)
+        if join_field is not None and (
+                join_field.one_to_many or join_field.many_to_many):
+            return True
+    return False
+
+
+@lru_cache(maxsize=1024)
+def split_multivalued_lookup(model, lookup):
+    """split a lookup at its first multi valued relation
+
+    return value is a tuple ``(outer_ref, related_model, related_lookup,
+    remaining_lookup)`` such that filtering ``related_model`` on
+    ``related_lookup=OuterRef(outer_ref)`` and ``remaining_lookup`` is
+    equivalent to the lookup, or None if the lookup doesn't span a multi
+    valued relation (or one that can't be expressed like this, e.g. a
+    generic relation).
+
+    >>> split_multivalued_lookup(Album, 'genres__name__icontains')
+    ('pk', Genre, 'albums', 'name__icontains')
+
+    """
+    opts = model._meta
+    parts = lookup.split(LOOKUP_SEP)
+    for i, part in enumerate(parts):
+        try:
+            field = opts.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        if not field.is_relation:
+            return None
+        if field.many_to_many or field.one_to_many:
+            if isinstance(field, ManyToManyField):
+                related_lookup = field.related_query_name()
+            elif isinstance(field, ForeignObjectRel):
+                related_lookup = field.field.name
+            else:
+                return None
+            remaining = parts[i + 1:]
+            try:
+                field.related_model._meta.get_field(remaining[0])
+            except (IndexError, FieldDoesNotExist):
+                # lookup on the related objects themselves
+                remaining = ['pk'] + remaining
+            return (
+                LOOKUP_SEP.join(parts[:i] + ['pk']),
+                field.related_model,
+                related_lookup,
+                LOOKUP_SEP.join(remaining),
+            )
+        if field.related_model is None:  # pragma: no cover
+            return None
+        opts = field.related_model._meta
+    return None
+
+
+def exists_q(model, q):
+    """return a copy of the Q object where the lookups spanning a multi
+    valued relation are replaced with ``EXISTS`` subqueries
+
+    ``Q(genres__name__icontains='rock')`` becomes
+    ``Q(Exists(Genre.objects.filter(albums=OuterRef('pk'),
+    name__icontains='rock')))``, which doesn't join the genres in the
+    main query, so its rows don't have to be made distinct.
+
+    """
+    ret = Q()
+    ret.connector = q.connector
+    ret.negated = q.negated
+    for child in q.children:
+        if isinstance(child, Q):
+            child = exists_q(model, child)
+        elif isinstance(child, tuple):
+            split = split_multivalued_lookup(model, child[0])
+            if split is not None:
+                outer_ref, related_model, related_lookup, remaining = split
+                child = Exists(related_model._base_manager.filter(**{
+                    related_lookup: OuterRef(outer_ref),
+                    remaining: child[1],
+                }))
+        ret.children.append(child)
+    return ret
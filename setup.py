@@ -85,7 +85,9 @@ setup(
     author_email=author_email,
     packages=[
         'rest_framework_datatables',
-        'rest_framework_datatables.django_filters'
+        'rest_framework_datatables.django_filters',
+        'rest_framework_datatables.management',
+        'rest_framework_datatables.management.commands',
     ],
     install_requires=[
         'djangorestframework>=3.14.0',
@@ -0,0 +1,131 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import path
+
+from rest_framework import serializers
+from rest_framework.generics import ListAPIView
+from rest_framework.test import APIClient
+
+from rest_framework_datatables import compiler
+from rest_framework_datatables.compiler import (
+    DatatablesCompiledListSerializer, compile_serializer, get_factory,
+    get_field_kind)
+
+from albums.models import Album
+from albums.serializers import AlbumSerializer
+
+
+class AlbumOtherSerializer(serializers.ModelSerializer):
+    artist = serializers.SlugRelatedField(slug_field='name', read_only=True)
+    genres = serializers.StringRelatedField(many=True)
+    title = serializers.CharField(source='__str__')
+    year = serializers.CharField()
+
+    class Meta:
+        model = Album
+        fields = ('id', 'artist', 'genres', 'title', 'year')
+
+
+class AlbumCustomSerializer(AlbumSerializer):
+    def to_representation(self, instance):
+        return {'name': instance.name}
+
+
+class AlbumCompiledSerializer(AlbumSerializer):
+    class Meta(AlbumSerializer.Meta):
+        list_serializer_class = DatatablesCompiledListSerializer
+
+
+class AlbumListAPIView(ListAPIView):
+    queryset = Album.objects.order_by('rank')
+    serializer_class = AlbumSerializer
+
+
+class AlbumCompiledListAPIView(AlbumListAPIView):
+    serializer_class = AlbumCompiledSerializer
+
+
+urlpatterns = [
+    path('api/albums/', AlbumListAPIView.as_view()),
+    path('api/albums/compiled/', AlbumCompiledListAPIView.as_view()),
+]
+
+
+class TestCompileSerializer(TestCase):
+    fixtures = ['test_data']
+
+    def assertCompiled(self, serializer):
+        row = compile_serializer(serializer)
+        for album in Album.objects.all():
+            self.assertEqual(row(album), serializer.to_representation(album))
+
+    def test_compile(self):
+        self.assertCompiled(AlbumSerializer())
+        self.assertCompiled(AlbumOtherSerializer())
+
+    def test_field_kinds(self):
+        serializer = AlbumSerializer()
+        fields = serializer.fields
+        self.assertEqual(get_field_kind(serializer, fields['name'])[0],
+                         'identity')
+        self.assertEqual(
+            get_field_kind(serializer, fields['artist_name'])[0], 'identity'
+        )
+        self.assertEqual(get_field_kind(serializer, fields['artist'])[0],
+                         'nested')
+        self.assertEqual(get_field_kind(serializer, fields['DT_RowId'])[0],
+                         'method')
+        serializer = AlbumOtherSerializer()
+        fields = serializer.fields
+        self.assertEqual(get_field_kind(serializer, fields['year'])[0],
+                         'value')
+        for name in ('artist', 'genres', 'title'):
+            self.assertEqual(get_field_kind(serializer, fields[name])[0],
+                             'field')
+
+    def test_cache(self):
+        self.assertIs(get_factory(AlbumSerializer()),
+                      get_factory(AlbumSerializer()))
+        serializer = AlbumSerializer()
+        del serializer.fields['year']
+        self.assertIsNot(get_factory(serializer),
+                         get_factory(AlbumSerializer()))
+
+    def test_max_factories(self):
+        # the sets of fields come from the columns requested by the client
+        factory = get_factory(AlbumSerializer())
+        with mock.patch.object(compiler, 'MAX_FACTORIES', 2):
+            for name in ('rank', 'year', 'name'):
+                serializer = AlbumSerializer()
+                del serializer.fields[name]
+                get_factory(serializer)
+            self.assertEqual(len(compiler._factories), 2)
+            self.assertIsNot(get_factory(AlbumSerializer()), factory)
+
+    def test_fallback(self):
+        self.assertIsNone(compile_serializer(AlbumCustomSerializer()))
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestDatatablesCompiledListSerializer(TestCase):
+    fixtures = ['test_data']
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_list(self):
+        for params in (
+                '?format=datatables&length=10'
+                '&columns[0][data]=name&columns[1][data]=artist.name',
+                '?format=datatables&length=10&columns[0][data]=genres'):
+            self.assertEqual(
+                self.client.get('/api/albums/compiled/' + params).json(),
+                self.client.get('/api/albums/' + params).json()
+            )
+        self.assertEqual(
+            self.client.get('/api/albums/compiled/?format=json').json()[
+                'results'
+            ],
+            self.client.get('/api/albums/?format=json').json()['results']
+        )
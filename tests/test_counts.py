@@ -0,0 +1,340 @@
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test import TestCase, override_settings
+from django.urls import path
+
+from rest_framework import serializers
+from rest_framework.generics import ListAPIView
+from rest_framework.test import APIClient
+
+from django.db.models import Count, F
+
+from rest_framework_datatables.counts import (
+    EstimatedCount, HybridCount, _version_key, estimate_count,
+    get_count_queryset, get_queryset_versions
+)
+from rest_framework_datatables.django_filters.backends import (
+    DatatablesFilterBackend
+)
+
+from albums.models import Album, Genre
+
+
+class AlbumCountSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Album
+        fields = ('name', 'year')
+
+
+class AlbumCountCacheListAPIView(ListAPIView):
+    queryset = Album.objects.all().order_by('rank')
+    serializer_class = AlbumCountSerializer
+    datatables_count_cache_timeout = 60
+
+
+class GenreAlbumCountCacheListAPIView(AlbumCountCacheListAPIView):
+    queryset = Album.objects.filter(genres__name='Blues Rock').order_by('rank')
+
+
+@override_settings(ROOT_URLCONF=__name__,
+                   DATATABLES_VERSION_CACHE_ALIASES=('default',))
+class TestCountCache(TestCase):
+    fixtures = ['test_data']
+    url = (
+        '/api/albums/?format=datatables&length=5'
+        '&columns[0][data]=name&columns[0][searchable]=true'
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def get(self, url=None):
+        return self.client.get(url or self.url).json()
+
+    def test_cached(self):
+        # count before and page, the filtered count is the total count
+        with self.assertNumQueries(2):
+            self.get()
+        with self.assertNumQueries(1):
+            result = self.get()
+        self.assertEqual(result['recordsTotal'], 15)
+
+    def test_cache_invalidated_on_save(self):
+        self.get()
+        Album.objects.create(name='Wish You Were Here', rank=16, year=1975,
+                             artist=Album.objects.first().artist)
+        with self.assertNumQueries(2):
+            result = self.get()
+        self.assertEqual(result['recordsTotal'], 16)
+
+    def test_cache_invalidated_on_delete(self):
+        self.get()
+        Album.objects.get(rank=1).delete()
+        self.assertEqual(self.get()['recordsTotal'], 14)
+
+    def test_cache_invalidated_on_m2m_change(self):
+        url = self.url.replace('/api/albums/', '/api/albums/rock/')
+        total = self.get(url)['recordsTotal']
+        album = Album.objects.exclude(genres__name='Blues Rock').first()
+        album.genres.add(Genre.objects.get(name='Blues Rock'))
+        self.assertEqual(self.get(url)['recordsTotal'], total + 1)
+
+    def test_write_before_any_cached_count(self):
+        # e.g. another process, which never cached a count, saves an album
+        Album.objects.get(rank=1).save()
+        self.assertIsNotNone(cache.get(_version_key(Album)))
+
+    def test_undeclared_alias(self):
+        queryset = Album.objects.all()
+        str(queryset.query)
+        with self.assertRaises(ImproperlyConfigured):
+            get_queryset_versions(queryset, 'counts')
+        locmem = {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }
+        with override_settings(
+                CACHES={'default': locmem, 'counts': locmem},
+                DATATABLES_VERSION_CACHE_ALIASES=['default', 'counts']):
+            self.assertEqual(len(get_queryset_versions(queryset, 'counts')),
+                             1)
+
+    def test_disabled(self):
+        def connected():
+            return any(r[0][0] == 'drf-datatables:invalidate'
+                       for r in post_delete.receivers)
+
+        self.assertTrue(connected())
+        with override_settings(DATATABLES_VERSION_CACHE_ALIASES=()):
+            # the deletes can be fast deletes
+            self.assertFalse(connected())
+            with self.assertRaises(ImproperlyConfigured):
+                self.get()
+        self.assertTrue(connected())
+
+    def test_search_not_cached(self):
+        self.get()
+        result = self.get(self.url + '&search[value]=the')
+        self.assertEqual((result['recordsFiltered'], result['recordsTotal']),
+                         (3, 15))
+
+
+class AlbumEstimatedCountListAPIView(AlbumCountCacheListAPIView):
+    datatables_count_cache_timeout = None
+    datatables_count_strategy = EstimatedCount()
+
+
+class AlbumHybridCountListAPIView(AlbumEstimatedCountListAPIView):
+    datatables_count_strategy = HybridCount(threshold=100)
+
+
+class AlbumEstimatedCountFilterListAPIView(AlbumEstimatedCountListAPIView):
+    filter_backends = [DatatablesFilterBackend]
+    filterset_fields = ('year',)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestCountStrategies(TestCase):
+    fixtures = ['test_data']
+
+    def setUp(self):
+        self.client = APIClient()
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def get(self, url):
+        return self.client.get(
+            url + '?format=datatables&length=5&columns[0][data]=name'
+            '&columns[0][searchable]=true'
+        ).json()
+
+    def test_estimate_count(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('depends on the statistics of the database')
+        self.assertEqual(estimate_count(Album.objects.all()), 15)
+        self.assertIsNone(estimate_count(Album.objects.filter(year=1966)))
+
+    def test_estimated(self):
+        with self.assertNumQueries(2):
+            result = self.get('/api/albums/estimated/')
+        self.assertEqual(result['recordsTotal'], 15)
+        self.assertEqual(result['recordsFiltered'], 15)
+        self.assertTrue(result['recordsTotalApproximate'])
+        self.assertTrue(result['recordsFilteredApproximate'])
+
+    def test_estimated_filtered(self):
+        result = self.client.get(
+            '/api/albums/estimated/?format=datatables&length=5'
+            '&columns[0][data]=name&columns[0][searchable]=true'
+            '&search[value]=the'
+        ).json()
+        self.assertEqual(result['recordsFiltered'], 3)
+        self.assertTrue(result['recordsTotalApproximate'])
+        self.assertNotIn('recordsFilteredApproximate', result)
+
+    def test_hybrid_below_threshold(self):
+        result = self.get('/api/albums/hybrid/')
+        self.assertEqual(result['recordsTotal'], 15)
+        self.assertNotIn('recordsTotalApproximate', result)
+
+    def test_django_filter_backend(self):
+        # estimate, no count after filtering as nothing is filtered, page
+        with self.assertNumQueries(2):
+            result = self.get('/api/albums/estimated/filter/')
+        self.assertEqual(result['recordsFiltered'], 15)
+        self.assertTrue(result['recordsTotalApproximate'])
+
+
+class AlbumCappedCountListAPIView(AlbumCountCacheListAPIView):
+    datatables_count_cache_timeout = None
+    datatables_count_cap = 2
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestCappedCount(TestCase):
+    fixtures = ['test_data']
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, search, start=0):
+        return self.client.get(
+            '/api/albums/capped/?format=datatables&length=1&start=%d'
+            '&columns[0][data]=name&columns[0][searchable]=true'
+            '&search[value]=%s' % (start, search)
+        )
+
+    def test_capped(self):
+        result = self.get('the').json()
+        self.assertEqual((result['recordsFiltered'], result['recordsTotal']),
+                         (2, 15))
+        self.assertTrue(result['recordsFilteredCapped'])
+
+    def test_paging_within_cap(self):
+        result = self.get('the', start=1).json()
+        self.assertEqual(len(result['data']), 1)
+        self.assertEqual(self.get('the', start=2).status_code, 404)
+
+    def test_not_capped(self):
+        result = self.get('revolver').json()
+        self.assertEqual(result['recordsFiltered'], 1)
+        self.assertNotIn('recordsFilteredCapped', result)
+
+
+class AlbumAggregateCountListAPIView(AlbumCountCacheListAPIView):
+    datatables_count_cache_timeout = None
+    datatables_aggregate_counts = True
+
+
+class AlbumAggregateCountFilterListAPIView(AlbumAggregateCountListAPIView):
+    filter_backends = [DatatablesFilterBackend]
+    filterset_fields = ('year',)
+
+
+@override_settings(ROOT_URLCONF=__name__,
+                   DATATABLES_VERSION_CACHE_ALIASES=('default',))
+class TestAggregateCounts(TestCase):
+    fixtures = ['test_data']
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def test_single_query(self):
+        # counts and page
+        with self.assertNumQueries(2):
+            result = self.client.get(
+                '/api/albums/aggregate/?format=datatables&length=5'
+                '&columns[0][data]=name&columns[0][searchable]=true'
+                '&search[value]=the'
+            ).json()
+        self.assertEqual((result['recordsFiltered'], result['recordsTotal']),
+                         (3, 15))
+
+    def test_to_many(self):
+        url = (
+            '?format=datatables&length=5'
+            '&columns[0][data]=name&columns[0][searchable]=true'
+            '&columns[1][data]=genres.name&columns[1][searchable]=true'
+            '&search[value]=rock'
+        )
+        expected = self.client.get('/api/albums/' + url).json()
+        result = self.client.get('/api/albums/aggregate/' + url).json()
+        self.assertEqual(
+            (result['recordsFiltered'], result['recordsTotal']),
+            (expected['recordsFiltered'], expected['recordsTotal'])
+        )
+        self.assertEqual(result['data'], expected['data'])
+
+    def test_django_filter_backend(self):
+        with self.assertNumQueries(2):
+            result = self.client.get(
+                '/api/albums/aggregate/filter/?format=datatables&length=5'
+                '&columns[0][data]=year&columns[0][searchable]=true'
+                '&columns[0][search][value]=1966'
+            ).json()
+        self.assertEqual((result['recordsFiltered'], result['recordsTotal']),
+                         (3, 15))
+
+
+class TestCountQueryset(TestCase):
+    fixtures = ['test_data']
+
+    def test_stripped(self):
+        queryset = Album.objects.select_related('artist').prefetch_related(
+            'genres'
+        ).annotate(artist_name=F('artist__name')).order_by('rank')
+        sql = str(get_count_queryset(queryset).query)
+        self.assertEqual(sql.split(' FROM ')[0],
+                         'SELECT "albums_album"."id"')
+        self.assertNotIn('ORDER BY', sql)
+        self.assertEqual(get_count_queryset(queryset).count(), 15)
+
+    def test_distinct_with_annotation(self):
+        # the annotation may yield several rows per album
+        queryset = Album.objects.annotate(
+            genre=F('genres__name')
+        ).order_by('rank').distinct()
+        count_queryset = get_count_queryset(queryset)
+        self.assertNotIn('ORDER BY', str(count_queryset.query))
+        self.assertEqual(count_queryset.count(), len(queryset))
+
+    def test_distinct_pk_subquery(self):
+        queryset = Album.objects.select_related('artist').filter(
+            genres__name__icontains='rock'
+        ).order_by('rank').distinct()
+        count_queryset = get_count_queryset(queryset)
+        self.assertEqual(
+            str(count_queryset.query).split(' FROM ')[0],
+            'SELECT DISTINCT "albums_album"."id"'
+        )
+        self.assertEqual(count_queryset.count(), queryset.count())
+        self.assertEqual(len(count_queryset.prefetch_related(None)),
+                         count_queryset.count())
+
+    def test_aggregate_unchanged(self):
+        queryset = Album.objects.annotate(n=Count('genres')).filter(n__gt=1)
+        self.assertIs(get_count_queryset(queryset), queryset)
+
+    @override_settings(DEBUG=True)
+    def test_debug_log(self):
+        with self.assertLogs('rest_framework_datatables', 'DEBUG') as logs:
+            get_count_queryset(Album.objects.order_by('rank')).count()
+        self.assertIn('count queryset', logs.output[0])
+
+
+urlpatterns = [
+    path('api/albums/aggregate/', AlbumAggregateCountListAPIView.as_view()),
+    path('api/albums/aggregate/filter/',
+         AlbumAggregateCountFilterListAPIView.as_view()),
+    path('api/albums/capped/', AlbumCappedCountListAPIView.as_view()),
+    path('api/albums/estimated/', AlbumEstimatedCountListAPIView.as_view()),
+    path('api/albums/hybrid/', AlbumHybridCountListAPIView.as_view()),
+    path('api/albums/estimated/filter/',
+         AlbumEstimatedCountFilterListAPIView.as_view()),
+    path('api/albums/', AlbumCountCacheListAPIView.as_view()),
+    path('api/albums/rock/', GenreAlbumCountCacheListAPIView.as_view()),
+]
@@ -1,13 +1,15 @@
 from unittest import mock, SkipTest
 
+from django.db import connection
 from django.urls import include, path
 from django.test import TestCase
-from django.test.utils import override_settings
+from django.test.utils import CaptureQueriesContext, override_settings
 from rest_framework import routers, viewsets
 from rest_framework.test import APIClient, APIRequestFactory
 
 from albums.models import Album
 from albums.serializers import AlbumSerializer
+from rest_framework_datatables.query import get_datatables_query
 
 # Skip this module if django-filter is not available
 try:
@@ -102,7 +104,8 @@ class TestUnfiltered(TestWithViewSet):
 
     def setUp(self):
         self.response = self.client.get('/api/albums/?format=datatables&length=-1')
-        self.view = self.response.renderer_context.get('view')
+        self.query = get_datatables_query(
+            self.response.renderer_context.get('request'))
 
 
 class TestNoFilterSet(TestUnfiltered):
@@ -112,19 +115,19 @@ class TestNoFilterSet(TestUnfiltered):
             super().setUp()
 
     def test_count_before(self):
-        self.assertEqual(self.view._datatables_total_count, 15)
+        self.assertEqual(self.query.total_count, 15)
 
     def test_count_after(self):
-        self.assertEqual(self.view._datatables_filtered_count, 15)
+        self.assertEqual(self.query.filtered_count, 15)
 
 
 class TestCount(TestUnfiltered):
 
     def test_count_before(self):
-        self.assertEqual(self.view._datatables_total_count, 15)
+        self.assertEqual(self.query.total_count, 15)
 
     def test_count_after(self):
-        self.assertEqual(self.view._datatables_filtered_count, 15)
+        self.assertEqual(self.query.filtered_count, 15)
 
 
 class TestFiltered(TestWithViewSet):
@@ -371,11 +374,83 @@ class TestGlobal(TestWithViewSet):
         self.assertEqual(self.data[0]['genres'], 'Blues Rock, Folk Rock')
 
 
+class AlbumGlobalExistsViewSet(AlbumGlobalViewSet):
+    datatables_search_exists = True
+
+
+class TestGlobalExists(TestGlobal):
+    """Same global searches, with the genres searched with EXISTS
+    subqueries"""
+
+    def search(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            super().search(url.replace('/albumsg/', '/albumsge/'))
+        for query in queries:
+            self.assertNotIn('DISTINCT', query['sql'])
+
+
+class AlbumGenresColumnFilter(AlbumGlobalFilter):
+    genres = filters.CharFilter(field_name='genres__name',
+                                lookup_expr='icontains')
+
+
+class AlbumGenresColumnViewSet(AlbumGlobalViewSet):
+    filterset_class = AlbumGenresColumnFilter
+
+
+class TestColumnFilterDistinct(TestWithViewSet):
+    """The genres are joined by the column filter, not by the global
+    search"""
+
+    def test_distinct(self):
+        result = self.client.get(
+            '/api/albumsgc/?format=datatables&length=20'
+            '&columns[0][data]=name'
+            '&columns[0][searchable]=true'
+            '&columns[1][data]=genres'
+            '&columns[1][searchable]=true'
+            '&columns[1][search][value]=rock'
+            '&search[value]=a').json()
+        expected = Album.objects.filter(
+            name__icontains='a', genres__name__icontains='rock'
+        ).distinct().count()
+        self.assertEqual(result['recordsFiltered'], expected)
+        self.assertEqual(
+            len(set(row['DT_RowId'] for row in result['data'])), expected
+        )
+        self.assertEqual(len(result['data']), expected)
+
+
+class TestRange(TestWithViewSet):
+    """Range searches of the columns filtered with a CharFilter"""
+
+    def search(self, year):
+        return self.client.get(
+            '/api/albumsg/?format=datatables&length=20'
+            '&columns[0][data]=year'
+            '&columns[0][searchable]=true'
+            '&columns[0][search][value]=' + year).json()
+
+    def test_range(self):
+        result = self.search('1965..1967')
+        self.assertEqual(result['recordsFiltered'],
+                         Album.objects.filter(year__range=(1965, 1967))
+                         .count())
+        self.assertTrue(all(1965 <= row['year'] <= 1967
+                            for row in result['data']))
+        self.assertEqual(self.search('1971-yadcf_delim-')['recordsFiltered'],
+                         Album.objects.filter(year__gte=1971).count())
+        self.assertEqual(self.search('x..1971')['recordsFiltered'], 0)
+        self.assertEqual(self.search('1971')['recordsFiltered'], 1)
+
+
 router = routers.DefaultRouter()
 router.register(r'albums', AlbumFilterViewSet, basename="albums")
 router.register(r'albumsc', CustomBackendAlbumFilterViewSet, basename="albumsc")
 router.register(r'albumsi', AlbumIcontainsViewSet, basename="albumsi")
 router.register(r'albumsg', AlbumGlobalViewSet, basename="albumsg")
+router.register(r'albumsge', AlbumGlobalExistsViewSet, basename="albumsge")
+router.register(r'albumsgc', AlbumGenresColumnViewSet, basename="albumsgc")
 
 
 urlpatterns = [
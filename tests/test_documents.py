@@ -0,0 +1,267 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.db import connection, models
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+
+from rest_framework import serializers
+from rest_framework.generics import ListAPIView
+from rest_framework.test import APIClient
+
+from rest_framework_datatables import documents
+from rest_framework_datatables.documents import (
+    SearchDocumentField, SearchDocumentMixin, normalize)
+
+from albums.models import Album, Artist, Genre
+
+try:
+    from django_filters import rest_framework as filters
+    from rest_framework_datatables.django_filters.backends import (
+        DatatablesFilterBackend)
+    from rest_framework_datatables.django_filters.filterset import (
+        DatatablesFilterSet)
+    from rest_framework_datatables.django_filters.filters import (
+        GlobalFilter)
+except ImportError:  # pragma: no cover
+    filters = None
+
+
+class DocumentAlbum(SearchDocumentMixin, models.Model):
+    """Album with a search document, its tables are created by the
+    tests"""
+    name = models.CharField(max_length=80)
+    rank = models.PositiveIntegerField()
+    artist = models.ForeignKey(Artist, models.CASCADE,
+                               related_name='document_albums')
+    genres = models.ManyToManyField(Genre, related_name='document_albums')
+    search_document = SearchDocumentField(
+        sources=('name', 'artist__name', 'genres__name')
+    )
+
+    class Meta:
+        app_label = 'albums'
+        managed = False
+
+
+# only maintained while the tests using the model run
+document_fields = documents.unregister(DocumentAlbum)
+
+
+class AlbumDocumentSerializer(serializers.ModelSerializer):
+    artist_name = serializers.CharField(source='artist.name')
+    genres = serializers.SlugRelatedField(slug_field='name', many=True,
+                                          read_only=True)
+
+    class Meta:
+        model = DocumentAlbum
+        fields = ('rank', 'name', 'artist_name', 'genres')
+
+
+class AlbumListAPIView(ListAPIView):
+    queryset = DocumentAlbum.objects.select_related(
+        'artist'
+    ).prefetch_related('genres').order_by('rank')
+    serializer_class = AlbumDocumentSerializer
+
+
+class AlbumDocumentListAPIView(AlbumListAPIView):
+    datatables_search_document = 'search_document'
+
+
+urlpatterns = [
+    path('api/albums/', AlbumListAPIView.as_view()),
+    path('api/albums/document/', AlbumDocumentListAPIView.as_view()),
+]
+
+
+if filters is not None:
+    class GlobalCharFilter(GlobalFilter, filters.CharFilter):
+        pass
+
+    class AlbumDocumentFilter(DatatablesFilterSet):
+        name = GlobalCharFilter(lookup_expr='icontains')
+        artist_name = GlobalCharFilter(field_name='artist__name',
+                                       lookup_expr='icontains')
+        genres = GlobalCharFilter(field_name='genres__name',
+                                  lookup_expr='icontains', distinct=True)
+
+        class Meta:
+            model = DocumentAlbum
+            fields = ('name', 'artist_name', 'genres')
+
+    class AlbumFilterListAPIView(AlbumListAPIView):
+        filter_backends = [DatatablesFilterBackend]
+        filterset_class = AlbumDocumentFilter
+
+    class AlbumFilterDocumentListAPIView(AlbumFilterListAPIView):
+        datatables_search_document = 'search_document'
+
+    urlpatterns += [
+        path('api/albums/filter/', AlbumFilterListAPIView.as_view()),
+        path('api/albums/filter/document/',
+             AlbumFilterDocumentListAPIView.as_view()),
+    ]
+
+
+class DocumentsTestCase(TestCase):
+    fixtures = ['test_data']
+
+    @classmethod
+    def setUpClass(cls):
+        with connection.schema_editor() as editor:
+            editor.create_model(DocumentAlbum)
+        documents.register(DocumentAlbum, document_fields)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        documents.unregister(DocumentAlbum)
+        with connection.schema_editor() as editor:
+            editor.delete_model(DocumentAlbum)
+
+    @classmethod
+    def setUpTestData(cls):
+        # the documents are built by the signals
+        for album in Album.objects.order_by('pk'):
+            DocumentAlbum.objects.create(
+                pk=album.pk, name=album.name, rank=album.rank,
+                artist=album.artist
+            ).genres.set(album.genres.order_by('pk'))
+
+    def document(self, name):
+        return DocumentAlbum.objects.get(name=name).search_document.split(
+            '\n'
+        )
+
+
+def get_senders(signal):
+    """return the ids of the senders the document receivers are connected
+    to"""
+    return set(r[0][1] for r in signal.receivers if r[0][0] == documents.UID)
+
+
+class TestReceivers(TestCase):
+    def test_not_registered(self):
+        self.assertEqual(get_senders(post_save), set())
+        self.assertEqual(get_senders(m2m_changed), set())
+
+    def test_senders(self):
+        documents.register(DocumentAlbum, document_fields)
+        try:
+            self.assertEqual(get_senders(post_save), set(
+                id(model) for model in (DocumentAlbum, Artist, Genre)
+            ))
+            self.assertEqual(get_senders(m2m_changed),
+                             {id(DocumentAlbum.genres.through)})
+            # the other models keep the fast deletes
+            self.assertFalse(post_delete.has_listeners(User))
+        finally:
+            documents.unregister(DocumentAlbum)
+        self.assertEqual(get_senders(post_delete), set())
+
+
+class TestSearchDocuments(DocumentsTestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize('  Café   Tacvba '), 'cafe tacvba')
+
+    def test_build(self):
+        self.assertEqual(self.document('Highway 61 Revisited'),
+                         ['highway 61 revisited', 'bob dylan', 'blues rock',
+                          'folk rock'])
+
+    def test_save(self):
+        album = DocumentAlbum.objects.get(name='Revolver')
+        album.name = 'Revolver (Remastered)'
+        album.save(update_fields=['name'])
+        self.assertEqual(self.document('Revolver (Remastered)')[0],
+                         'revolver (remastered)')
+
+    def test_related(self):
+        artist = Artist.objects.get(name='Bob Dylan')
+        artist.name = 'Robert Zimmerman'
+        artist.save()
+        self.assertIn('robert zimmerman', self.document('Blonde on Blonde'))
+        # moved to another artist
+        album = DocumentAlbum.objects.get(name='Revolver')
+        album.artist = artist
+        album.save()
+        self.assertIn('robert zimmerman', self.document('Revolver'))
+
+    def test_many_to_many(self):
+        album = DocumentAlbum.objects.get(name='Revolver')
+        modal = Genre.objects.get(name='Modal')
+        album.genres.add(modal)
+        self.assertIn('modal', self.document('Revolver'))
+        modal.document_albums.remove(album)
+        self.assertNotIn('modal', self.document('Revolver'))
+        modal.document_albums.add(album)
+        modal.document_albums.clear()
+        self.assertNotIn('modal', self.document('Revolver'))
+        self.assertFalse(any('modal' in album.search_document
+                             for album in DocumentAlbum.objects.all()))
+        album.genres.clear()
+        self.assertEqual(self.document('Revolver'), ['revolver',
+                                                     'the beatles'])
+
+    def test_delete(self):
+        genre = Genre.objects.get(name='Folk Rock')
+        genre.delete()
+        self.assertNotIn('folk rock', self.document('Highway 61 Revisited'))
+
+    def test_command(self):
+        DocumentAlbum.objects.update(search_document='')
+        out = StringIO()
+        call_command('rebuild_datatables_search_documents',
+                     'albums.DocumentAlbum', stdout=out)
+        self.assertEqual(
+            out.getvalue().strip(),
+            'Updated 15 search documents of albums.DocumentAlbum'
+        )
+        self.assertEqual(self.document('Highway 61 Revisited')[1],
+                         'bob dylan')
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestSearchDocumentBackends(DocumentsTestCase):
+    params = (
+        '?format=datatables&length=20'
+        '&columns[0][data]=name&columns[0][searchable]=true'
+        '&columns[1][data]=artist_name&columns[1][name]=artist.name'
+        '&columns[1][searchable]=true'
+        '&columns[2][data]=genres&columns[2][name]=genres.name'
+        '&columns[2][searchable]=true'
+        '&search[value]=%s'
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def search(self, url, value):
+        expected = self.client.get(url + self.params % value).json()
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(
+                url + 'document/' + self.params % value
+            ).json()
+        self.assertEqual(result, expected)
+        count = [q['sql'] for q in queries
+                 if 'COUNT' in q['sql'] and 'WHERE' in q['sql']][0]
+        self.assertIn('"albums_documentalbum"."search_document" LIKE',
+                      count)
+        self.assertNotIn('JOIN', count)
+        return result
+
+    def test_plain_backend(self):
+        for value in ('dylan', 'ROCK', 'the', 'highway'):
+            self.assertTrue(self.search('/api/albums/', value)['data'])
+
+    def test_django_filter_backend(self):
+        if filters is None:  # pragma: no cover
+            self.skipTest('django-filter not available')
+        for value in ('dylan', 'ROCK', 'the'):
+            self.assertTrue(self.search('/api/albums/filter/', value)['data'])
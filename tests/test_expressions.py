@@ -0,0 +1,112 @@
+from django.db import connection
+from django.db.models import Value
+from django.db.models.functions import Concat
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+
+from rest_framework.generics import ListAPIView
+from rest_framework.test import APIClient
+
+from rest_framework_datatables.expressions import GroupConcat
+
+from albums.models import Album
+from albums.serializers import AlbumSerializer
+
+try:
+    from rest_framework_datatables.django_filters.backends import (
+        DatatablesFilterBackend)
+except ImportError:  # pragma: no cover
+    DatatablesFilterBackend = None
+
+
+class AlbumExpressionListAPIView(ListAPIView):
+    queryset = Album.objects.select_related('artist').prefetch_related(
+        'genres'
+    )
+    serializer_class = AlbumSerializer
+    datatables_column_expressions = {
+        'genres': GroupConcat('genres__name'),
+        'title': Concat('artist__name', Value(' - '), 'name'),
+    }
+    datatables_additional_order_by = 'rank'
+
+
+urlpatterns = [
+    path('api/albums/', AlbumExpressionListAPIView.as_view()),
+]
+
+
+if DatatablesFilterBackend is not None:
+    class AlbumFilterExpressionListAPIView(AlbumExpressionListAPIView):
+        filter_backends = [DatatablesFilterBackend]
+        filterset_fields = ('name', 'year')
+
+    urlpatterns.append(
+        path('api/albums/filter/', AlbumFilterExpressionListAPIView.as_view())
+    )
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestColumnExpressions(TestCase):
+    fixtures = ['test_data']
+    params = (
+        '?format=datatables&length=20'
+        '&columns[0][data]=name&columns[0][searchable]=true'
+        '&columns[0][orderable]=true'
+        '&columns[1][data]=genres&columns[1][searchable]=true'
+        '&columns[1][orderable]=true'
+        '&columns[2][data]=title&columns[2][searchable]=true'
+        '&columns[2][orderable]=true'
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, query, url='/api/albums/'):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(url + self.params + query).json()
+        return result, [q['sql'] for q in queries]
+
+    def ordered_names(self, *ordering):
+        return list(Album.objects.annotate(
+            genre_names=GroupConcat('genres__name'),
+            title=Concat('artist__name', Value(' - '), 'name'),
+        ).order_by(*ordering).values_list('name', flat=True))
+
+    def test_order(self):
+        result, queries = self.get('&order[0][column]=1&order[0][dir]=desc')
+        self.assertEqual([row['name'] for row in result['data']],
+                         self.ordered_names('-genre_names', 'rank'))
+        # the count doesn't compute the aggregate
+        self.assertNotIn('GROUP_CONCAT', queries[0])
+        self.assertIn('GROUP_CONCAT', queries[1])
+        result, queries = self.get('&order[0][column]=2&order[0][dir]=asc')
+        self.assertEqual([row['name'] for row in result['data']],
+                         self.ordered_names('title', 'rank'))
+
+    def test_search(self):
+        result, queries = self.get('&columns[1][search][value]=folk')
+        self.assertEqual(
+            result['recordsFiltered'],
+            Album.objects.filter(genres__name__icontains='folk')
+            .distinct().count()
+        )
+        self.assertIn('HAVING', ' '.join(queries))
+        result, queries = self.get('&search[value]=dylan - high')
+        self.assertEqual([row['name'] for row in result['data']],
+                         ['Highway 61 Revisited'])
+
+    def test_unused(self):
+        result, queries = self.get('&order[0][column]=0&order[0][dir]=asc')
+        self.assertEqual(result['recordsFiltered'], 15)
+        self.assertNotIn('GROUP_CONCAT', ' '.join(queries))
+        self.assertNotIn('||', ' '.join(queries))
+
+    def test_django_filter_order(self):
+        if DatatablesFilterBackend is None:  # pragma: no cover
+            self.skipTest('django-filter not available')
+        result, queries = self.get('&order[0][column]=1&order[0][dir]=asc',
+                                   url='/api/albums/filter/')
+        self.assertEqual([row['name'] for row in result['data']],
+                         self.ordered_names('genre_names', 'rank'))
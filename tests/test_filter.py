@@ -1,19 +1,31 @@
-from albums.models import Album
+import datetime
+
+from albums.models import Album, Artist, Genre
 from albums.serializers import AlbumSerializer
 
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Exists, Q
 from django.urls import path
-from django.test.utils import override_settings
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.test import TestCase
 
 from rest_framework.generics import ListAPIView
+from rest_framework.request import Request
 from rest_framework.test import (
-    APIClient,
+    APIClient, APIRequestFactory
 )
 from rest_framework.filters import BaseFilterBackend
 from rest_framework_datatables.pagination import (
     DatatablesLimitOffsetPagination,
 )
-from rest_framework_datatables.filters import DatatablesFilterBackend
+from rest_framework_datatables.filters import (
+    DatatablesFilterBackend, get_search_type, range_search_q, typed_search_q
+)
+from rest_framework_datatables.utils import (
+    exists_q, get_lookup_field, lookup_spans_multivalued,
+    split_multivalued_lookup
+)
 
 
 class CustomFilterBackend(BaseFilterBackend):
@@ -94,8 +106,321 @@ class TestFilterTestCase(TestCase):
         result = response.json()
         self.assertEqual((result['recordsFiltered'], result['recordsTotal']), expected)
 
+class AlbumSearchListAPIView(ListAPIView):
+    queryset = Album.objects.all().order_by('rank')
+    serializer_class = AlbumSerializer
+
+
+class AlbumExistsSearchListAPIView(AlbumSearchListAPIView):
+    datatables_search_exists = True
+
+
+class TestFilterDistinctTestCase(TestCase):
+    fixtures = ['test_data']
+
+    def setUp(self):
+        self.client = APIClient()
+        self.backend = DatatablesFilterBackend()
+
+    def test_lookup_spans_multivalued(self):
+        self.assertFalse(lookup_spans_multivalued(Album, 'name__icontains'))
+        self.assertFalse(
+            lookup_spans_multivalued(Album, 'artist__name__icontains')
+        )
+        self.assertTrue(
+            lookup_spans_multivalued(Album, 'genres__name__icontains')
+        )
+        self.assertTrue(lookup_spans_multivalued(Artist, 'albums__name'))
+        self.assertFalse(lookup_spans_multivalued(Album, 'year__gte'))
+        info = lookup_spans_multivalued.cache_info()
+        self.assertEqual(info.maxsize, 1024)
+
+    def test_filter_q(self):
+        queryset = Album.objects.all()
+        q = Q(name__icontains='the') | Q(artist__name__icontains='the')
+        self.assertFalse(self.backend.filter_q(queryset, q).query.distinct)
+        q &= Q(year=1966) | Q(genres__name__icontains='rock')
+        self.assertTrue(self.backend.filter_q(queryset, q).query.distinct)
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_exists(self):
+        url = (
+            '?format=datatables&length=10'
+            '&columns[0][data]=name&columns[0][searchable]=true'
+            '&columns[1][data]=genres&columns[1][name]=genres.name'
+            '&columns[1][searchable]=true'
+            '&search[value]=%s'
+        )
+        for search in ('rock', 'Blue'):
+            expected = self.client.get('/api/filterdistinct/' + url % search)
+            with CaptureQueriesContext(connection) as queries:
+                result = self.client.get('/api/filterexists/' + url % search)
+            self.assertEqual(result.json(), expected.json())
+            self.assertIn('EXISTS', queries[1]['sql'])
+            self.assertNotIn('DISTINCT', queries[1]['sql'])
+
+    def test_exists_q(self):
+        self.assertEqual(
+            split_multivalued_lookup(Album, 'genres__name__icontains'),
+            ('pk', Genre, 'albums', 'name__icontains')
+        )
+        self.assertEqual(split_multivalued_lookup.cache_info().maxsize, 1024)
+        q = exists_q(Artist, ~Q(albums__genres__name='Modal') & Q(name='x'))
+        self.assertTrue(q.children[0].negated)
+        self.assertIsInstance(q.children[0].children[0], Exists)
+        self.assertEqual(q.children[1], ('name', 'x'))
+        self.assertEqual(
+            set(Artist.objects.filter(exists_q(
+                Artist, Q(albums__genres__name='Modal')
+            ))),
+            set(Artist.objects.filter(albums__genres__name='Modal'))
+        )
+
+
+class AlbumTokensSearchListAPIView(AlbumSearchListAPIView):
+    datatables_tokenize_search = True
+    datatables_search_max_tokens = 2
+    datatables_search_lookups = {'name': 'istartswith'}
+
+
+class TestSearchModesTestCase(TestCase):
+    fixtures = ['test_data']
+    params = (
+        '?format=datatables&length=20'
+        '&columns[0][data]=name&columns[0][searchable]=true'
+        '&columns[1][data]=artist_name&columns[1][name]=artist.name'
+        '&columns[1][searchable]=true'
+        '&columns[2][data]=year&columns[2][searchable]=true'
+        '&columns[2][search][value]=%s'
+        '&search[value]=%s'
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def search(self, url, value, year=''):
+        result = self.client.get(url + self.params % (year, value)).json()
+        return sorted(album['name'] for album in result['data'])
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_tokens(self):
+        self.assertEqual(self.search('/api/filterdistinct/', 'dylan highway'),
+                         [])
+        self.assertEqual(self.search('/api/filtertokens/', 'dylan highway'),
+                         ['Highway 61 Revisited'])
+        self.assertEqual(
+            self.search('/api/filtertokens/', 'Highway  dylan highway'),
+            ['Highway 61 Revisited']
+        )
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_max_tokens(self):
+        # the third word is ignored
+        self.assertEqual(
+            self.search('/api/filtertokens/', 'dylan highway xyz'),
+            ['Highway 61 Revisited']
+        )
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_lookups(self):
+        self.assertEqual(self.search('/api/filterdistinct/', 'rev'),
+                         ['Highway 61 Revisited', 'Revolver'])
+        self.assertEqual(self.search('/api/filtertokens/', 'rev'),
+                         ['Revolver'])
+        self.assertEqual(
+            self.search('/api/filtertokens/', 'rev', year='1966'),
+            ['Revolver']
+        )
+
+
+class AlbumTypedSearchListAPIView(AlbumSearchListAPIView):
+    datatables_typed_search = True
+
+
+class TestTypedSearchTestCase(TestCase):
+    fixtures = ['test_data']
+    params = (
+        '?format=datatables&length=20'
+        '&columns[0][data]=name&columns[0][searchable]=%s'
+        '&columns[1][data]=rank&columns[1][searchable]=true'
+        '&columns[2][data]=year&columns[2][searchable]=true'
+        '&columns[3][data]=artist_name&columns[3][name]=artist.name'
+        '&columns[3][searchable]=%s'
+        '&search[value]=%s'
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def search(self, url, value, text=True):
+        text = 'true' if text else 'false'
+        params = self.params % (text, text, value)
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(url + params).json()
+        # no filtered count query when nothing can match
+        sql = queries[1]['sql'] if len(queries) > 1 else ''
+        return result['recordsFiltered'], sql
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_numbers(self):
+        self.assertEqual(self.search('/api/filterdistinct/', '1966')[0], 3)
+        count, sql = self.search('/api/filtertyped/', '1966')
+        self.assertEqual(count, 3)
+        self.assertIn('"albums_album"."year" = 1966', sql)
+        self.assertNotIn('"albums_album"."year" AS TEXT', sql)
+        self.assertEqual(self.search('/api/filterdistinct/', '19')[0], 15)
+        self.assertEqual(self.search('/api/filtertyped/', '19')[0], 0)
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_text(self):
+        count, sql = self.search('/api/filtertyped/', 'the')
+        self.assertEqual(count, self.search('/api/filterdistinct/', 'the')[0])
+        self.assertNotIn('"albums_album"."year"', sql)
+        self.assertNotIn('"albums_album"."rank"', sql)
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_no_searchable_column(self):
+        # text can't be found in the numeric columns
+        self.assertEqual(
+            self.search('/api/filtertyped/', 'the', text=False)[0], 0
+        )
+        self.assertEqual(
+            self.search('/api/filtertyped/', '  3 ', text=False)[0], 1
+        )
+
+    def test_dates(self):
+        alice = User.objects.create(username='alice')
+        User.objects.filter(pk=alice.pk).update(
+            date_joined=datetime.datetime(2020, 2, 29, 23, 0,
+                                          tzinfo=datetime.timezone.utc)
+        )
+        for value, found in (('2020', True), ('2020-02', True),
+                             ('2020-2', True), ('2020-02-29', True),
+                             ('2020-03', False), ('2020-02-30', False),
+                             ('2020-13', False), ('foo', False)):
+            q = typed_search_q(User, 'date_joined', value)
+            self.assertEqual(
+                q is not None and User.objects.filter(q).exists(), found,
+                value
+            )
+        self.assertIsNone(typed_search_q(User, 'is_staff', 'true'))
+        self.assertEqual(typed_search_q(Album, 'artist', '2'),
+                         Q(artist=2))
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_out_of_range(self):
+        # too large for the database driver
+        self.assertIsNone(typed_search_q(Album, 'year',
+                                         '99999999999999999999'))
+        self.assertIsNone(typed_search_q(Album, 'year', '-1'))
+        self.assertEqual(
+            self.search('/api/filtertyped/', '99999999999999999999')[0], 0
+        )
+
+    def test_bounded_cache(self):
+        # the paths come from the columns sent by the client
+        for i in range(2000):
+            get_search_type(Album, 'junk%d' % i)
+        for func in (get_search_type, get_lookup_field):
+            info = func.cache_info()
+            self.assertLessEqual(info.currsize, info.maxsize)
+
+
+class AlbumRangeSearchListAPIView(AlbumSearchListAPIView):
+    datatables_range_delimiters = ('~',)
+
+
+class TestRangeSearchTestCase(TestCase):
+    fixtures = ['test_data']
+    params = (
+        '?format=datatables&length=20'
+        '&columns[0][data]=name&columns[0][searchable]=true'
+        '&columns[0][search][value]=%s'
+        '&columns[1][data]=year&columns[1][searchable]=true'
+        '&columns[1][search][value]=%s'
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def search(self, year, name='', url='/api/filterdistinct/'):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(url + self.params % (name, year)).json()
+        sql = ' '.join(q['sql'] for q in queries)
+        return result['recordsFiltered'], sql
+
+    def expected(self, **kwargs):
+        return Album.objects.filter(**kwargs).count()
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_range(self):
+        count, sql = self.search('1965..1967')
+        self.assertEqual(count, self.expected(year__range=(1965, 1967)))
+        self.assertIn('"albums_album"."year" >= 1965', sql)
+        self.assertIn('"albums_album"."year" <= 1967', sql)
+        self.assertEqual(self.search('1967-yadcf_delim-')[0],
+                         self.expected(year__gte=1967))
+        self.assertEqual(self.search('..1966')[0],
+                         self.expected(year__lte=1966))
+        self.assertEqual(self.search('-yadcf_delim-')[0], 15)
+        self.assertEqual(self.search('foo..1966')[0], 0)
+        self.assertEqual(self.search('1..99999999999999999999')[0], 0)
+        self.assertEqual(
+            range_search_q(Album, 'year', '1..99999999999999999999'),
+            Q(pk__in=[])
+        )
+        # substring search of the text columns
+        self.assertEqual(self.search('', 'a..b')[0], 0)
+
+    def test_get_q(self):
+        # without the queryset, the range is searched as text
+        request = Request(APIRequestFactory().get('/', {
+            'columns[0][data]': 'year', 'columns[0][searchable]': 'true',
+            'columns[0][search][value]': '1965..1967'
+        }))
+        backend = DatatablesFilterBackend()
+        datatables_query = backend.parse_datatables_query(
+            request, AlbumSearchListAPIView()
+        )
+        self.assertEqual(backend.get_q(datatables_query),
+                         Q(year__icontains='1965..1967'))
+        datatables_query['queryset'] = Album.objects.all()
+        self.assertEqual(
+            Album.objects.filter(backend.get_q(datatables_query)).count(),
+            self.expected(year__range=(1965, 1967))
+        )
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_delimiters(self):
+        self.assertEqual(
+            self.search('1965~1967', url='/api/filterrange/')[0],
+            self.expected(year__range=(1965, 1967))
+        )
+        self.assertEqual(self.search('1965..1967', url='/api/filterrange/')[0],
+                         0)
+
+    def test_dates(self):
+        alice = User.objects.create(username='alice')
+        User.objects.filter(pk=alice.pk).update(
+            date_joined=datetime.datetime(2020, 2, 29, 23, 0,
+                                          tzinfo=datetime.timezone.utc)
+        )
+        for value, found in (('2020..2020', True), ('2019..2020-01', False),
+                             ('2020-02-29..', True), ('..2020-02-28', False),
+                             ('2020-03..', False), ('..2020-02', True),
+                             ('2020-02-30..', False)):
+            q = range_search_q(User, 'date_joined', value)
+            self.assertEqual(User.objects.filter(q).exists(), found, value)
+        self.assertIsNone(range_search_q(User, 'username', 'a..b'))
+        self.assertIsNone(range_search_q(User, 'date_joined', '2020'))
+
 urlpatterns = [
     path('api/additionalorderby/', TestFilterTestCase.TestAPIView.as_view()),
     path('api/multiplefilterbackends/', TestFilterTestCase.TestAPIView2.as_view()),
     path('api/filter/albums/', TestFilterTestCase.TestAPIView3.as_view()),
+    path('api/filterdistinct/', AlbumSearchListAPIView.as_view()),
+    path('api/filterexists/', AlbumExistsSearchListAPIView.as_view()),
+    path('api/filtertokens/', AlbumTokensSearchListAPIView.as_view()),
+    path('api/filtertyped/', AlbumTypedSearchListAPIView.as_view()),
+    path('api/filterrange/', AlbumRangeSearchListAPIView.as_view()),
 ]
@@ -0,0 +1,151 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+
+from rest_framework import serializers
+from rest_framework.generics import ListAPIView
+from rest_framework.test import APIClient
+
+from rest_framework_datatables import fts
+from rest_framework_datatables.filters import DatatablesFTSFilterBackend
+
+from albums.models import Album
+
+
+class AlbumFTSSerializer(serializers.ModelSerializer):
+    artist_name = serializers.CharField(source='artist.name')
+
+    class Meta:
+        model = Album
+        fields = ('rank', 'name', 'artist_name')
+
+
+class AlbumListAPIView(ListAPIView):
+    queryset = Album.objects.select_related('artist').order_by('rank')
+    serializer_class = AlbumFTSSerializer
+
+
+class AlbumFTSListAPIView(AlbumListAPIView):
+    filter_backends = [DatatablesFTSFilterBackend]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestFTS(TestCase):
+    fixtures = ['test_data']
+    params = (
+        '?format=datatables&length=20'
+        '&columns[0][data]=name&columns[0][searchable]=true'
+        '&columns[1][data]=artist_name&columns[1][name]=artist.name'
+        '&columns[1][searchable]=%s&search[value]=%s'
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.index = fts.register(Album, ['name'])
+
+    @classmethod
+    def tearDownClass(cls):
+        fts.unregister(Album)
+        super().tearDownClass()
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('FTS5 indexes are only available on SQLite')
+        self.client = APIClient()
+        self.index.rebuild()
+
+    def tearDown(self):
+        self.index.drop()
+
+    def search(self, value, artist=False):
+        params = self.params % ('true' if artist else 'false', value)
+        expected = self.client.get('/api/albums/' + params).json()
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get('/api/albums/fts/' + params).json()
+        self.assertEqual(result, expected)
+        return result, queries[-1]['sql']
+
+    def test_match(self):
+        result, sql = self.search('VOLV')
+        self.assertEqual([r['name'] for r in result['data']], ['Revolver'])
+        self.assertIn('MATCH', sql)
+        self.assertNotIn('LIKE', sql)
+
+    def test_not_indexed_column(self):
+        result, sql = self.search('dylan', artist=True)
+        self.assertTrue(result['data'])
+        self.assertIn('MATCH', sql)
+        self.assertIn('LIKE', sql)
+
+    def test_fallback(self):
+        # the trigram tokenizer needs at least 3 characters
+        result, sql = self.search('so')
+        self.assertNotIn('MATCH', sql)
+        self.index.drop()
+        result, sql = self.search('the')
+        self.assertEqual(result['recordsFiltered'], 3)
+        self.assertNotIn('MATCH', sql)
+
+    def test_quotes(self):
+        result, sql = self.search('"pepper\'s')
+        self.assertEqual(result['recordsFiltered'], 0)
+
+    def test_signals(self):
+        album = Album.objects.create(name='Wish You Were Here', rank=16,
+                                     year=1975,
+                                     artist=Album.objects.first().artist)
+        self.assertEqual(self.search('you were')[0]['recordsFiltered'], 1)
+        album.name = 'Animals'
+        album.save()
+        self.assertEqual(self.search('you were')[0]['recordsFiltered'], 0)
+        self.assertEqual(self.search('nimal')[0]['recordsFiltered'], 1)
+        album.delete()
+        self.assertEqual(self.search('nimal')[0]['recordsFiltered'], 0)
+
+    def test_created_by_another_process(self):
+        self.index.drop()
+        self.assertFalse(self.index.is_available())
+        # the table is created by another process
+        fts.FTSIndex(Album, ['name']).rebuild()
+        # and noticed once the missing table is forgotten
+        self.assertFalse(self.index.is_available())
+        self.index._missing['default'] = 0
+        self.assertTrue(self.index.is_available())
+        Album.objects.create(name='Wish You Were Here', rank=16, year=1975,
+                             artist=Album.objects.first().artist)
+        self.assertEqual(self.search('you were')[0]['recordsFiltered'], 1)
+
+    def test_missing_table(self):
+        self.index.drop()
+        with CaptureQueriesContext(connection) as context:
+            self.assertFalse(self.index.is_available())
+            self.assertFalse(self.index.is_available())
+            self.assertEqual(self.search('revolver')[0]['recordsFiltered'], 1)
+            Album.objects.first().save()
+        self.assertEqual(
+            len([q for q in context.captured_queries
+                 if 'sqlite_master' in q['sql']]),
+            1
+        )
+        self.index.create()
+        self.assertTrue(self.index.is_available())
+
+    def test_command(self):
+        self.index.drop()
+        out = StringIO()
+        call_command('rebuild_datatables_fts', 'albums.Album', stdout=out)
+        self.assertIn('albums_album_fts', out.getvalue())
+        self.assertIn('MATCH', self.search('revolver')[1])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_datatables_fts', 'albums.Genre')
+
+
+urlpatterns = [
+    path('api/albums/', AlbumListAPIView.as_view()),
+    path('api/albums/fts/', AlbumFTSListAPIView.as_view()),
+]
@@ -0,0 +1,131 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+
+from rest_framework.generics import ListAPIView
+from rest_framework.test import APIClient
+
+from rest_framework_datatables.mixins import DatatablesValuesMixin
+from rest_framework_datatables.pagination import (
+    DatatablesPageNumberPagination)
+
+from albums.models import Album
+from albums.serializers import AlbumSerializer
+
+
+class WindowPageNumberPagination(DatatablesPageNumberPagination):
+    count_with_window = True
+
+
+class AlbumListAPIView(ListAPIView):
+    queryset = Album.objects.order_by('rank')
+    serializer_class = AlbumSerializer
+
+
+class AlbumValuesListAPIView(DatatablesValuesMixin, AlbumListAPIView):
+    datatables_values_formatters = {'year': str}
+
+    def get_row_items(self, row):
+        return {'DT_RowId': 'row_%d' % row['pk'],
+                'DT_RowAttr': {'data-pk': row['pk']}}
+
+
+class AlbumValuesWindowListAPIView(AlbumValuesListAPIView):
+    pagination_class = WindowPageNumberPagination
+
+
+class AlbumValuesPlanListAPIView(AlbumValuesListAPIView):
+    datatables_plan_relations = True
+    datatables_load_only = True
+
+
+urlpatterns = [
+    path('api/albums/', AlbumListAPIView.as_view()),
+    path('api/albums/values/', AlbumValuesListAPIView.as_view()),
+    path('api/albums/values/window/', AlbumValuesWindowListAPIView.as_view()),
+    path('api/albums/values/plan/', AlbumValuesPlanListAPIView.as_view()),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestDatatablesValuesMixin(TestCase):
+    fixtures = ['test_data']
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, url, columns, params=''):
+        params = '?format=datatables&length=5' + params + ''.join(
+            '&columns[%d][data]=%s' % (i, c) for i, c in enumerate(columns)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(url + params).json()
+        return result, [q['sql'] for q in queries]
+
+    def expected(self, columns, params=''):
+        result = self.get('/api/albums/', columns, params)[0]
+        for row in result['data']:
+            if 'year' in row:
+                row['year'] = str(row['year'])
+            if 'artist' in row:
+                # always serialized by the nested serializer
+                del row['artist']['id']
+        return result
+
+    def test_values(self):
+        columns = ['rank', 'name', 'artist.name', 'year']
+        result, queries = self.get('/api/albums/values/', columns)
+        self.assertEqual(result, self.expected(columns))
+        self.assertEqual(result['data'][0]['artist'],
+                         {'name': 'The Beatles'})
+        # the count and the page
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('"albums_album"."genres"', queries[1])
+
+    def test_search_and_order(self):
+        columns = ['rank', 'name', 'artist.name']
+        params = ('&columns[1][searchable]=true'
+                  '&columns[2][searchable]=true'
+                  '&columns[1][orderable]=true'
+                  '&order[0][column]=1&order[0][dir]=desc'
+                  '&search[value]=the')
+        result = self.get('/api/albums/values/', columns, params)[0]
+        self.assertEqual(result, self.expected(columns, params))
+
+    def test_column_name(self):
+        result = self.get('/api/albums/values/', ['artist_name'],
+                          '&columns[0][name]=artist.name')[0]
+        self.assertEqual(result['data'][0]['artist_name'], 'The Beatles')
+
+    def test_window_count(self):
+        columns = ['rank', 'name']
+        result, queries = self.get('/api/albums/values/window/', columns)
+        self.assertEqual(result, self.expected(columns))
+
+    def test_planned_queryset(self):
+        # the values() query replaces the relations and fields of the plan
+        columns = ['rank', 'name', 'artist.name', 'year']
+        result = self.get('/api/albums/values/plan/', columns)[0]
+        self.assertEqual(result, self.expected(columns))
+
+    def test_fallback(self):
+        # the genres are a many to many relation
+        columns = ['name', 'genres']
+        result = self.get('/api/albums/values/', columns)[0]
+        self.assertEqual(result, self.expected(columns))
+        result = self.client.get('/api/albums/values/?format=json').json()
+        self.assertIn('genres', result['results'][0])
+
+    def test_relation(self):
+        # the serializer renders the artist, not its primary key
+        columns = ['name', 'artist']
+        result = self.get('/api/albums/values/', columns)[0]
+        self.assertEqual(result, self.get('/api/albums/', columns)[0])
+        self.assertEqual(result['data'][0]['artist']['name'], 'The Beatles')
+        # the primary key itself
+        result = self.get('/api/albums/values/', ['artist.id'])[0]
+        self.assertEqual(result['data'][0], {
+            'artist': {'id': 2}, 'DT_RowId': 'row_1',
+            'DT_RowAttr': {'data-pk': 1}
+        })
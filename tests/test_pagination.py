@@ -0,0 +1,315 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+
+from rest_framework import serializers
+from rest_framework.generics import ListAPIView
+from rest_framework.test import APIClient
+
+from rest_framework_datatables.django_filters.backends import (
+    DatatablesFilterBackend
+)
+from rest_framework_datatables.pagination import (
+    DatatablesKeysetPagination, DatatablesLimitOffsetPagination,
+    DatatablesPageNumberPagination
+)
+
+from albums.models import Album
+
+
+class AlbumPageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Album
+        fields = ('rank', 'name', 'year')
+
+
+class WindowPageNumberPagination(DatatablesPageNumberPagination):
+    count_with_window = True
+
+
+class WindowLimitOffsetPagination(DatatablesLimitOffsetPagination):
+    count_with_window = True
+
+
+class AlbumPageListAPIView(ListAPIView):
+    queryset = Album.objects.all().order_by('rank')
+    serializer_class = AlbumPageSerializer
+
+
+class AlbumWindowPageNumberListAPIView(AlbumPageListAPIView):
+    pagination_class = WindowPageNumberPagination
+
+
+class AlbumWindowLimitOffsetListAPIView(AlbumPageListAPIView):
+    pagination_class = WindowLimitOffsetPagination
+
+
+class AlbumFilterListAPIView(AlbumPageListAPIView):
+    filter_backends = [DatatablesFilterBackend]
+    filterset_fields = ('year',)
+
+
+class AlbumWindowFilterListAPIView(AlbumFilterListAPIView):
+    pagination_class = WindowPageNumberPagination
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestWindowCount(TestCase):
+    fixtures = ['test_data']
+    params = (
+        '?format=datatables&length=2&start=%s'
+        '&columns[0][data]=name&columns[0][searchable]=true'
+        '&columns[1][data]=genres.name&columns[1][searchable]=%s'
+        '&search[value]=%s'
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, url, start=0, search='the', to_many=False):
+        return self.client.get(url + self.params % (
+            start, 'true' if to_many else 'false', search
+        ))
+
+    def assertSameResult(self, url, **kwargs):
+        expected = self.get('/api/albums/', **kwargs).json()
+        result = self.get(url, **kwargs).json()
+        self.assertEqual(result, expected)
+        return result
+
+    def test_page_number(self):
+        result = self.assertSameResult('/api/albums/window/', start=2)
+        self.assertEqual(result['recordsFiltered'], 3)
+
+    def test_limit_offset(self):
+        self.assertSameResult('/api/albums/window/lo/', start=2)
+
+    def test_single_query(self):
+        url = (
+            '?format=datatables&length=2&start=2'
+            '&columns[0][data]=year&columns[0][searchable]=true'
+            '&columns[0][search][value]=1966'
+        )
+        expected = self.client.get('/api/albums/filter/' + url).json()
+        # total count and page, the filtered count comes with the page
+        with self.assertNumQueries(2):
+            result = self.client.get('/api/albums/window/filter/' + url)
+        self.assertEqual(result.json(), expected)
+        self.assertEqual(expected['recordsFiltered'], 3)
+
+    def test_empty_page(self):
+        self.assertEqual(
+            self.get('/api/albums/window/', start=4).status_code, 404
+        )
+        result = self.assertSameResult('/api/albums/window/', search='xyz')
+        self.assertEqual(result['recordsFiltered'], 0)
+        result = self.get('/api/albums/window/lo/', start=4).json()
+        self.assertEqual((result['recordsFiltered'], result['data']), (3, []))
+
+    def test_search(self):
+        # total count and page, the filtered count comes with the page
+        with self.assertNumQueries(2):
+            self.get('/api/albums/window/')
+
+    def test_distinct(self):
+        # the search on genres makes the queryset DISTINCT, the filtered
+        # count is fetched with a separate query
+        with self.assertNumQueries(3):
+            self.get('/api/albums/window/', to_many=True)
+        self.assertSameResult('/api/albums/window/', search='rock',
+                              to_many=True)
+        self.assertSameResult('/api/albums/window/lo/', search='rock',
+                              to_many=True)
+
+    def test_show_all(self):
+        result = self.client.get(
+            '/api/albums/window/?format=datatables&length=-1'
+            '&columns[0][data]=name&columns[0][searchable]=true'
+            '&search[value]=the'
+        ).json()
+        self.assertEqual((result['recordsFiltered'], len(result['data'])),
+                         (3, 3))
+
+
+class KeysetPagination(DatatablesKeysetPagination):
+    keyset_min_offset = 2
+
+
+class AlbumKeysetListAPIView(AlbumPageListAPIView):
+    pagination_class = KeysetPagination
+
+
+class AlbumLimitOffsetListAPIView(AlbumPageListAPIView):
+    pagination_class = DatatablesLimitOffsetPagination
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestKeysetPagination(TestCase):
+    fixtures = ['test_data']
+    params = (
+        '?format=datatables&length=4&start=%d'
+        '&columns[0][data]=rank&columns[0][orderable]=true'
+        '&columns[1][data]=year&columns[1][orderable]=true'
+        '&columns[2][data]=name&columns[2][searchable]=true'
+        '&order[0][column]=%d&order[0][dir]=%s&search[value]=%s'
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def get_page(self, url, start, column=0, dir_='asc', search=''):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(
+                url + self.params % (start, column, dir_, search)
+            ).json()
+        return result, queries[-1]['sql']
+
+    def test_sequential(self):
+        for dir_ in ('asc', 'desc'):
+            for start in range(0, 16, 4):
+                result, sql = self.get_page('/api/albums/keyset/', start,
+                                            dir_=dir_)
+                expected, _ = self.get_page('/api/albums/lo/', start,
+                                            dir_=dir_)
+                self.assertEqual(result, expected)
+                if start > 2:
+                    self.assertNotIn('OFFSET', sql)
+
+    def test_random_jump(self):
+        result, sql = self.get_page('/api/albums/keyset/', 8)
+        self.assertIn('OFFSET', sql)
+        expected, _ = self.get_page('/api/albums/lo/', 8)
+        self.assertEqual(result, expected)
+
+    def test_ties(self):
+        # several albums share a year, the pk keeps the order total
+        ranks = []
+        for start in range(0, 16, 4):
+            result, sql = self.get_page('/api/albums/keyset/', start, 1,
+                                        'desc')
+            ranks.extend(row['rank'] for row in result['data'])
+        self.assertEqual(sorted(ranks), list(range(1, 16)))
+        years = list(Album.objects.order_by('-year', 'pk').values_list(
+            'rank', flat=True
+        ))
+        self.assertEqual(ranks, years)
+
+    def test_search(self):
+        self.get_page('/api/albums/keyset/', 0, search='e')
+        result, sql = self.get_page('/api/albums/keyset/', 4, search='e')
+        expected, _ = self.get_page('/api/albums/lo/', 4, search='e')
+        self.assertEqual(result, expected)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_not_a_key(self):
+        paginator = KeysetPagination()
+        self.assertIsNone(paginator.get_keyset_ordering(
+            Album.objects.order_by('genres__name')
+        ))
+        self.assertIsNone(paginator.get_keyset_ordering(
+            Album.objects.order_by('?')
+        ))
+        self.assertEqual(
+            paginator.get_keyset_ordering(
+                Album.objects.order_by('-artist__name')
+            ),
+            [('artist__name', True), ('id', False)]
+        )
+
+
+class AlbumRowSerializer(serializers.ModelSerializer):
+    artist_name = serializers.CharField(source='artist.name')
+    genres = serializers.SlugRelatedField(slug_field='name', many=True,
+                                          read_only=True)
+
+    class Meta:
+        model = Album
+        fields = ('rank', 'name', 'artist_name', 'genres')
+
+
+class PksFirstPageNumberPagination(DatatablesPageNumberPagination):
+    fetch_pks_first = True
+
+
+class PksFirstLimitOffsetPagination(DatatablesLimitOffsetPagination):
+    fetch_pks_first = True
+
+
+class AlbumRowListAPIView(ListAPIView):
+    queryset = Album.objects.select_related('artist').prefetch_related(
+        'genres'
+    ).order_by('rank')
+    serializer_class = AlbumRowSerializer
+
+
+class AlbumPksFirstListAPIView(AlbumRowListAPIView):
+    pagination_class = PksFirstPageNumberPagination
+
+
+class AlbumPksFirstLimitOffsetListAPIView(AlbumRowListAPIView):
+    pagination_class = PksFirstLimitOffsetPagination
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestPksFirst(TestCase):
+    fixtures = ['test_data']
+    params = (
+        '?format=datatables&length=4&start=%d'
+        '&columns[0][data]=rank&columns[0][orderable]=true'
+        '&columns[1][data]=artist_name&columns[1][name]=artist.name'
+        '&columns[1][orderable]=true&columns[1][searchable]=true'
+        '&columns[2][data]=genres&columns[2][name]=genres.name'
+        '&columns[2][searchable]=true'
+        '&order[0][column]=1&order[0][dir]=desc&search[value]=%s'
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assertSameResult(self, url, start, search=''):
+        expected = self.client.get(
+            '/api/albums/rows/' + self.params % (start, search)
+        ).json()
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(url + self.params % (start, search))
+        self.assertEqual(result.json(), expected)
+        # counts, primary keys of the page, rows and genres
+        self.assertEqual(len(queries), 5 if search else 4)
+        select = queries[-3]['sql'].split(' FROM ')[0]
+        self.assertIn('"albums_album"."id"', select)
+        self.assertNotIn('"albums_album"."name"', select)
+        self.assertIn('IN (', queries[-2]['sql'])
+
+    def test_page_number(self):
+        self.assertSameResult('/api/albums/pks/', 4)
+        self.assertSameResult('/api/albums/pks/', 8, 'rock')
+
+    def test_limit_offset(self):
+        self.assertSameResult('/api/albums/pks/lo/', 4)
+        self.assertSameResult('/api/albums/pks/lo/', 8, 'rock')
+
+    def test_values_queryset(self):
+        paginator = PksFirstPageNumberPagination()
+        queryset = Album.objects.order_by('rank').values('name')
+        self.assertFalse(paginator.can_fetch_pks_first(queryset))
+        self.assertEqual(paginator.get_page_rows(queryset, 0, 2),
+                         list(queryset[:2]))
+
+
+urlpatterns = [
+    path('api/albums/rows/', AlbumRowListAPIView.as_view()),
+    path('api/albums/pks/', AlbumPksFirstListAPIView.as_view()),
+    path('api/albums/pks/lo/', AlbumPksFirstLimitOffsetListAPIView.as_view()),
+    path('api/albums/keyset/', AlbumKeysetListAPIView.as_view()),
+    path('api/albums/lo/', AlbumLimitOffsetListAPIView.as_view()),
+    path('api/albums/', AlbumPageListAPIView.as_view()),
+    path('api/albums/window/', AlbumWindowPageNumberListAPIView.as_view()),
+    path('api/albums/filter/', AlbumFilterListAPIView.as_view()),
+    path('api/albums/window/filter/',
+         AlbumWindowFilterListAPIView.as_view()),
+    path('api/albums/window/lo/',
+         AlbumWindowLimitOffsetListAPIView.as_view()),
+]
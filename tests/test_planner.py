@@ -0,0 +1,239 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+
+from rest_framework import serializers
+from rest_framework.generics import ListAPIView
+from rest_framework.test import APIClient
+
+from rest_framework_datatables.planner import (
+    get_relation_lookups, get_source_paths, load_only, plan_relations
+)
+from rest_framework_datatables.serializers import DatatablesSerializerMixin
+
+from albums.models import Album, Artist
+from albums.serializers import AlbumSerializer
+
+try:
+    from rest_framework_datatables.django_filters.backends import (
+        DatatablesFilterBackend)
+except ImportError:  # pragma: no cover
+    DatatablesFilterBackend = None
+
+
+class AlbumSlugSerializer(DatatablesSerializerMixin,
+                          serializers.ModelSerializer):
+    artist = serializers.SlugRelatedField(slug_field='name', read_only=True)
+    artist_name = serializers.CharField(source='artist.name')
+    genres = serializers.SlugRelatedField(slug_field='name', many=True,
+                                          read_only=True)
+    title = serializers.CharField(source='__str__')
+
+    class Meta:
+        model = Album
+        fields = ('rank', 'artist', 'artist_name', 'genres', 'title')
+
+
+class AlbumNameSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Album
+        fields = ('name',)
+
+
+class ArtistAlbumsSerializer(serializers.ModelSerializer):
+    albums = AlbumNameSerializer(many=True)
+
+    class Meta:
+        model = Artist
+        fields = ('name', 'albums')
+
+
+class AlbumListAPIView(ListAPIView):
+    queryset = Album.objects.select_related('artist').order_by('rank')
+    serializer_class = AlbumSerializer
+
+
+class AlbumLoadOnlyListAPIView(AlbumListAPIView):
+    datatables_load_only = True
+
+
+class AlbumAlwaysLoadListAPIView(AlbumLoadOnlyListAPIView):
+    datatables_always_load = ('year',)
+
+
+class AlbumPlanListAPIView(ListAPIView):
+    queryset = Album.objects.order_by('rank')
+    serializer_class = AlbumSerializer
+    datatables_plan_relations = True
+    datatables_column_relations = {'genres': ('genres',)}
+
+
+class AlbumSlugPlanListAPIView(AlbumPlanListAPIView):
+    serializer_class = AlbumSlugSerializer
+    datatables_load_only = True
+
+
+urlpatterns = [
+    path('api/albums/', AlbumListAPIView.as_view()),
+    path('api/albums/only/', AlbumLoadOnlyListAPIView.as_view()),
+    path('api/albums/always/', AlbumAlwaysLoadListAPIView.as_view()),
+    path('api/albums/plan/', AlbumPlanListAPIView.as_view()),
+    path('api/albums/plan/slug/', AlbumSlugPlanListAPIView.as_view()),
+]
+
+if DatatablesFilterBackend is not None:
+    class AlbumFilterLoadOnlyListAPIView(AlbumLoadOnlyListAPIView):
+        filter_backends = [DatatablesFilterBackend]
+        filterset_fields = ('name',)
+
+    urlpatterns.append(
+        path('api/albums/filter/', AlbumFilterLoadOnlyListAPIView.as_view())
+    )
+
+
+class TestSourcePaths(TestCase):
+    def test_nested(self):
+        serializer = AlbumSerializer()
+        for name in ('rank', 'year', 'artist_name', 'genres'):
+            del serializer.fields[name]
+        del serializer.fields['artist'].fields['id']
+        self.assertEqual(get_source_paths(serializer, Album),
+                         {'name', 'artist', 'artist__name'})
+
+    def test_related_fields(self):
+        self.assertEqual(get_source_paths(AlbumSlugSerializer(), Album),
+                         {'rank', 'artist', 'artist__name'})
+
+    def test_load_only(self):
+        queryset = load_only(Album.objects.select_related('artist'),
+                             ['name'])
+        self.assertEqual(queryset.query.deferred_loading,
+                         (frozenset(['artist', 'name']), False))
+        # the view already chose the fields to load
+        queryset = Album.objects.defer('year')
+        self.assertIs(load_only(queryset, ['name']), queryset)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestLoadOnly(TestCase):
+    fixtures = ['test_data']
+    params = (
+        '?format=datatables&length=5'
+        '&columns[0][data]=name&columns[1][data]=artist.name'
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(url + (params or self.params)).json()
+        page = [q['sql'] for q in queries if 'LIMIT' in q['sql']][0]
+        return result, page, len(queries)
+
+    def test_load_only(self):
+        expected, page, count = self.get('/api/albums/')
+        self.assertIn('"albums_album"."year"', page)
+        result, page, only_count = self.get('/api/albums/only/')
+        self.assertEqual(result, expected)
+        self.assertNotIn('"albums_album"."year"', page)
+        self.assertIn('"albums_artist"."name"', page)
+        # nothing is loaded afterwards
+        self.assertEqual(only_count, count)
+
+    def test_always_load(self):
+        result, page, count = self.get('/api/albums/always/')
+        self.assertIn('"albums_album"."year"', page)
+        # loaded, but not serialized
+        self.assertNotIn('year', result['data'][0])
+
+    def test_keep(self):
+        result, page, count = self.get('/api/albums/only/',
+                                       self.params + '&keep=year')
+        self.assertIn('"albums_album"."year"', page)
+        self.assertTrue(all('year' in row for row in result['data']))
+
+    def test_no_columns(self):
+        # all the fields are serialized
+        result, page, count = self.get('/api/albums/only/',
+                                       '?format=datatables&length=5')
+        self.assertIn('"albums_album"."year"', page)
+
+    def test_django_filter_backend(self):
+        if DatatablesFilterBackend is None:  # pragma: no cover
+            self.skipTest('django-filter not available')
+        expected = self.get('/api/albums/')[0]
+        result, page, count = self.get('/api/albums/filter/')
+        self.assertEqual(result, expected)
+        self.assertNotIn('"albums_album"."year"', page)
+
+
+class TestRelationLookups(TestCase):
+    def test_lookups(self):
+        select_related, prefetches = get_relation_lookups(AlbumSerializer(),
+                                                          Album)
+        self.assertEqual(select_related, {'artist'})
+        # genres are read by a method field
+        self.assertEqual(prefetches, {})
+        serializer = AlbumSlugSerializer()
+        select_related, prefetches = get_relation_lookups(serializer, Album)
+        self.assertEqual(select_related, {'artist'})
+        self.assertEqual(prefetches, {'genres': (
+            Album._meta.get_field('genres'), serializer.fields['genres']
+        )})
+
+    def test_primary_key(self):
+        class AlbumArtistSerializer(serializers.ModelSerializer):
+            class Meta:
+                model = Album
+                fields = ('name', 'artist')
+
+        self.assertEqual(get_relation_lookups(AlbumArtistSerializer(), Album),
+                         (set(), {}))
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestPlanRelations(TestCase):
+    fixtures = ['test_data']
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, url, columns):
+        params = '?format=datatables&length=5' + ''.join(
+            '&columns[%d][data]=%s' % (i, c) for i, c in enumerate(columns)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(url + params).json()
+        return result['data'], [q['sql'] for q in queries]
+
+    def test_plan(self):
+        data, queries = self.get('/api/albums/plan/', ['name', 'artist.name'])
+        self.assertEqual(data[0]['artist']['name'], 'The Beatles')
+        # the count and the page with the artists
+        self.assertEqual(len(queries), 2)
+        self.assertIn('INNER JOIN "albums_artist"', queries[1])
+
+    def test_column_relations(self):
+        data, queries = self.get('/api/albums/plan/', ['name', 'genres'])
+        self.assertTrue(data[0]['genres'])
+        self.assertEqual(len(queries), 3)
+        self.assertNotIn('JOIN "albums_artist"', queries[1])
+        self.assertIn('"albums_genre"', queries[2])
+
+    def test_prefetch_only(self):
+        data, queries = self.get('/api/albums/plan/slug/', ['rank', 'genres'])
+        self.assertTrue(data[0]['genres'])
+        self.assertEqual(len(queries), 3)
+        self.assertIn('"albums_genre"."name"', queries[2])
+        self.assertNotIn('"albums_album"."name"', queries[1])
+
+    def test_reverse_foreign_key(self):
+        queryset = plan_relations(Artist.objects.filter(name='Bob Dylan'),
+                                  ArtistAlbumsSerializer())
+        with CaptureQueriesContext(connection) as queries:
+            data = ArtistAlbumsSerializer(queryset, many=True).data
+        self.assertEqual(len(data[0]['albums']), 2)
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('"albums_album"."rank"', queries[1]['sql'])
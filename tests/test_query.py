@@ -0,0 +1,114 @@
+from django.test import TestCase, override_settings
+from django.urls import path
+
+from rest_framework import serializers
+from rest_framework.generics import ListAPIView
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+
+from rest_framework_datatables.pagination import (
+    DatatablesLimitOffsetPagination
+)
+from rest_framework_datatables.query import get_datatables_query
+
+from albums.models import Album
+
+
+class AlbumNameSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Album
+        fields = ('name', 'year')
+
+
+class AlbumLimitOffsetListAPIView(ListAPIView):
+    queryset = Album.objects.all().order_by('rank')
+    serializer_class = AlbumNameSerializer
+    pagination_class = DatatablesLimitOffsetPagination
+
+
+class DatatablesQueryTestCase(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+
+    def get_query(self, url):
+        request = APIView().initialize_request(self.factory.get(url))
+        return get_datatables_query(request)
+
+    def test_parse(self):
+        query = self.get_query(
+            '/api/albums/?format=datatables&draw=3&start=10&length=5'
+            '&columns[0][data]=rank&columns[0][orderable]=true'
+            '&columns[1][data]=artist.name&columns[1][name]=artist.name,year'
+            '&columns[1][searchable]=true'
+            '&columns[1][search][value]=Beatles'
+            '&columns[1][search][regex]=true'
+            '&order[0][column]=1&order[0][dir]=desc&order[1][column]=0'
+            '&search[value]=pink&search[regex]=false'
+        )
+        self.assertEqual((query.draw, query.start, query.length),
+                         ('3', '10', '5'))
+        self.assertEqual((query.search_value, query.search_regex),
+                         ('pink', False))
+        self.assertEqual(len(query.columns), 2)
+        col = query.columns[1]
+        self.assertEqual(col.name, ['artist__name', 'year'])
+        self.assertEqual((col.data, col.searchable, col.orderable),
+                         ('artist.name', True, False))
+        self.assertEqual((col.search_value, col.search_regex),
+                         ('Beatles', True))
+        self.assertEqual(col['name'], col.name)
+        self.assertEqual(col.get('search_regex'), True)
+        self.assertIn('data', col)
+        self.assertNotIn(0, col)
+        self.assertEqual(col.get('foo', 1), 1)
+        with self.assertRaises(KeyError):
+            col['foo']
+        self.assertEqual(dict(col)['data'], 'artist.name')
+        self.assertEqual(
+            [(o.column.index, o.dir) for o in query.order],
+            [(1, 'desc'), (0, 'asc')]
+        )
+
+    def test_parse_null_column_and_gaps(self):
+        query = self.get_query(
+            '/api/albums/?columns[0][data]=&columns[1][data]=name'
+            '&columns[3][data]=year'
+            '&order[0][column]=5&order[1][column]=abc&order[2][column]=1'
+        )
+        self.assertEqual(len(query.columns), 2)
+        self.assertEqual(query.columns[0].name, [])
+        self.assertFalse(query.columns[0].searchable)
+        self.assertEqual([o.column.index for o in query.order], [1])
+
+    def test_shared(self):
+        request = APIView().initialize_request(
+            self.factory.get('/api/albums/?columns[0][data]=name')
+        )
+        self.assertIs(get_datatables_query(request),
+                      get_datatables_query(request))
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class DatatablesQueryCountsTestCase(TestCase):
+    fixtures = ['test_data']
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_limitoffset_counts_once(self):
+        # count before, count after and the page itself
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                '/api/albums/?format=datatables&length=10&start=0'
+                '&columns[0][data]=name&columns[0][searchable]=true'
+                '&search[value]=the'
+            )
+        result = response.json()
+        self.assertEqual(
+            (result['recordsFiltered'], result['recordsTotal']), (3, 15)
+        )
+
+
+urlpatterns = [
+    path('api/albums/', AlbumLimitOffsetListAPIView.as_view()),
+]
@@ -0,0 +1,172 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+
+from rest_framework import serializers
+from rest_framework.generics import ListAPIView
+from rest_framework.test import APIClient
+
+from rest_framework_datatables.refinement import extends
+
+from albums.models import Album, Genre
+
+
+class AlbumRefineSerializer(serializers.ModelSerializer):
+    artist_name = serializers.CharField(source='artist.name')
+
+    class Meta:
+        model = Album
+        fields = ('rank', 'name', 'artist_name')
+
+
+class AlbumRefineListAPIView(ListAPIView):
+    queryset = Album.objects.select_related('artist').order_by('rank')
+    serializer_class = AlbumRefineSerializer
+    datatables_refine_cache_timeout = 60
+
+
+class AlbumRefineTokensListAPIView(AlbumRefineListAPIView):
+    datatables_tokenize_search = True
+
+
+class AlbumSmallRefineListAPIView(AlbumRefineListAPIView):
+    datatables_refine_max_pks = 2
+
+
+class AlbumGenresRefineSerializer(AlbumRefineSerializer):
+    genres = serializers.StringRelatedField(many=True)
+
+    class Meta(AlbumRefineSerializer.Meta):
+        fields = ('rank', 'name', 'genres')
+
+
+class AlbumGenresRefineListAPIView(AlbumRefineListAPIView):
+    serializer_class = AlbumGenresRefineSerializer
+
+
+urlpatterns = [
+    path('api/albums/', AlbumRefineListAPIView.as_view()),
+    path('api/albums/tokens/', AlbumRefineTokensListAPIView.as_view()),
+    path('api/albums/small/', AlbumSmallRefineListAPIView.as_view()),
+    path('api/albums/genres/', AlbumGenresRefineListAPIView.as_view()),
+]
+
+
+class TestExtends(TestCase):
+    def test_extends(self):
+        self.assertTrue(extends(['pink'], ['pin']))
+        self.assertTrue(extends(['pink'], ['pink']))
+        self.assertTrue(extends(['pink', 'f'], ['pin']))
+        self.assertTrue(extends(['floyd', 'pink'], ['pink', 'fl']))
+        self.assertFalse(extends(['pin'], ['pink']))
+        self.assertFalse(extends(['pink'], ['pink', 'f']))
+
+
+@override_settings(ROOT_URLCONF=__name__,
+                   DATATABLES_VERSION_CACHE_ALIASES=('default',))
+class TestSearchRefinement(TestCase):
+    fixtures = ['test_data']
+    params = (
+        '?format=datatables&length=20'
+        '&columns[0][data]=name&columns[0][searchable]=true'
+        '&columns[1][data]=artist_name&columns[1][name]=artist.name'
+        '&columns[1][searchable]=true'
+        '&search[value]=%s'
+    )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        session = self.client.session
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = \
+            session.session_key
+
+    def search(self, value, url='/api/albums/'):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(url + self.params % value).json()
+        # the queries of the search
+        return [row['name'] for row in result['data']], [
+            q['sql'] for q in queries
+            if 'albums_album' in q['sql'] and 'WHERE' in q['sql']
+        ]
+
+    def expected(self, *values):
+        qs = Album.objects.order_by('rank')
+        for value in values:
+            qs = qs.filter(name__icontains=value) | \
+                qs.filter(artist__name__icontains=value)
+        return list(qs.values_list('name', flat=True))
+
+    def test_refine(self):
+        names, queries = self.search('b')
+        self.assertEqual(names, self.expected('b'))
+        names, queries = self.search('bl')
+        self.assertEqual(names, self.expected('bl'))
+        self.assertIn('"albums_album"."id" IN', queries[0])
+        # not an extension
+        names, queries = self.search('be')
+        self.assertEqual(names, self.expected('be'))
+        self.assertNotIn('"albums_album"."id" IN', queries[0])
+
+    def test_empty(self):
+        names, queries = self.search('xyz')
+        self.assertEqual(names, [])
+        names, queries = self.search('xyzw')
+        self.assertEqual(names, [])
+        # nothing can match, the rows are not even counted
+        self.assertEqual(queries, [])
+
+    def test_data_changed(self):
+        self.search('xyz')
+        Album.objects.create(name='xyzw', rank=16, year=2000,
+                             artist=Album.objects.first().artist)
+        self.assertEqual(self.search('xyzw')[0], ['xyzw'])
+
+    def test_related_data_changed(self):
+        # the genres are only joined by the search
+        params = (
+            '?format=datatables&length=20'
+            '&columns[0][data]=name&columns[0][searchable]=true'
+            '&columns[1][data]=genres&columns[1][name]=genres.name'
+            '&columns[1][searchable]=true'
+            '&search[value]=%s'
+        )
+
+        def search(value):
+            result = self.client.get('/api/albums/genres/' + params % value)
+            return [row['name'] for row in result.json()['data']]
+
+        self.assertEqual(search('mod'), ['Kind of Blue'])
+        Album.objects.get(name='Revolver').genres.add(
+            Genre.objects.get(name='Modal')
+        )
+        self.assertEqual(search('moda'), ['Revolver', 'Kind of Blue'])
+        genre = Genre.objects.get(name='Soul')
+        genre.name = 'Modal Soul'
+        genre.save()
+        self.assertEqual(search('modal'),
+                         ['Revolver', "What's Going On", 'Kind of Blue'])
+
+    def test_tokens(self):
+        self.search('dylan', '/api/albums/tokens/')
+        names, queries = self.search('dylan high', '/api/albums/tokens/')
+        self.assertEqual(names, ['Highway 61 Revisited'])
+        self.assertIn('"albums_album"."id" IN', queries[0])
+
+    def test_max_pks(self):
+        self.search('b', '/api/albums/small/')
+        names, queries = self.search('bl', '/api/albums/small/')
+        self.assertEqual(names, self.expected('bl'))
+        self.assertNotIn('"albums_album"."id" IN', queries[0])
+
+    def test_no_session(self):
+        client = APIClient()
+        client.get('/api/albums/' + self.params % 'b')
+        with CaptureQueriesContext(connection) as queries:
+            client.get('/api/albums/' + self.params % 'bl')
+        self.assertNotIn('"albums_album"."id" IN',
+                         ' '.join(q['sql'] for q in queries))
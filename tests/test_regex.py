@@ -0,0 +1,165 @@
+from urllib.parse import quote
+
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+
+from rest_framework import serializers
+from rest_framework.generics import ListAPIView
+from rest_framework.test import APIClient
+
+from rest_framework_datatables.regex import analyze_regex, regex_q
+
+from albums.models import Album
+
+try:
+    from django_filters import rest_framework as filters
+    from rest_framework_datatables.django_filters.backends import (
+        DatatablesFilterBackend)
+    from rest_framework_datatables.django_filters.filterset import (
+        DatatablesFilterSet)
+    from rest_framework_datatables.django_filters.filters import (
+        GlobalFilter)
+except ImportError:  # pragma: no cover
+    filters = None
+
+
+class AlbumRegexSerializer(serializers.ModelSerializer):
+    artist_name = serializers.CharField(source='artist.name')
+
+    class Meta:
+        model = Album
+        fields = ('rank', 'name', 'artist_name')
+
+
+class AlbumListAPIView(ListAPIView):
+    queryset = Album.objects.select_related('artist').order_by('rank')
+    serializer_class = AlbumRegexSerializer
+
+
+urlpatterns = [
+    path('api/albums/', AlbumListAPIView.as_view()),
+]
+
+
+if filters is not None:
+    class GlobalCharFilter(GlobalFilter, filters.CharFilter):
+        pass
+
+    class AlbumRegexFilter(DatatablesFilterSet):
+        name = GlobalCharFilter(lookup_expr='icontains')
+        artist_name = GlobalCharFilter(field_name='artist__name',
+                                       lookup_expr='icontains')
+
+        class Meta:
+            model = Album
+            fields = ('name', 'artist_name')
+
+    class AlbumFilterListAPIView(AlbumListAPIView):
+        filter_backends = [DatatablesFilterBackend]
+        filterset_class = AlbumRegexFilter
+
+    urlpatterns.append(
+        path('api/albums/filter/', AlbumFilterListAPIView.as_view())
+    )
+
+
+class TestAnalyzeRegex(TestCase):
+    def test_simple(self):
+        self.assertEqual(analyze_regex('rev'), ('contains', ('rev',)))
+        self.assertEqual(analyze_regex('^rev'), ('startswith', ('rev',)))
+        self.assertEqual(analyze_regex('ed$'), ('endswith', ('ed',)))
+        self.assertEqual(analyze_regex('^Revolver$'),
+                         ('exact', ('Revolver',)))
+        self.assertEqual(analyze_regex('^(Revolver|Kind of Blue)$'),
+                         ('exact', ('Revolver', 'Kind of Blue')))
+        self.assertEqual(analyze_regex('(?:rev|blue)'),
+                         ('contains', ('rev', 'blue')))
+        self.assertEqual(analyze_regex(r'^61\.\$'),
+                         ('startswith', ('61.$',)))
+
+    def test_not_simple(self):
+        for pattern in ('^b.*e$', r'\d+', '[abc]', 'a?', '(a)(b)', 'a|b',
+                        '^(a|b.)$', '\\'):
+            self.assertIsNone(analyze_regex(pattern), pattern)
+
+    def test_regex_q(self):
+        self.assertEqual(regex_q('name', '^rev'), Q(name__istartswith='rev'))
+        self.assertEqual(regex_q('name', '^(a|b)$', case_sensitive=True),
+                         Q(name__in=('a', 'b')))
+        self.assertEqual(regex_q('name', '(a|b)'),
+                         Q(name__icontains='a') | Q(name__icontains='b'))
+        self.assertEqual(regex_q('name', 'a+', case_sensitive=True),
+                         Q(name__regex='a+'))
+        self.assertEqual(regex_q('name', '^a$', case_sensitive=True),
+                         Q(name__exact='a'))
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestRegexSearch(TestCase):
+    fixtures = ['test_data']
+    params = (
+        '?format=datatables&length=20'
+        '&columns[0][data]=name&columns[0][searchable]=true'
+        '&columns[1][data]=artist_name&columns[1][name]=artist.name'
+        '&columns[1][searchable]=true'
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def search(self, url, query):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(url + self.params + query).json()
+        sql = ' '.join(q['sql'] for q in queries)
+        return [row['name'] for row in result['data']], sql
+
+    def expected(self, pattern, artist=True):
+        q = Q(name__iregex=pattern)
+        if artist:
+            q |= Q(artist__name__iregex=pattern)
+        return list(Album.objects.filter(q).order_by('rank')
+                    .values_list('name', flat=True))
+
+    def check(self, url):
+        for pattern in ('^rev', 'ed$', '^(Revolver|Kind of Blue)$',
+                        '(?:rev|dylan)'):
+            names, sql = self.search(
+                url, '&search[value]=%s&search[regex]=true' % quote(pattern)
+            )
+            self.assertEqual(names, self.expected(pattern), pattern)
+            self.assertTrue(names)
+            self.assertNotIn('REGEXP', sql)
+        names, sql = self.search(
+            url, '&columns[0][search][value]=^b.*e$'
+            '&columns[0][search][regex]=true'
+        )
+        self.assertEqual(names, self.expected('^b.*e$', artist=False))
+        self.assertIn('REGEXP', sql)
+        names, sql = self.search(
+            url, '&columns[0][search][value]=^HIGHWAY'
+            '&columns[0][search][regex]=true'
+        )
+        self.assertEqual(names, ['Highway 61 Revisited'])
+        self.assertNotIn('REGEXP', sql)
+
+    def test_case_sensitive(self):
+        # LIKE ignores case on SQLite
+        for pattern in ('^pet', '^Pet', 'sounds$', 'Sounds', '^pet sounds$'):
+            self.assertEqual(
+                Album.objects.filter(
+                    regex_q('name', pattern, case_sensitive=True)
+                ).count(),
+                Album.objects.filter(name__regex=pattern).count(),
+                pattern
+            )
+
+    def test_plain_backend(self):
+        self.check('/api/albums/')
+
+    def test_django_filter_backend(self):
+        if filters is None:  # pragma: no cover
+            self.skipTest('django-filter not available')
+        self.check('/api/albums/filter/')
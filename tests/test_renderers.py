@@ -5,6 +5,7 @@ from django.test import TestCase
 
 from rest_framework.test import APIRequestFactory
 from rest_framework.views import APIView
+from rest_framework_datatables.query import get_datatables_query
 from rest_framework_datatables.renderers import DatatablesRenderer
 
 
@@ -69,11 +70,12 @@ class DatatablesRendererTestCase(TestCase):
         obj = {'results': [{'foo': 'bar'}, {'spam': 'eggs'}]}
         renderer = DatatablesRenderer()
         view = APIView()
-        view._datatables_total_count = 4
-        view._datatables_filtered_count = 2
         request = view.initialize_request(
             self.factory.get('/api/foo/?format=datatables&draw=1')
         )
+        query = get_datatables_query(request)
+        query.total_count = 4
+        query.filtered_count = 2
         content = renderer.render(obj, 'application/json', {'request': request, 'view': view})
         expected = {
             'recordsTotal': 4,
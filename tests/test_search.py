@@ -0,0 +1,149 @@
+import threading
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+
+from rest_framework import serializers
+from rest_framework.generics import ListAPIView
+from rest_framework.test import APIClient
+
+from rest_framework_datatables.search import NgramIndex, NgramSearchProvider
+
+from albums.models import Album, Genre
+
+
+class AlbumSearchSerializer(serializers.ModelSerializer):
+    artist_name = serializers.CharField(source='artist.name')
+    genres = serializers.SlugRelatedField(slug_field='name', many=True,
+                                          read_only=True)
+
+    class Meta:
+        model = Album
+        fields = ('rank', 'name', 'artist_name', 'genres')
+
+
+class AlbumListAPIView(ListAPIView):
+    queryset = Album.objects.select_related('artist').prefetch_related(
+        'genres'
+    ).order_by('rank')
+    serializer_class = AlbumSearchSerializer
+
+
+class AlbumNgramListAPIView(AlbumListAPIView):
+    datatables_search_provider = NgramSearchProvider(['name', 'genres__name'])
+
+
+class AlbumSmallNgramListAPIView(AlbumListAPIView):
+    datatables_search_provider = NgramSearchProvider(['name'], max_rows=5)
+
+
+class AlbumFewResultsNgramListAPIView(AlbumListAPIView):
+    datatables_search_provider = NgramSearchProvider(['name'], max_results=2)
+
+
+class TestNgramIndex(TestCase):
+    def test_search(self):
+        index = NgramIndex(3)
+        index.add('name', 1, 'revolver')
+        index.add('name', 2, 'rubber soul')
+        self.assertEqual(index.search('name', 'volv'), {1})
+        self.assertEqual(index.search('name', 'r'), {1, 2})
+        self.assertEqual(index.search('name', 'revlo'), set())
+        # all the trigrams of "olvre" are in "revolver", not the string
+        self.assertEqual(index.search('name', 'olvre'), set())
+        index.remove(1)
+        self.assertEqual(index.search('name', 'volv'), set())
+        self.assertNotIn('vol', index.postings['name'])
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestNgramSearchProvider(TestCase):
+    fixtures = ['test_data']
+    params = (
+        '?format=datatables&length=20'
+        '&columns[0][data]=name&columns[0][searchable]=true'
+        '&columns[1][data]=artist_name&columns[1][name]=artist.name'
+        '&columns[1][searchable]=true'
+        '&columns[2][data]=genres&columns[2][name]=genres.name'
+        '&columns[2][searchable]=true'
+        '&search[value]=%s'
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+        for view in (AlbumNgramListAPIView, AlbumSmallNgramListAPIView,
+                     AlbumFewResultsNgramListAPIView):
+            view.datatables_search_provider.invalidate('default')
+
+    def search(self, value, url='/api/albums/ngram/'):
+        expected = self.client.get('/api/albums/' + self.params % value)
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(url + self.params % value).json()
+        self.assertEqual(result, expected.json())
+        # the filtered count
+        return result, [q['sql'] for q in queries
+                        if 'COUNT' in q['sql'] and 'WHERE' in q['sql']][0]
+
+    def test_search(self):
+        for value in ('rock', 'BLUE', 'b', 'revolver', 'xyz', 'dylan'):
+            result, sql = self.search(value)
+            self.assertNotIn('"albums_album"."name" LIKE', sql)
+            self.assertNotIn('"albums_genre"."name" LIKE', sql)
+            self.assertIn('"albums_artist"."name" LIKE', sql)
+
+    def test_refreshed(self):
+        self.search('wish')
+        album = Album.objects.create(name='Wish You Were Here', rank=16,
+                                     year=1975,
+                                     artist=Album.objects.first().artist)
+        self.assertEqual(self.search('wish')[0]['recordsFiltered'], 1)
+        album.genres.add(Genre.objects.get(name='Modal'))
+        self.assertEqual(self.search('modal')[0]['recordsFiltered'], 2)
+        # from the other side of the relation
+        Genre.objects.get(name='Modal').albums.remove(album)
+        self.assertEqual(self.search('modal')[0]['recordsFiltered'], 1)
+        album.delete()
+        self.assertEqual(self.search('wish')[0]['recordsFiltered'], 0)
+
+    def test_search_locked(self):
+        provider = AlbumNgramListAPIView.datatables_search_provider
+        index = provider.get_index(Album, 'default')
+        search = index.search
+        locked = []
+
+        def locked_search(name, term):
+            # another thread can't update the index meanwhile
+            thread = threading.Thread(target=lambda: locked.append(
+                not provider._lock.acquire(blocking=False)
+            ))
+            thread.start()
+            thread.join()
+            return search(name, term)
+
+        index.search = locked_search
+        try:
+            self.search('rock')
+        finally:
+            del index.search
+        self.assertTrue(locked)
+        self.assertTrue(all(locked))
+
+    def test_too_many_rows(self):
+        result, sql = self.search('the', '/api/albums/ngram/small/')
+        self.assertIn('"albums_album"."name" LIKE', sql)
+
+    def test_too_many_results(self):
+        result, sql = self.search('e', '/api/albums/ngram/few/')
+        self.assertIn('"albums_album"."name" LIKE', sql)
+        result, sql = self.search('revolver', '/api/albums/ngram/few/')
+        self.assertNotIn('"albums_album"."name" LIKE', sql)
+
+
+urlpatterns = [
+    path('api/albums/', AlbumListAPIView.as_view()),
+    path('api/albums/ngram/', AlbumNgramListAPIView.as_view()),
+    path('api/albums/ngram/small/', AlbumSmallNgramListAPIView.as_view()),
+    path('api/albums/ngram/few/', AlbumFewResultsNgramListAPIView.as_view()),
+]
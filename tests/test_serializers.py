@@ -0,0 +1,66 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.request import Request
+
+from rest_framework_datatables.serializers import get_requested_fields
+
+
+class TestRequestedFields(TestCase):
+    def test_tree(self):
+        request = Request(APIRequestFactory().get(
+            '/', {'columns[0][data]': 'rank',
+                  'columns[1][data]': 'artist.name',
+                  'columns[2][data]': 'artist.id',
+                  'columns[3][data]': 'genres',
+                  'columns[4][data]': 'genres.name',
+                  'columns[5][data]': ''}
+        ))
+        self.assertEqual(get_requested_fields(request), {
+            'rank': None,
+            'artist': {'name': None, 'id': None},
+            'genres': None,
+        })
+        request = Request(APIRequestFactory().get('/'))
+        self.assertIsNone(get_requested_fields(request))
+
+
+class TestDatatablesSerializerMixin(TestCase):
+    fixtures = ['test_data']
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(
+                '/api/albums/?format=datatables&length=5' + query
+            ).json()
+        return result['data'], [q['sql'] for q in queries]
+
+    def test_nested(self):
+        data, queries = self.get('&columns[0][data]=artist.name'
+                                 '&columns[1][data]=name')
+        self.assertEqual(set(data[0]), {'DT_RowId', 'DT_RowAttr', 'artist',
+                                        'name'})
+        # the id of the artist is always serialized
+        self.assertEqual(set(data[0]['artist']), {'id', 'name'})
+        # the genres of the albums are not fetched
+        self.assertFalse(any('albums_album_genres' in q for q in queries))
+
+    def test_whole_nested(self):
+        data, queries = self.get('&columns[0][data]=artist'
+                                 '&columns[1][data]=genres')
+        self.assertEqual(set(data[0]['artist']), {'id', 'name'})
+        self.assertTrue(data[0]['genres'])
+
+    def test_keep(self):
+        data, queries = self.get('&columns[0][data]=name&keep=year,rank')
+        self.assertEqual(set(data[0]), {'DT_RowId', 'DT_RowAttr', 'name',
+                                        'year', 'rank'})
+
+    def test_not_datatables(self):
+        result = self.client.get('/api/albums/?columns[0][data]=name').json()
+        self.assertIn('genres', result['results'][0])